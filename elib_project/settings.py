@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'library.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -89,6 +90,71 @@ DATABASES = {
     )
 }
 
+# SQLite (the default without DATABASE_URL) is written by every gunicorn worker, the import
+# jobs and the notification threads at once. WAL lets readers run alongside the one writer;
+# `timeout` makes a writer wait up to 20s for the lock instead of raising "database is
+# locked"; IMMEDIATE transactions take the write lock at BEGIN, because a read lock that
+# has to be upgraded mid-transaction fails straight away without waiting.
+SQLITE_OPTIONS = {
+    'init_command': ';'.join([
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',  # Safe with WAL: an OS crash can lose the last commits, never corrupt
+        'PRAGMA mmap_size=268435456',  # 256 MB
+        'PRAGMA cache_size=-32000',  # 32 MB per connection
+        'PRAGMA temp_store=MEMORY',
+    ]),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+}
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update(SQLITE_OPTIONS)
+
+
+# Cache
+# Shared by all gunicorn workers on the box, so rate limits and dashboard cache
+# invalidation apply across processes (LocMemCache is per-process).
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+
+# Sessions
+# Staff sessions stay server-side so they can be revoked; cached_db serves them from the cache.
+# Member OTP state doesn't use the session at all: it has its own signed cookie (views.OTP_COOKIE).
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+
+# Nightly upkeep: after this local hour the import worker (run_import_jobs) rebuilds the analytics
+# rollups from full history, repairing drift from queryset.update() calls, then runs purge_sessions.
+ROLLUP_REBUILD_HOUR = int(os.environ.get('ROLLUP_REBUILD_HOUR', '3'))
+
+
+# Profiling (library/profiling.py)
+# Requests slower than PROFILING_SLOW_MS go to the 'library.slow_requests' log and the staff
+# Slow Requests page; PROFILING_SAMPLE_RATE of all requests also run under cProfile.
+PROFILING_SLOW_MS = float(os.environ.get('PROFILING_SLOW_MS', '500'))
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+
+# Metrics (library/metrics.py): each process writes its counters here for /metrics/ to sum.
+# Must be a directory all gunicorn workers share; Prometheus authenticates with METRICS_TOKEN.
+METRICS_DIR = os.environ.get('METRICS_DIR', str(BASE_DIR / '.metrics'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        'library.slow_requests': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        'library.jobs': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},  # Failed import jobs
+        'library.metrics': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},  # Failed metric writes
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -128,6 +194,9 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Cover thumbnails built by `build_thumbnails` (content-hashed names, served by library.views.cover_thumbnail)
+COVER_THUMBNAIL_ROOT = os.environ.get('COVER_THUMBNAIL_ROOT', str(BASE_DIR / 'media' / 'covers'))
+
 # Email Configuration
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend' 
 # Production SMTP Settings
@@ -17,6 +17,7 @@ class BookRequestAdmin(admin.ModelAdmin):
     list_display = ('token', 'member_link', 'book', 'request_status', 'approval_status', 'timestamp')
     list_filter = ('approval_status', 'request_status') # Removed return_status from filter to reduce noise
     search_fields = ('token', 'email', 'full_name', 'member__firstname', 'member__surname')
+    list_select_related = ('member', 'book')  # member_link and book per row
     
     # Read-only fields (Exclude return_status entirely from edit form)
     readonly_fields = ('token', 'timestamp', 'days_left', 'full_name', 'email', 'member', 'book', 'approval_date', 'expected_return_date')
@@ -0,0 +1,249 @@
+"""Aggregation helpers for the admin analytics dashboard."""
+import time
+from datetime import date, timedelta
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from . import metrics
+from .models import BookRequest, DailyStatusStat, DailyBookStat, DailyMemberStat
+
+ROLLUP_MODELS = (DailyStatusStat, DailyBookStat, DailyMemberStat)
+APPROVED_WITH_DATE = Q(approval_status='Approved', approval_date__isnull=False)
+
+TREND_RANGES = {'30': 30, '90': 90, '365': 365}  # days
+TREND_GRANULARITIES = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+TREND_CACHE_SECONDS = 300
+
+# Cache generations: every BookRequest write bumps GENERATION_KEY, writes that land in a
+# closed month also bump HISTORY_GENERATION_KEY. Cache keys embed the generation, so a bump
+# orphans every stale entry at once without tracking individual keys.
+GENERATION_KEY = 'dashboard_generation'
+HISTORY_GENERATION_KEY = 'dashboard_history_generation'
+DASHBOARD_CACHE_SECONDS = 600
+HISTORY_CACHE_SECONDS = 24 * 3600  # Closed periods; the nightly rebuild_rollups also bumps their generation
+
+def status_field(status):
+    """'Not Approved' -> 'not_approved_count'"""
+    return f"{status.lower().replace(' ', '_')}_count"
+
+def format_lead_time(avg_lead_time):
+    if avg_lead_time is None:
+        return "N/A"
+    return f"{round(avg_lead_time.total_seconds() / 3600, 1)} Hours"
+
+# --- DAILY ROLLUPS ---
+def filter_rollups(qs, year=None, month=None):
+    if year: qs = qs.filter(date__year=year)
+    if month: qs = qs.filter(date__month=month)
+    return qs
+
+def rollup_kpis(year=None, month=None):
+    """
+    All dashboard KPIs (total_requests, <status>_count, avg_lead_time), summed from the small
+    DailyStatusStat table in one query, so cost stays flat as history grows.
+    """
+    aggregates = {
+        'total_requests': Coalesce(Sum('count'), 0),
+        'lead_time_total': Sum('lead_time_total'),
+        'lead_time_count': Coalesce(Sum('lead_time_count'), 0),
+    }
+    for status, _ in BookRequest.APPROVAL_STATUS_CHOICES:
+        aggregates[status_field(status)] = Coalesce(Sum('count', filter=Q(approval_status=status)), 0)
+    kpis = filter_rollups(DailyStatusStat.objects.all(), year, month).aggregate(**aggregates)
+    lead_time_total, lead_time_count = kpis.pop('lead_time_total'), kpis.pop('lead_time_count')
+    kpis['avg_lead_time'] = lead_time_total / lead_time_count if lead_time_count else None
+    return kpis
+
+def top_books(year=None, month=None, limit=5):
+    qs = filter_rollups(DailyBookStat.objects.all(), year, month)
+    return qs.values('book__title').annotate(count=Sum('count')).order_by('-count')[:limit]
+
+def top_members(year=None, month=None, limit=5):
+    qs = filter_rollups(DailyMemberStat.objects.all(), year, month)
+    return qs.values('full_name').annotate(count=Sum('count')).order_by('-count')[:limit]
+
+# --- CACHE GENERATIONS ---
+def get_generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        # Seed from the clock so an evicted counter never restarts at a value old keys used
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+def bump_generation(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_generation(key)
+
+def is_closed_period(year=None, month=None):
+    """True for a year/month entirely before the current month - its numbers only change on backdated writes."""
+    today = timezone.localdate()
+    if not year:
+        return False
+    if not month:
+        return year < today.year
+    return (year, month) < (today.year, today.month)
+
+def invalidate_dashboard(dates=()):
+    bump_generation(GENERATION_KEY)
+    month_start = timezone.localdate().replace(day=1)
+    if any(d < month_start for d in dates):
+        bump_generation(HISTORY_GENERATION_KEY)
+
+def _bump(model, keys, **deltas):
+    """Atomic `count += delta` upsert on one rollup row."""
+    increments = {f: F(f) + v for f, v in deltas.items()}
+    if model.objects.filter(**keys).update(**increments) or deltas['count'] <= 0:
+        return
+    try:
+        with transaction.atomic():  # Savepoint: losing the race below must not abort the caller's save()
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        model.objects.filter(**keys).update(**increments)  # A concurrent request created the row first
+
+def record_rollup_change(old, new):
+    """
+    Applies the difference between two BookRequest.rollup_state() snapshots
+    (None = row absent) to the rollup tables. Only dimensions that changed are touched,
+    so a status change only touches two DailyStatusStat rows.
+    """
+    for state, sign in ((old, -1), (new, 1)):
+        if not state:
+            continue
+        other = new if sign < 0 else old
+        status_keys = ('date', 'approval_status', 'lead_time')
+        if not other or any(state[k] != other[k] for k in status_keys):
+            lead_time = state['lead_time']
+            _bump(DailyStatusStat, {'date': state['date'], 'approval_status': state['approval_status']},
+                  count=sign,
+                  lead_time_total=sign * (lead_time or timedelta(0)),
+                  lead_time_count=sign if lead_time is not None else 0)
+        if state['book_id'] and (not other or (state['date'], state['book_id']) != (other['date'], other['book_id'])):
+            _bump(DailyBookStat, {'date': state['date'], 'book_id': state['book_id']}, count=sign)
+        if not other or (state['date'], state['full_name']) != (other['date'], other['full_name']):
+            _bump(DailyMemberStat, {'date': state['date'], 'full_name': state['full_name']}, count=sign)
+    invalidate_dashboard([state['date'] for state in (old, new) if state])
+
+def rebuild_rollups(since=None):
+    """
+    Recomputes the rollup tables from raw BookRequest history (all of it, or days >= since)
+    with three GROUP BY queries. Repairs drift from queryset.update(), which bypasses save();
+    run nightly over the full history (see the rebuild_rollups command).
+    """
+    reqs = BookRequest.objects.annotate(day=TruncDate('timestamp')).order_by()
+    if since:
+        reqs = reqs.filter(day__gte=since)
+
+    status_rows = reqs.values('day', 'approval_status').annotate(
+        count=Count('id'),
+        lead_time_total=Coalesce(
+            Sum(F('approval_date') - F('timestamp'), filter=APPROVED_WITH_DATE, output_field=DurationField()),
+            Value(timedelta(0)), output_field=DurationField(),
+        ),
+        lead_time_count=Count('id', filter=APPROVED_WITH_DATE),
+    )
+    book_rows = reqs.filter(book__isnull=False).values('day', 'book_id').annotate(count=Count('id'))
+    member_rows = reqs.values('day', 'full_name').annotate(count=Count('id'))
+
+    with transaction.atomic():
+        for model in ROLLUP_MODELS:
+            model.objects.filter(date__gte=since).delete() if since else model.objects.all().delete()
+        DailyStatusStat.objects.bulk_create(
+            (DailyStatusStat(date=r['day'], approval_status=r['approval_status'], count=r['count'],
+                             lead_time_total=r['lead_time_total'], lead_time_count=r['lead_time_count'])
+             for r in status_rows.iterator()), batch_size=1000)
+        DailyBookStat.objects.bulk_create(
+            (DailyBookStat(date=r['day'], book_id=r['book_id'], count=r['count']) for r in book_rows.iterator()),
+            batch_size=1000)
+        DailyMemberStat.objects.bulk_create(
+            (DailyMemberStat(date=r['day'], full_name=r['full_name'], count=r['count']) for r in member_rows.iterator()),
+            batch_size=1000)
+    bump_generation(GENERATION_KEY)
+    bump_generation(HISTORY_GENERATION_KEY)
+
+# --- TIME SERIES ---
+def _bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())  # Monday, same as TruncWeek
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def _next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+def _bucket_label(day, granularity):
+    if granularity == 'month':
+        return day.strftime('%b %Y')
+    if granularity == 'week':
+        return f"Wk {day.strftime('%b %d')}"
+    return day.strftime('%b %d')
+
+def request_trend(days=30, granularity='day'):
+    """
+    Request volume per day/week/month over the last `days` days, as (labels, data) ready for Chart.js.
+    One truncated GROUP BY on the rollup table; empty buckets are filled with 0 here.
+    Cached per (range, granularity, today) until the next BookRequest write.
+    """
+    today = timezone.localdate()
+    cache_key = f"dashboard_trend:{get_generation(GENERATION_KEY)}:{days}:{granularity}:{today}"
+    trend = metrics.cache_lookup('dashboard_trend', cache.get(cache_key))
+    if trend is not None:
+        return trend
+
+    start = _bucket_start(today - timedelta(days=days - 1), granularity)
+    rows = (DailyStatusStat.objects.filter(date__gte=start)
+            .annotate(bucket=TREND_GRANULARITIES[granularity]('date'))
+            .values('bucket').annotate(count=Sum('count')).order_by('bucket'))
+    counts = {row['bucket']: row['count'] for row in rows}
+
+    labels, data = [], []
+    bucket = start
+    while bucket <= today:
+        labels.append(_bucket_label(bucket, granularity))
+        data.append(counts.get(bucket, 0))
+        bucket = _next_bucket(bucket, granularity)
+
+    trend = (labels, data)
+    cache.set(cache_key, trend, TREND_CACHE_SECONDS)
+    return trend
+
+# --- CACHED DASHBOARD ---
+def dashboard_stats(year=None, month=None):
+    """
+    Filter-dependent dashboard numbers, cached per (year, month).
+    Closed periods are cached for a day and keyed on the history generation only,
+    so current-month traffic never evicts them.
+    """
+    if is_closed_period(year, month):
+        cache_key = f"dashboard_stats:h{get_generation(HISTORY_GENERATION_KEY)}:{year}:{month}"
+        timeout = HISTORY_CACHE_SECONDS
+    else:
+        cache_key = f"dashboard_stats:{get_generation(GENERATION_KEY)}:{year}:{month}"
+        timeout = DASHBOARD_CACHE_SECONDS
+
+    stats = metrics.cache_lookup('dashboard_stats', cache.get(cache_key))
+    if stats is None:
+        stats = {
+            'kpis': rollup_kpis(year, month),
+            'top_books': list(top_books(year, month)),
+            'top_members': list(top_members(year, month)),
+        }
+        cache.set(cache_key, stats, timeout)
+    return stats
+
+def available_years():
+    cache_key = f"dashboard_years:{get_generation(GENERATION_KEY)}"
+    years = metrics.cache_lookup('dashboard_years', cache.get(cache_key))
+    if years is None:
+        years = [d.year for d in DailyStatusStat.objects.dates('date', 'year')]
+        cache.set(cache_key, years, DASHBOARD_CACHE_SECONDS)
+    return years
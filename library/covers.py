@@ -0,0 +1,151 @@
+"""
+Concurrent OpenLibrary cover lookup for fetch_covers. Searches run in a bounded thread pool
+under a shared token bucket, with timeouts and retries; every answer (cover or no cover) is
+kept in CoverLookup so later runs skip titles checked recently.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import httpx
+from django.db.models import Q
+from django.utils import timezone
+from .importers import normalize_title, PLACEHOLDER_AUTHORS
+from .models import Book, CoverLookup
+from .throttling import TokenBucket
+
+OPENLIBRARY_URL = 'https://openlibrary.org'
+COVER_URL = 'https://covers.openlibrary.org/b/id/{}-L.jpg'
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 5  # OpenLibrary searches per second across all workers
+TIMEOUT = 10
+MAX_RETRIES = 3
+FOUND_TTL = timedelta(days=180)
+MISSING_TTL = timedelta(days=14)  # Misses are retried sooner - OpenLibrary keeps adding covers
+BATCH_SIZE = 500
+
+class CoverReport:
+    def __init__(self):
+        self.checked = 0
+        self.cached = 0
+        self.fetched = 0
+        self.found = 0
+        self.missing = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (f"Checked: {self.checked} ({self.cached} from cache, {self.fetched} fetched), "
+                f"Found: {self.found}, No cover: {self.missing}, Failed: {self.failed} in {self.elapsed:.1f}s")
+
+def lookup_key(title, author):
+    author = '' if author in PLACEHOLDER_AUTHORS else normalize_title(author)
+    return f"{normalize_title(title)}|{author}"[:400]
+
+class CoverFetcher:
+    """Thread-safe OpenLibrary search client (one pooled httpx.Client shared by all workers)."""
+    def __init__(self, base_url=OPENLIBRARY_URL, rate=DEFAULT_RATE, timeout=TIMEOUT, retries=MAX_RETRIES):
+        self.client = httpx.Client(base_url=base_url, timeout=timeout,
+                                   headers={'User-Agent': 'FAYM-E-Lib cover fetcher'})
+        self.limiter = TokenBucket(rate)
+        self.retries = retries
+
+    def close(self):
+        self.client.close()
+
+    def search(self, title, author):
+        """Returns the cover URL, '' if OpenLibrary has none, or raises after `retries` failed attempts."""
+        params = {'title': title, 'limit': 1, 'fields': 'cover_i'}
+        if author and author not in PLACEHOLDER_AUTHORS:
+            params['author'] = author
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.client.get('/search.json', params=params)
+            except httpx.TransportError:  # Timeouts, refused/reset connections
+                if attempt == self.retries:
+                    raise
+                time.sleep(backoff(attempt))
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.retries:
+                    response.raise_for_status()
+                retry_after = response.headers.get('Retry-After', '')
+                time.sleep(float(retry_after) if retry_after.isdigit() else backoff(attempt))
+                continue
+            response.raise_for_status()
+            docs = response.json().get('docs') or []
+            cover_i = docs[0].get('cover_i') if docs else None
+            return COVER_URL.format(cover_i) if cover_i else ''
+
+def backoff(attempt):
+    return 0.5 * 2 ** attempt + random.random() * 0.1
+
+def load_cached(keys, refresh=False):
+    """{key: cover_url} for unexpired CoverLookup rows, queried in batches."""
+    if refresh:
+        return {}
+    now = timezone.now()
+    fresh = (Q(fetched_at__gte=now - FOUND_TTL) & ~Q(cover_url='')) | Q(fetched_at__gte=now - MISSING_TTL, cover_url='')
+    keys, cached = list(keys), {}
+    for i in range(0, len(keys), BATCH_SIZE):
+        cached.update(CoverLookup.objects.filter(fresh, key__in=keys[i:i + BATCH_SIZE]).values_list('key', 'cover_url'))
+    return cached
+
+def fetch_covers(fetcher, books=None, workers=DEFAULT_WORKERS, refresh=False, log=print):
+    """
+    Fills cover_url for books without one (default: the whole catalog). Cache hits cost no
+    request; misses are searched concurrently, once per distinct title/author. Books are
+    written with bulk_update and lookups upserted with bulk_create, in batches.
+    """
+    start = time.perf_counter()
+    report = CoverReport()
+    if books is None:
+        books = Book.objects.filter(Q(cover_url__isnull=True) | Q(cover_url=''))
+    by_key = {}
+    for book in books.only('book_id', 'title', 'author', 'cover_url'):
+        by_key.setdefault(lookup_key(book.title, book.author), []).append(book)
+    report.checked = sum(len(group) for group in by_key.values())
+
+    results = load_cached(by_key, refresh=refresh)
+    report.cached = sum(len(by_key[key]) for key in results)
+    misses = [key for key in by_key if key not in results]
+
+    def search(key):
+        book = by_key[key][0]
+        try:
+            return key, fetcher.search(book.title, book.author)
+        except Exception as e:
+            log(f"Error checking {book.title}: {e}")
+            return key, None
+
+    lookups = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key, url in pool.map(search, misses):
+            report.fetched += 1
+            if url is None:
+                report.failed += len(by_key[key])  # Not cached, so the next run tries again
+                continue
+            results[key] = url
+            lookups.append(CoverLookup(key=key, cover_url=url, fetched_at=timezone.now()))
+            if len(lookups) >= BATCH_SIZE:
+                save_lookups(lookups)
+    save_lookups(lookups)
+
+    updated = []
+    for key, url in results.items():
+        for book in by_key[key]:
+            if url:
+                book.cover_url = url
+                updated.append(book)
+            else:
+                report.missing += 1
+    report.found = len(updated)
+    Book.objects.bulk_update(updated, ['cover_url'], batch_size=BATCH_SIZE)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+def save_lookups(lookups):
+    CoverLookup.objects.bulk_create(lookups, batch_size=BATCH_SIZE, update_conflicts=True,
+                                    unique_fields=['key'], update_fields=['cover_url', 'fetched_at'])
+    lookups.clear()
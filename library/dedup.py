@@ -0,0 +1,192 @@
+"""
+Near-duplicate books ('100 Days Of Favor ' vs '100 days of favor', or the same title imported
+once by 'Unknown Import' and once with its real author). New books are checked against the
+indexed Book.fingerprint with one lookup. Existing ones are clustered by MinHash over title
+shingles with LSH banding, so only books sharing a bucket are ever compared - near-linear in
+the catalog size instead of every pair.
+Hard copies are physical books: two HC rows with the same title may be two real copies on the
+shelf, so they are never blocked on entry and only merged when asked to explicitly.
+"""
+import random
+import time
+import zlib
+from collections import defaultdict
+from itertools import combinations
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from .analytics import rebuild_rollups
+from .importers import PLACEHOLDER_AUTHORS, author_key, book_fingerprint, normalize_title
+from .models import Book, BookRequest, DropboxFile
+
+SHINGLE = 3
+BANDS, ROWS = 8, 4  # 32 hashes; titles above ~0.6 similarity almost always share a band
+THRESHOLD = 0.8  # Shingle Jaccard similarity for two titles to count as the same book
+MAX_BUCKET = 50  # Bigger buckets are compared against their first member only
+BATCH_SIZE = 500
+GAP_FIELDS = ['author', 'keywords', 'location', 'cover_url', 'page_count', 'cover_thumbnail']
+ACTIVE_LOANS = ('On Hold', 'Taken')
+_rng = random.Random(43)  # Fixed seed: signatures must be stable between runs
+_MASKS = [_rng.getrandbits(32) for _ in range(BANDS * ROWS)]  # crc32 XOR mask = one cheap hash function
+
+class DedupReport:
+    def __init__(self):
+        self.books = 0
+        self.clusters = 0
+        self.duplicates = 0
+        self.merged = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (f"Books: {self.books}, Clusters: {self.clusters} ({self.duplicates} duplicates), "
+                f"Merged: {self.merged}, Skipped: {self.skipped} in {self.elapsed:.1f}s")
+
+def shingles(key):
+    padded = f" {key} "
+    return {padded[i:i + SHINGLE] for i in range(max(1, len(padded) - SHINGLE + 1))}
+
+def signature(shingle_set):
+    hashes = [zlib.crc32(s.encode()) for s in shingle_set]
+    return [min(map(mask.__xor__, hashes)) for mask in _MASKS]
+
+def scope(book):
+    """Only books that could be one catalog entry are compared: same type, and for hard copies the same owner."""
+    return book.type, book.owner.strip().lower() if book.type == 'HC' else ''
+
+def find_duplicate(book):
+    """The existing soft copy an unsaved soft copy `book` would duplicate, or None - one indexed lookup.
+    Hard copies always return None: a second copy of a title is a real book."""
+    if book.type != 'SC':
+        return None
+    fingerprints = {book_fingerprint(book.title, book.author), book_fingerprint(book.title, '')}
+    qs = Book.objects.filter(fingerprint__in=fingerprints, type='SC')
+    if book.pk:
+        qs = qs.exclude(pk=book.pk)
+    return qs.first()
+
+def find_clusters(books, threshold=THRESHOLD):
+    """Groups near-duplicate books. Returns lists of two or more books."""
+    by_id, sets, buckets = {}, {}, defaultdict(list)
+    for book in books:
+        key = normalize_title(book.title)
+        if not key:
+            continue
+        by_id[book.pk], sets[book.pk] = book, shingles(key)
+        sig = signature(sets[book.pk])
+        for band in range(BANDS):
+            buckets[(scope(book), band, *sig[band * ROWS:(band + 1) * ROWS])].append(book.pk)
+
+    parent = {pk: pk for pk in by_id}
+    authors = {pk: author_key(book.author) for pk, book in by_id.items()}  # Per cluster root
+
+    def root(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    compared = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        pairs = combinations(members, 2) if len(members) <= MAX_BUCKET else ((members[0], m) for m in members[1:])
+        for a, b in pairs:
+            ra, rb = root(a), root(b)
+            if ra == rb or (a, b) in compared:
+                continue
+            compared.add((a, b))
+            # A placeholder author matches anyone, but two real authors must agree for the whole cluster
+            if authors[ra] and authors[rb] and authors[ra] != authors[rb]:
+                continue
+            a_set, b_set = sets[a], sets[b]
+            if len(a_set & b_set) >= threshold * len(a_set | b_set):
+                parent[rb] = ra
+                authors[ra] = authors[ra] or authors[rb]
+
+    groups = defaultdict(list)
+    for pk, book in by_id.items():
+        groups[root(pk)].append(book)
+    return [sorted(group, key=lambda b: b.pk) for group in groups.values() if len(group) > 1]
+
+def has_value(book, field):
+    value = getattr(book, field)
+    return value not in PLACEHOLDER_AUTHORS if field == 'author' else bool(value)
+
+def merge_cluster(cluster, request_counts):
+    """
+    Folds a cluster into one book: the one on loan, else with the most requests, else the most
+    complete. Its gaps are filled from the others, their requests and Dropbox files are moved
+    over, and they are deleted. Returns (kept book, earliest moved request time or None).
+    """
+    keep = max(cluster, key=lambda b: (b.availability in ACTIVE_LOANS, request_counts.get(b.pk, 0),
+                                       sum(has_value(b, f) for f in GAP_FIELDS), -b.pk))
+    dupes = [b for b in cluster if b is not keep]
+    fields = set()
+    for dupe in dupes:
+        for field in GAP_FIELDS:
+            if not has_value(keep, field) and has_value(dupe, field):
+                setattr(keep, field, getattr(dupe, field))
+                fields.add(field)
+        if keep.type == 'SC' and keep.availability == 'Not Available' and dupe.availability == 'Available':
+            keep.location, keep.availability = dupe.location, 'Available'
+            fields.update(['location', 'availability'])
+
+    ids = [b.pk for b in dupes]
+    requests = BookRequest.objects.filter(book_id__in=ids)
+    first_moved = requests.aggregate(first=Min('timestamp'))['first']
+    with transaction.atomic():
+        requests.update(book=keep)  # Rollups bypassed here are rebuilt by dedupe_books
+        DropboxFile.objects.filter(book_id__in=ids).update(book=keep)
+        Book.objects.filter(pk__in=ids).delete()
+        keep.save(update_fields=[*fields, 'fingerprint'])
+    return keep, first_moved
+
+def dedupe_books(merge=False, threshold=THRESHOLD, include_hard_copies=False, log=print):
+    """
+    Refreshes stale fingerprints, finds near-duplicate clusters and (with merge) folds each into
+    one book. Clusters with more than one book out on loan are left for a librarian, and
+    hard-copy clusters are only listed unless include_hard_copies confirms they are one book.
+    """
+    start = time.perf_counter()
+    report = DedupReport()
+    books = list(Book.objects.only('book_id', 'title', 'author', 'type', 'owner', 'availability', 'fingerprint',
+                                   'file_upload', *GAP_FIELDS))
+    report.books = len(books)
+    stale = []
+    for book in books:
+        fingerprint = book_fingerprint(book.title, book.author)
+        if book.fingerprint != fingerprint:  # Written by queryset.update() or before the column existed
+            book.fingerprint = fingerprint
+            stale.append(book)
+    Book.objects.bulk_update(stale, ['fingerprint'], batch_size=BATCH_SIZE)
+
+    clusters = find_clusters(books, threshold)
+    report.clusters = len(clusters)
+    report.duplicates = sum(len(c) - 1 for c in clusters)
+    request_counts = dict(BookRequest.objects.filter(book__in=[b for c in clusters for b in c]).order_by()
+                          .values_list('book_id').annotate(n=Count('id'))) if clusters else {}
+
+    earliest = None
+    for cluster in clusters:
+        titles = ' | '.join(f'#{b.pk} "{b.title}" ({b.author})' for b in cluster)
+        if sum(b.availability in ACTIVE_LOANS for b in cluster) > 1:
+            report.skipped += 1
+            log(f"Skipped (several on loan): {titles}")
+            continue
+        if merge and cluster[0].type == 'HC' and not include_hard_copies:
+            report.skipped += 1
+            log(f"Skipped (hard copies, may be separate copies): {titles}")
+            continue
+        if not merge:
+            log(titles)
+            continue
+        keep, first_moved = merge_cluster(cluster, request_counts)
+        report.merged += len(cluster) - 1
+        log(f"Kept #{keep.pk}: {titles}")
+        if first_moved and (earliest is None or first_moved < earliest):
+            earliest = first_moved
+    if earliest:
+        rebuild_rollups(since=timezone.localdate(earliest))
+    report.elapsed = time.perf_counter() - start
+    return report
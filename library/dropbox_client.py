@@ -0,0 +1,24 @@
+"""
+One Dropbox client per process. The SDK client is thread-safe and keeps a pooled HTTPS session,
+so the importer, uploads, PDF extraction and background jobs all reuse the same connections
+instead of paying a TLS handshake for every new client.
+"""
+import os
+import threading
+import dropbox
+
+POOL_SIZE = 16  # Connections kept open; at least the largest thread pool that shares the client
+_clients = {}  # token -> client
+_lock = threading.Lock()
+
+def get_client():
+    """Returns the shared client for DROPBOX_ACCESS_TOKEN, building it on first use (or after the token changes)."""
+    token = os.environ.get('DROPBOX_ACCESS_TOKEN')
+    if not token:
+        raise RuntimeError("DROPBOX_ACCESS_TOKEN not found in environment.")
+    with _lock:
+        client = _clients.get(token)
+        if client is None:
+            _clients.clear()  # Token rotated: drop the old client
+            client = _clients[token] = dropbox.Dropbox(token, session=dropbox.create_session(max_connections=POOL_SIZE))
+    return client
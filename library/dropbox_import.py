@@ -0,0 +1,270 @@
+"""
+Concurrent, incremental Dropbox folder importer: soft copies in a folder become SC books with
+shared links. The first run lists the folder; later runs replay only the changes since the
+stored list_folder cursor (additions, renames/moves, deletions).
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import dropbox
+from django.db import transaction
+from .importers import book_fingerprint, normalize_title
+from .models import Book, DropboxFile, DropboxCursor, SharedLink
+from .throttling import TokenBucket
+
+BATCH_SIZE = 500
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 10  # Dropbox API calls per second across all workers
+MAX_RATE_LIMIT_RETRIES = 5
+
+def title_from_filename(name):
+    return name.replace('.pdf', '').replace('.epub', '').replace('_', ' ').strip()
+
+class ImportReport:
+    def __init__(self):
+        self.mode = 'full'
+        self.listed = 0
+        self.existing = 0
+        self.created = 0
+        self.moved = 0
+        self.removed = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        rate = self.listed / self.elapsed if self.elapsed else 0
+        return (f"[{self.mode}] Listed: {self.listed}, Created: {self.created}, Skipped existing: {self.existing}, "
+                f"Moved: {self.moved}, Removed: {self.removed}, Failed: {self.failed} "
+                f"in {self.elapsed:.1f}s ({rate:.0f} entries/s)")
+
+def call_api(limiter, func, *args, **kwargs):
+    """One rate-limited Dropbox call; honours the server's backoff on 429s."""
+    for attempt in range(MAX_RATE_LIMIT_RETRIES):
+        limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except dropbox.exceptions.RateLimitError as e:
+            time.sleep(e.backoff or 2 ** attempt)
+    limiter.acquire()
+    return func(*args, **kwargs)
+
+def get_shared_link(dbx, path, limiter):
+    """Creates a shared link for path, or returns the existing one."""
+    try:
+        return call_api(limiter, dbx.sharing_create_shared_link_with_settings, path).url
+    except dropbox.exceptions.ApiError as e:
+        if not e.error.is_shared_link_already_exists():
+            raise
+        existing = e.error.get_shared_link_already_exists()
+        if existing and existing.is_metadata():
+            return existing.get_metadata().url  # Returned with the error, no second call needed
+        links = call_api(limiter, dbx.sharing_list_shared_links, path=path).links
+        return links[0].url if links else ''
+
+def load_links(paths):
+    """Stored shared links for paths, as {path_lower: url}."""
+    paths, found = list(paths), {}
+    for i in range(0, len(paths), BATCH_SIZE):
+        found.update(SharedLink.objects.filter(path_lower__in=paths[i:i + BATCH_SIZE]).values_list('path_lower', 'url'))
+    return found
+
+def save_links(links):
+    SharedLink.objects.bulk_create([SharedLink(path_lower=p, url=u) for p, u in links.items()], batch_size=BATCH_SIZE,
+                                   update_conflicts=True, unique_fields=['path_lower'], update_fields=['url'])
+
+def cached_shared_link(dbx, path, limiter):
+    """get_shared_link through the SharedLink table: Dropbox is only asked about paths never seen before."""
+    path = path.lower()
+    link = load_links([path]).get(path)
+    if not link:
+        link = get_shared_link(dbx, path, limiter)
+        if link:
+            save_links({path: link})
+    return link
+
+class FolderListing:
+    """
+    Iterates list_folder entries page by page - a full recursive listing, or only the changes
+    since `cursor`. After iteration, .cursor holds the cursor to resume from next time.
+    """
+    def __init__(self, dbx, limiter, folder_path=None, cursor=None):
+        self.dbx, self.limiter = dbx, limiter
+        self.folder_path, self.cursor = folder_path, cursor
+
+    def __iter__(self):
+        if self.cursor:
+            result = call_api(self.limiter, self.dbx.files_list_folder_continue, self.cursor)
+        else:
+            result = call_api(self.limiter, self.dbx.files_list_folder, self.folder_path, recursive=True)
+        while True:
+            yield from result.entries
+            if not result.has_more:
+                break
+            result = call_api(self.limiter, self.dbx.files_list_folder_continue, result.cursor)
+        self.cursor = result.cursor
+
+def folder_key(folder_path):
+    return '/' + folder_path.strip('/').lower() if folder_path.strip('/') else ''
+
+def collect_changes(dbx, folder_path, limiter, full=False):
+    """
+    Returns ({path_lower: latest entry}, new cursor, mode). Uses the stored cursor unless
+    `full` is set or Dropbox reports it expired (reset), in which case the folder is relisted.
+    """
+    state = None if full else DropboxCursor.objects.filter(folder_path=folder_key(folder_path)).first()
+    listing = FolderListing(dbx, limiter, folder_path, cursor=state.cursor if state else None)
+    try:
+        latest = {e.path_lower: e for e in listing if isinstance(e, (dropbox.files.FileMetadata, dropbox.files.DeletedMetadata))}
+        return latest, listing.cursor, 'delta' if state else 'full'
+    except dropbox.exceptions.ApiError as e:
+        if not state or not getattr(e.error, 'is_reset', lambda: False)():
+            raise
+    listing = FolderListing(dbx, limiter, folder_path)
+    latest = {e.path_lower: e for e in listing if isinstance(e, (dropbox.files.FileMetadata, dropbox.files.DeletedMetadata))}
+    return latest, listing.cursor, 'full'
+
+def import_folder(dbx, folder_path, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, log=print, full=False, progress=None):
+    """
+    Syncs folder_path into the catalog and stores the new cursor:
+    - new files whose title isn't in the catalog become SC books (shared links resolved by a
+      bounded thread pool under a shared token bucket, inserted with bulk_create);
+    - new files matching an existing title, or another new file's, are linked to that book;
+    - renamed/moved files (same Dropbox id) just update their path;
+    - deleted files are unlinked, and books left with no file are marked Not Available
+      (and made Available again if the file comes back).
+    Catalog titles and tracked files are preloaded once, never queried per file.
+    progress(done, total) is called as shared links resolve.
+    """
+    start = time.perf_counter()
+    report = ImportReport()
+    limiter = TokenBucket(rate)
+
+    latest, cursor, report.mode = collect_changes(dbx, folder_path, limiter, full=full)
+    report.listed = len(latest)
+
+    titles = {}
+    for book_id, title in Book.objects.values_list('book_id', 'title').iterator(chunk_size=5000):
+        titles.setdefault(normalize_title(title), book_id)
+    tracked = list(DropboxFile.objects.all())
+    by_id = {f.file_id: f for f in tracked}
+    by_path = {f.path_lower: f for f in tracked}
+
+    moved, changed, link_existing, new_entries = [], [], [], []
+    siblings = []  # More files with a title new in this sync: linked to the book the first one creates
+    stale = []  # Paths whose stored shared link no longer points at the file there
+    for path, entry in latest.items():
+        if not isinstance(entry, dropbox.files.FileMetadata):
+            continue
+        record = by_id.get(entry.id)
+        if record:
+            if record.path_lower != path:
+                stale.append(record.path_lower)
+                by_path.pop(record.path_lower, None)
+                record.path_lower = path
+                moved.append(record)
+            elif record.content_hash != (entry.content_hash or ''):  # Edited in place
+                changed.append(record)
+            record.content_hash = entry.content_hash or ''
+            by_path[path] = record
+            continue
+        record = by_path.get(path)
+        if record:  # File replaced in place: new id, same path
+            if record.file_id != entry.id:
+                stale.append(path)
+            record.file_id, record.content_hash = entry.id, entry.content_hash or ''
+            changed.append(record)
+            continue
+
+        title = title_from_filename(entry.name)
+        key = normalize_title(title)
+        if key in titles:
+            report.existing += 1
+            if titles[key]:
+                link_existing.append(DropboxFile(file_id=entry.id, path_lower=path, content_hash=entry.content_hash or '',
+                                                 book_id=titles[key]))
+            else:
+                siblings.append((key, entry))
+            continue
+        titles[key] = None  # Same title twice in the folder -> one book
+        new_entries.append((title, entry))
+
+    # A deleted folder arrives as a single entry, so match tracked files under it too
+    gone = tuple(p for p, e in latest.items() if isinstance(e, dropbox.files.DeletedMetadata))
+    under = tuple(g + '/' for g in gone)
+    deleted = [f for p, f in by_path.items() if gone and (p in gone or p.startswith(under))
+               and not isinstance(latest.get(p), dropbox.files.FileMetadata)]
+
+    created = resolve_and_create(dbx, new_entries, workers, limiter, report, log, progress=progress)
+    new_books = {normalize_title(f.book.title): f.book for f in created}
+    created += [DropboxFile(file_id=entry.id, path_lower=entry.path_lower, content_hash=entry.content_hash or '',
+                            book=new_books[key]) for key, entry in siblings if key in new_books]
+
+    with transaction.atomic():
+        if deleted:
+            affected = {f.book_id for f in deleted}
+            DropboxFile.objects.filter(pk__in=[f.pk for f in deleted]).delete()
+            report.removed = Book.objects.filter(book_id__in=affected, dropbox_files__isnull=True).update(availability='Not Available')
+            stale += [f.path_lower for f in deleted]
+        if stale:
+            SharedLink.objects.filter(path_lower__in=stale).delete()
+        # Free target paths first so a move onto a replaced file can't hit the unique constraint
+        DropboxFile.objects.filter(path_lower__in=[f.path_lower for f in moved]).exclude(pk__in=[f.pk for f in moved]).delete()
+        DropboxFile.objects.bulk_update(moved + changed, ['file_id', 'path_lower', 'content_hash'], batch_size=BATCH_SIZE)
+        DropboxFile.objects.bulk_create(link_existing + created, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        if report.mode == 'delta' and link_existing:  # A soft copy came back after being deleted
+            Book.objects.filter(book_id__in={f.book_id for f in link_existing}, type='SC',
+                                availability='Not Available').update(availability='Available')
+        DropboxCursor.objects.update_or_create(folder_path=folder_key(folder_path), defaults={'cursor': cursor})
+    report.moved = len(moved)
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+def resolve_and_create(dbx, new_entries, workers, limiter, report, log, progress=None):
+    """
+    Bulk-creates the books, taking shared links from the SharedLink table where known and
+    resolving the rest concurrently. Returns their DropboxFile rows (unsaved).
+    """
+    files, batch = [], []
+    known = load_links(entry.path_lower for _, entry in new_entries)
+    resolved = {}
+
+    def add(title, entry, link):
+        batch.append((Book(title=title, type='SC', author='Unknown Import', owner='FAYM', location=link,
+                           availability='Available', keywords='', fingerprint=book_fingerprint(title, '')), entry))
+        if len(batch) >= BATCH_SIZE:
+            flush()
+
+    def flush():
+        Book.objects.bulk_create([book for book, _ in batch])
+        if resolved:
+            save_links(resolved)
+            resolved.clear()
+        files.extend(DropboxFile(file_id=entry.id, path_lower=entry.path_lower, content_hash=entry.content_hash or '', book=book)
+                     for book, entry in batch)
+        report.created += len(batch)
+        batch.clear()
+
+    for title, entry in new_entries:
+        if entry.path_lower in known:
+            add(title, entry, known[entry.path_lower])
+    todo = [(title, entry) for title, entry in new_entries if entry.path_lower not in known]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(get_shared_link, dbx, entry.path_lower, limiter): (title, entry) for title, entry in todo}
+        for done, future in enumerate(as_completed(futures), start=len(new_entries) - len(todo) + 1):
+            title, entry = futures[future]
+            if progress:
+                progress(done, len(new_entries))
+            try:
+                link = future.result()
+            except Exception as e:
+                report.failed += 1
+                log(f"Error getting link for {title}: {e}")
+                continue
+            if not link:
+                report.failed += 1
+                continue
+            resolved[entry.path_lower] = link
+            add(title, entry, link)
+    if batch:
+        flush()
+    return files
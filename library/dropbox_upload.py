@@ -0,0 +1,90 @@
+"""
+Uploads a soft copy attached in the admin (Book.file_upload) to Dropbox from a background
+ImportJob: streamed from disk in fixed-size upload-session chunks, resumable from the last
+chunk, then shared and linked to the book, and the local temp file deleted.
+"""
+import os
+import dropbox
+from django.core.files.storage import default_storage
+from .dropbox_import import cached_shared_link
+from .models import Book, DropboxFile
+from .throttling import TokenBucket
+
+CHUNK_SIZE = 8 * 1024 * 1024  # Dropbox wants session chunks in multiples of 4 MB
+LINK_RATE = 5
+
+def dropbox_path(name):
+    """Storage name 'temp_books/x.pdf' -> '/x.pdf': the Dropbox root, where Book.save has always uploaded."""
+    return '/' + os.path.basename(name)
+
+def upload_file(dbx, fileobj, size, path, chunk_size=None, resume=None, on_chunk=None):
+    """
+    Streams fileobj to path in chunk_size pieces - one chunk in memory at a time. Small files use
+    a single files_upload. resume=(session_id, offset) continues an interrupted session;
+    on_chunk(session_id, offset) is called after every appended chunk. Returns the FileMetadata.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    mode = dropbox.files.WriteMode.overwrite
+    if size <= chunk_size and not resume:
+        return dbx.files_upload(fileobj.read(), path, mode=mode)
+
+    if resume:
+        session_id, offset = resume
+        fileobj.seek(offset)
+    else:
+        session_id = dbx.files_upload_session_start(fileobj.read(chunk_size)).session_id
+        offset = fileobj.tell()
+        if on_chunk:
+            on_chunk(session_id, offset)
+    cursor = dropbox.files.UploadSessionCursor(session_id=session_id, offset=offset)
+    while size - cursor.offset > chunk_size:
+        dbx.files_upload_session_append_v2(fileobj.read(chunk_size), cursor)
+        cursor.offset = fileobj.tell()
+        if on_chunk:
+            on_chunk(session_id, cursor.offset)
+    commit = dropbox.files.CommitInfo(path=path, mode=mode)
+    return dbx.files_upload_session_finish(fileobj.read(), cursor, commit)
+
+def is_lost_session(error):
+    """True if Dropbox no longer knows the upload session (expired, closed, or at another offset)."""
+    err = error.error
+    if isinstance(err, dropbox.files.UploadSessionFinishError) and err.is_lookup_failed():
+        err = err.get_lookup_failed()
+    return (isinstance(err, (dropbox.files.UploadSessionLookupError, dropbox.files.UploadSessionAppendError))
+            and (err.is_not_found() or err.is_incorrect_offset() or err.is_closed()))
+
+def upload_book(dbx, book_id, name, checkpoint=None, on_chunk=None, progress=None):
+    """
+    Uploads the stored file `name` for a pending book, links it, and deletes the local copy.
+    checkpoint={'session_id', 'offset'} resumes an interrupted upload (restarting if Dropbox has
+    dropped the session). Returns the shared link.
+    """
+    path = dropbox_path(name)
+    size = default_storage.size(name)
+
+    def chunk_done(session_id, offset):
+        if on_chunk:
+            on_chunk(session_id, offset)
+        if progress:
+            progress(offset, size)
+
+    resume = (checkpoint['session_id'], checkpoint['offset']) if checkpoint else None
+    with default_storage.open(name, 'rb') as f:
+        try:
+            metadata = upload_file(dbx, f, size, path, resume=resume, on_chunk=chunk_done)
+        except dropbox.exceptions.ApiError as e:
+            if not resume or not is_lost_session(e):
+                raise
+            f.seek(0)
+            metadata = upload_file(dbx, f, size, path, on_chunk=chunk_done)
+
+    link = cached_shared_link(dbx, path, TokenBucket(LINK_RATE))
+    if not link:
+        raise RuntimeError(f"Uploaded to {path} but could not create a shared link.")
+    # update(), not save(): the file is already handled and Book.save would queue it again
+    Book.objects.filter(pk=book_id).update(location=link, type='SC', availability='Available', file_upload='')
+    DropboxFile.objects.update_or_create(path_lower=metadata.path_lower,
+                                         defaults={'file_id': metadata.id, 'book_id': book_id,
+                                                   'content_hash': metadata.content_hash or ''})
+    default_storage.delete(name)
+    return link
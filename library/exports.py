@@ -0,0 +1,90 @@
+"""Constant-memory CSV/XLSX exports of request and return history for auditors."""
+import csv
+import datetime
+import xlsxwriter
+from django.utils import timezone
+from .models import BookRequest, ReturnLog
+
+CHUNK_SIZE = 2000
+
+def _fmt(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+def _username(user):
+    return user.username if user else ''
+
+# (header, row -> value)
+EXPORTS = {
+    'requests': {
+        'queryset': lambda: BookRequest.objects.select_related('book', 'member', 'assigned_to', 'approved_by').order_by('id'),
+        'columns': [
+            ('Token', lambda r: r.token),
+            ('Timestamp', lambda r: r.timestamp),
+            ('Full Name', lambda r: r.full_name),
+            ('Email', lambda r: r.email),
+            ('Mobile Number', lambda r: r.member.mobile_number if r.member else ''),
+            ('Book', lambda r: r.book.title if r.book else ''),
+            ('Type', lambda r: r.book.type if r.book else ''),
+            ('Request Status', lambda r: r.request_status),
+            ('Approval Status', lambda r: r.approval_status),
+            ('Approval Date', lambda r: r.approval_date),
+            ('Assigned To', lambda r: _username(r.assigned_to)),
+            ('Approved By', lambda r: _username(r.approved_by)),
+            ('Delivery Date', lambda r: r.delivery_date),
+            ('Expected Return Date', lambda r: r.expected_return_date),
+            ('Return Status', lambda r: r.return_status),
+        ],
+    },
+    'returns': {
+        'queryset': lambda: ReturnLog.objects.order_by('id'),
+        'columns': [
+            ('Timestamp', lambda r: r.timestamp),
+            ('Action', lambda r: r.action),
+            ('Request Token', lambda r: r.request_token),
+            ('Member', lambda r: r.bib_lit_member),
+            ('Book', lambda r: r.book_title_snapshot),
+            ('Request Date', lambda r: r.request_date_snapshot),
+            ('Date of Action', lambda r: r.date_of_action),
+            ('Validator', lambda r: r.validator),
+            ('Notes', lambda r: r.notes),
+        ],
+    },
+}
+
+def iter_rows(kind):
+    """Header row, then one list per record. Records are fetched CHUNK_SIZE at a time."""
+    export = EXPORTS[kind]
+    columns = export['columns']
+    yield [header for header, _ in columns]
+    for obj in export['queryset']().iterator(chunk_size=CHUNK_SIZE):
+        yield [_fmt(getter(obj)) for _, getter in columns]
+
+class Echo:
+    """File-like object whose write() just hands the line back, for csv.writer streaming."""
+    def write(self, value):
+        return value
+
+def stream_csv(kind):
+    writer = csv.writer(Echo())
+    for row in iter_rows(kind):
+        yield writer.writerow(row)
+
+def write_xlsx(kind, target):
+    """Writes the export to a path or file object. constant_memory flushes each row to disk as it goes.
+    Names and titles are user input, so every string is written as text: never as a formula or link."""
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True, 'in_memory': False,
+                                            'strings_to_formulas': False, 'strings_to_urls': False})
+    worksheet = workbook.add_worksheet(kind.title())
+    bold = workbook.add_format({'bold': True})
+    for row_num, row in enumerate(iter_rows(kind)):
+        worksheet.write_row(row_num, 0, row, bold if row_num == 0 else None)
+    workbook.close()
+
+def export_filename(kind, fmt):
+    return f"faym_{kind}_{timezone.localdate():%Y%m%d}.{fmt}"
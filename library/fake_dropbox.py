@@ -0,0 +1,180 @@
+"""
+In-memory stand-in for dropbox.Dropbox, for tests and offline benchmarks.
+Returns real SDK result/error types, so code under test can't tell the difference.
+`latency` (seconds) is slept on every call to model API round trips.
+"""
+import io
+import threading
+import time
+import uuid
+from collections import Counter
+import dropbox
+from dropbox import files, sharing
+from .pdf_extract import content_hash
+
+class FakeDropbox:
+    def __init__(self, latency=0.0, page_size=500):
+        self.latency = latency
+        self.page_size = page_size
+        self.files = {}   # path_lower -> bytes
+        self.display_paths = {}  # path_lower -> path as added
+        self.ids = {}     # path_lower -> file id (kept across moves)
+        self.log = []     # path_lower of every change, in order; delta cursors are positions in it
+        self._listings = {}
+        self.links = {}   # path_lower -> url
+        self.sessions = {}  # upload session id -> bytearray received so far
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def add_file(self, path, content=b'', file_id=None):
+        with self.lock:
+            key = path.lower()
+            self.files[key] = content
+            self.display_paths[key] = path
+            self.ids[key] = file_id or self.ids.get(key) or f"id:{uuid.uuid4().hex[:12]}"
+            self.log.append(key)
+
+    def delete_file(self, path):
+        with self.lock:
+            key = path.lower()
+            del self.files[key], self.display_paths[key], self.ids[key]
+            self.links.pop(key, None)
+            self.log.append(key)
+
+    def move_file(self, from_path, to_path):
+        with self.lock:
+            file_id, content, link = self.ids[from_path.lower()], self.files[from_path.lower()], self.links.get(from_path.lower())
+        self.delete_file(from_path)
+        self.add_file(to_path, content, file_id=file_id)
+        if link:
+            self.links[to_path.lower()] = link
+
+    def _call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _api_error(error):
+        return dropbox.exceptions.ApiError(uuid.uuid4().hex, error, None, None)
+
+    def _metadata(self, path):
+        display = self.display_paths[path]
+        data = self.files[path]
+        return files.FileMetadata(name=display.rsplit('/', 1)[-1], id=self.ids[path], path_lower=path,
+                                  path_display=display, size=len(data), content_hash=content_hash(io.BytesIO(data)))
+
+    # --- Listing ---
+    # Cursors: "list:<token>:<offset>" while paging a full listing, then "delta:<log position>:<prefix>".
+    def _listing_page(self, token, offset):
+        entries, prefix, position = self._listings[token]
+        end = offset + self.page_size
+        if end < len(entries):
+            return files.ListFolderResult(entries=entries[offset:end], cursor=f"list:{token}:{end}", has_more=True)
+        return files.ListFolderResult(entries=entries[offset:end], cursor=f"delta:{position}:{prefix}", has_more=False)
+
+    def files_list_folder(self, path, recursive=False, **kwargs):
+        self._call('files_list_folder')
+        prefix = path.lower().rstrip('/') + '/'
+        with self.lock:
+            paths = sorted(p for p in self.files if p.startswith(prefix) and (recursive or '/' not in p[len(prefix):]))
+            entries = [self._metadata(p) for p in paths]
+            position = len(self.log)
+        token = uuid.uuid4().hex
+        self._listings[token] = (entries, prefix, position)
+        return self._listing_page(token, 0)
+
+    def files_list_folder_continue(self, cursor):
+        self._call('files_list_folder_continue')
+        kind, _, state = cursor.partition(':')
+        if kind not in ('list', 'delta'):
+            raise self._api_error(files.ListFolderContinueError.reset)
+        first, _, rest = state.partition(':')
+        if kind == 'list':
+            return self._listing_page(first, int(rest))
+
+        position, prefix = int(first), rest
+        with self.lock:
+            end = min(len(self.log), position + self.page_size)
+            changed = dict.fromkeys(p for p in self.log[position:end] if p.startswith(prefix))  # Latest state per path
+            entries = []
+            for path in changed:
+                if path in self.files:
+                    entries.append(self._metadata(path))
+                else:
+                    entries.append(files.DeletedMetadata(name=path.rsplit('/', 1)[-1], path_lower=path, path_display=path))
+        return files.ListFolderResult(entries=entries, cursor=f"delta:{end}:{prefix}", has_more=end < len(self.log))
+
+    # --- Downloads ---
+    def files_download_to_file(self, download_path, path, rev=None):
+        self._call('files_download_to_file')
+        path = path.lower()
+        with self.lock:
+            if path not in self.files:
+                raise self._api_error(files.DownloadError.path(files.LookupError.not_found))
+            data, metadata = self.files[path], self._metadata(path)
+        with open(download_path, 'wb') as f:
+            f.write(data)
+        return metadata
+
+    # --- Uploads ---
+    def files_upload(self, f, path, mode=None, **kwargs):
+        self._call('files_upload')
+        self.add_file(path, bytes(f))
+        with self.lock:
+            return self._metadata(path.lower())
+
+    def files_upload_session_start(self, f, **kwargs):
+        self._call('files_upload_session_start')
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[session_id] = bytearray(f)
+        return files.UploadSessionStartResult(session_id=session_id)
+
+    def _session(self, cursor, wrap):
+        data = self.sessions.get(cursor.session_id)
+        if data is None:
+            raise self._api_error(wrap(files.UploadSessionLookupError.not_found))
+        if cursor.offset != len(data):
+            offset = files.UploadSessionOffsetError(correct_offset=len(data))
+            raise self._api_error(wrap(files.UploadSessionLookupError.incorrect_offset(offset)))
+        return data
+
+    def files_upload_session_append_v2(self, f, cursor, close=False):
+        self._call('files_upload_session_append_v2')
+        with self.lock:
+            # Append errors mirror the lookup error's tags
+            self._session(cursor, lambda lookup: files.UploadSessionAppendError(lookup._tag, lookup._value)).extend(f)
+
+    def files_upload_session_finish(self, f, cursor, commit):
+        self._call('files_upload_session_finish')
+        with self.lock:
+            data = self._session(cursor, files.UploadSessionFinishError.lookup_failed)
+            del self.sessions[cursor.session_id]
+        self.add_file(commit.path, bytes(data) + bytes(f))
+        with self.lock:
+            return self._metadata(commit.path.lower())
+
+    # --- Sharing ---
+    def _link(self, path):
+        return sharing.SharedLinkMetadata(url=self.links[path], name=path.rsplit('/', 1)[-1], path_lower=path,
+                                          link_permissions=sharing.LinkPermissions(can_revoke=True))
+
+    def sharing_create_shared_link_with_settings(self, path, settings=None):
+        self._call('sharing_create_shared_link_with_settings')
+        path = path.lower()
+        with self.lock:
+            if path not in self.files:
+                raise self._api_error(sharing.CreateSharedLinkWithSettingsError.path(files.LookupError.not_found))
+            if path in self.links:
+                raise self._api_error(sharing.CreateSharedLinkWithSettingsError.shared_link_already_exists(None))
+            self.links[path] = f"https://www.dropbox.com/s/{uuid.uuid4().hex[:15]}/{path.rsplit('/', 1)[-1]}?dl=0"
+            return self._link(path)
+
+    def sharing_list_shared_links(self, path=None, cursor=None, direct_only=None):
+        self._call('sharing_list_shared_links')
+        path = (path or '').lower()
+        with self.lock:
+            links = [self._link(path)] if path in self.links else []
+        return sharing.ListSharedLinksResult(links=links, has_more=False)
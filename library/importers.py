@@ -0,0 +1,295 @@
+"""Bulk CSV import engines shared by the management commands and the bulk_import view."""
+import codecs
+import contextlib
+import csv
+import datetime
+import difflib
+import hashlib
+import re
+import time
+from collections import defaultdict
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from .models import Member, Book
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+# --- STREAMING CSV ---
+def _pick_decoder(first_chunk):
+    """UTF-8 (BOM optional) unless the first chunk proves otherwise; then Windows-1252, which Excel writes."""
+    try:
+        codecs.getincrementaldecoder('utf-8-sig')().decode(first_chunk)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'cp1252'
+    return codecs.getincrementaldecoder(encoding)(errors='replace')
+
+def iter_text_lines(chunks):
+    """Incrementally decodes byte chunks into text lines, holding at most one chunk plus a partial line."""
+    decoder = None
+    pending = ''
+    for chunk in chunks:
+        if decoder is None:
+            decoder = _pick_decoder(chunk)
+        *lines, pending = (pending + decoder.decode(chunk)).split('\n')
+        for line in lines:
+            yield line + '\n'
+    if decoder:
+        pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+def read_csv_rows(fileobj, progress=None):
+    """
+    csv.DictReader over a binary file object, read CHUNK_SIZE bytes at a time.
+    progress(bytes_read) is called after every chunk.
+    """
+    def chunks():
+        done = 0
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            done += len(chunk)
+            if progress:
+                progress(done)
+            yield chunk
+    return csv.DictReader(iter_text_lines(chunks()))
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.errors = []  # (row number, reason), capped so a bad file can't blow memory
+
+    def add_error(self, row_num, reason):
+        self.invalid += 1
+        if len(self.errors) < 100:
+            self.errors.append((row_num, reason))
+
+    def __str__(self):
+        return f"Created: {self.created}, Skipped (already exist): {self.skipped}, Invalid: {self.invalid}"
+
+def batch_scope(on_batch):
+    """
+    Without a checkpoint callback an import is one transaction (all or nothing). With one,
+    every batch commits on its own so a crashed job can resume after the last checkpoint.
+    """
+    return transaction.atomic() if on_batch is None else contextlib.nullcontext()
+
+def parse_date(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def import_members(rows, dry_run=False, batch_size=BATCH_SIZE, resume_after=0, on_batch=None):
+    """
+    Imports member dicts (CSV headers: FIRSTNAME, SURNAME, OTHERNAMES, DATEOFBIRTH, EMAIL,
+    MOBILENUMBER, RESIDENCE, LANDMARK). Existing emails/phones are preloaded into sets, so
+    duplicates are skipped in memory and new members go in with bulk_create, all inside one
+    transaction. dry_run validates and counts without writing.
+
+    on_batch(row_num, report) is called after each committed batch (see batch_scope); rows up
+    to resume_after are skipped.
+    """
+    report = ImportReport()
+    emails, phones = set(), set()
+    for email, phone in Member.objects.values_list('email', 'mobile_number').iterator(chunk_size=5000):
+        emails.add(email.lower())
+        phones.add(phone)
+    batch = []
+    row_num = resume_after
+
+    def flush():
+        if batch and not dry_run:
+            Member.objects.bulk_create(batch, batch_size=batch_size)
+        report.created += len(batch)
+        batch.clear()
+        if on_batch:
+            on_batch(row_num, report)
+
+    with batch_scope(on_batch):
+        for row_num, row in enumerate(rows, start=2):  # Row 1 is the header
+            if row_num <= resume_after:
+                continue
+            email = (row.get('EMAIL') or '').strip()
+            phone = (row.get('MOBILENUMBER') or '').strip()
+            if not email and not phone:
+                continue  # Blank line
+            try:
+                validate_email(email)
+            except ValidationError:
+                report.add_error(row_num, f"Invalid email '{email}'")
+                continue
+            if not phone:
+                report.add_error(row_num, "Missing mobile number")
+                continue
+            if email.lower() in emails or phone in phones:
+                report.skipped += 1
+                continue
+
+            emails.add(email.lower())
+            phones.add(phone)
+            batch.append(Member(
+                firstname=(row.get('FIRSTNAME') or '').strip(),
+                surname=(row.get('SURNAME') or '').strip(),
+                othernames=(row.get('OTHERNAMES') or '').strip(),
+                date_of_birth=parse_date(row.get('DATEOFBIRTH')),
+                email=email,
+                mobile_number=phone,
+                residence=(row.get('RESIDENCE') or '').strip(),
+                landmark=(row.get('LANDMARK') or '').strip(),
+            ))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    return report
+
+
+# --- BOOK METADATA ---
+PLACEHOLDER_AUTHORS = ('', 'Unknown', 'Unknown Import')
+METADATA_FIELDS = ['author', 'keywords', 'location', 'cover_url']
+_NON_WORD = re.compile(r'[\W_]+')
+
+def normalize_title(title):
+    """'100 Days Of Favor ' / '100_days_of_favor.pdf' -> '100 days of favor'"""
+    title = re.sub(r'\.(pdf|epub)$', '', (title or '').strip(), flags=re.IGNORECASE)
+    return _NON_WORD.sub(' ', title).strip().lower()
+
+def author_key(author):
+    """'Clear, James' / 'james  clear' -> 'clear james'; placeholder authors -> ''."""
+    if (author or '').strip() in PLACEHOLDER_AUTHORS:
+        return ''
+    return ' '.join(sorted(normalize_title(author).split()))
+
+def book_fingerprint(title, author):
+    """Book.fingerprint: hash of the normalized title and author, looked up to block duplicates."""
+    return hashlib.sha1(f"{normalize_title(title)}|{author_key(author)}".encode()).hexdigest()
+
+class MetadataReport:
+    def __init__(self):
+        self.matched = {'exact': 0, 'normalized': 0, 'fuzzy': 0}
+        self.created = 0
+        self.updated = 0
+        self.unmatched = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        m = self.matched
+        return (f"Created: {self.created}, Updated: {self.updated}, Skipped: {self.unmatched} "
+                f"(matched exact {m['exact']}, normalized {m['normalized']}, fuzzy {m['fuzzy']}) in {self.elapsed:.1f}s")
+
+class TitleIndex:
+    """In-memory title -> [Book] lookups, loaded with one query."""
+    def __init__(self, books):
+        self.exact = defaultdict(list)
+        self.normalized = defaultdict(list)
+        for book in books:
+            self.add(book)
+
+    def add(self, book):
+        self.exact[book.title.strip().lower()].append(book)
+        self.normalized[normalize_title(book.title)].append(book)
+
+    def match(self, title, fuzzy=False):
+        """Returns (books, how) - how is 'exact', 'normalized', 'fuzzy' or None."""
+        books = self.exact.get(title.strip().lower())
+        if books:
+            return books, 'exact'
+        key = normalize_title(title)
+        books = self.normalized.get(key)
+        if books:
+            return books, 'normalized'
+        if fuzzy and key:
+            close = difflib.get_close_matches(key, self.normalized.keys(), n=1, cutoff=0.9)
+            if close:
+                return self.normalized[close[0]], 'fuzzy'
+        return [], None
+
+def apply_metadata(book, row, overwrite=False):
+    """Copies CSV metadata onto a book. Returns True if anything changed.
+    overwrite=False only fills gaps (placeholder author, empty keywords/link/cover)."""
+    changed = False
+    author, keywords = row['author'], row['keywords']
+    if author and book.author != author and (overwrite or book.author in PLACEHOLDER_AUTHORS):
+        book.author, changed = author, True
+    if keywords and book.keywords != keywords and (overwrite or not book.keywords):
+        book.keywords, changed = keywords, True
+    if row['share_link'] and not book.location:
+        book.location, changed = row['share_link'], True
+    if row['cover_url'] and not book.cover_url:
+        book.cover_url, changed = row['cover_url'], True
+    return changed
+
+def sync_book_metadata(rows, overwrite=False, fuzzy=False, batch_size=BATCH_SIZE, resume_after=0, on_batch=None):
+    """
+    Matches CSV rows (Title, Author, Keywords, Shareable Link, Cover URL) against the catalog
+    in memory - exact title, then normalized title, then optionally fuzzy - updating matched
+    books and creating unmatched ones that have a link. Writes are batched with
+    bulk_create/bulk_update in one transaction (or per batch with on_batch, as import_members).
+    """
+    start = time.perf_counter()
+    report = MetadataReport()
+    index = TitleIndex(Book.objects.only('book_id', 'title', *METADATA_FIELDS))
+    to_create = []
+    to_update = {}  # book_id -> Book, so a book matched by several rows in a batch is written once
+    row_num = resume_after
+
+    def flush():
+        for book in to_create + list(to_update.values()):
+            book.fingerprint = book_fingerprint(book.title, book.author)
+        Book.objects.bulk_create(to_create, batch_size=batch_size)
+        Book.objects.bulk_update(list(to_update.values()), METADATA_FIELDS + ['fingerprint'], batch_size=batch_size)
+        report.created += len(to_create)
+        report.updated += len(to_update)
+        to_create.clear()
+        to_update.clear()
+        if on_batch:
+            on_batch(row_num, report)
+
+    with batch_scope(on_batch):
+        for row_num, row in enumerate(rows, start=2):
+            if row_num <= resume_after:
+                continue
+            sync_row(row, index, report, to_create, to_update, overwrite, fuzzy)
+            if (row_num - 1) % batch_size == 0:
+                flush()
+        flush()
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+def sync_row(row, index, report, to_create, to_update, overwrite, fuzzy):
+    """Matches one metadata row, queueing the book to update or create."""
+    title = (row.get('Title') or '').strip()
+    if not title:
+        return
+    data = {
+        'author': (row.get('Author') or '').strip(),
+        'keywords': (row.get('Keywords') or '').strip(),
+        'share_link': (row.get('Shareable Link') or '').strip(),
+        'cover_url': (row.get('Cover URL') or '').strip(),
+    }
+
+    books, how = index.match(title, fuzzy=fuzzy)
+    if how:
+        report.matched[how] += 1
+        for book in books:
+            if apply_metadata(book, data, overwrite=overwrite):
+                if book.pk:
+                    to_update[book.pk] = book
+    elif data['share_link']:
+        book = Book(title=title, author=data['author'] or 'Unknown', keywords=data['keywords'],
+                    location=data['share_link'], cover_url=data['cover_url'], type='SC',
+                    owner='FAYM', availability='Available')
+        to_create.append(book)
+        index.add(book)  # Later rows with the same title update this one instead of duplicating it
+    else:
+        report.unmatched += 1
@@ -0,0 +1,225 @@
+"""
+Tracked background jobs (ImportJob). Dropbox syncs, CSV uploads and admin book uploads run off
+the request path, write throttled progress to their row, and can be resumed if the worker dies
+mid-run: CSV imports commit per batch and restart after the last checkpointed row; Dropbox
+syncs restart from the folder's saved cursor and recognise the books they already created;
+book uploads continue their Dropbox upload session from the last chunk.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+from .dropbox_client import get_client
+from .dropbox_import import import_folder
+from .dropbox_upload import upload_book
+from .importers import import_members, sync_book_metadata, read_csv_rows
+from . import metrics
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 1.0  # seconds between progress writes
+STALE_AFTER = timedelta(minutes=2)  # A running job silent this long is presumed dead
+MAX_ATTEMPTS = 3
+MAX_ERRORS = 20
+
+IMPORTERS = {
+    'import_members': import_members,
+    'update_metadata': sync_book_metadata,
+}
+
+class JobTracker:
+    """Buffers progress for one job; flushes it with a single UPDATE at most once per HEARTBEAT_INTERVAL."""
+    def __init__(self, job):
+        self.job = job
+        self.pending = {}
+        self.last_write = 0.0
+
+    def update(self, force=False, **fields):
+        if fields.get('processed', 0) > self.job.processed:
+            metrics.inc('elib_import_processed_total', {'kind': self.job.kind}, fields['processed'] - self.job.processed)
+        for name, value in fields.items():
+            setattr(self.job, name, value)
+        self.pending.update(fields)
+        now = time.monotonic()
+        if force or now - self.last_write >= HEARTBEAT_INTERVAL:
+            self.last_write = now
+            self.job.heartbeat_at = timezone.now()
+            ImportJob.objects.filter(pk=self.job.pk).update(heartbeat_at=self.job.heartbeat_at, **self.pending)
+            self.pending = {}
+
+    def finish(self, status, message, **fields):
+        self.update(force=True, status=status, message=message, finished_at=timezone.now(), **fields)
+        metrics.inc('elib_import_jobs_finished_total', {'kind': self.job.kind, 'status': status})
+        if self.job.started_at:
+            metrics.observe('elib_import_job_duration_seconds', (self.job.finished_at - self.job.started_at).total_seconds(),
+                            {'kind': self.job.kind})
+
+def claimable(now=None):
+    """Queued jobs, plus running ones whose worker stopped sending heartbeats."""
+    now = now or timezone.now()
+    return Q(status='queued') | Q(status='running', heartbeat_at__lt=now - STALE_AFTER)
+
+def stale(now=None):
+    """Jobs nobody is working on: queued for longer than STALE_AFTER (the process that queued them
+    died before its thread started them), or running without heartbeats. A fresh queued job
+    belongs to the web thread started with it, which has its spooled upload on local disk."""
+    now = now or timezone.now()
+    return Q(status='queued', created_at__lt=now - STALE_AFTER) | Q(status='running', heartbeat_at__lt=now - STALE_AFTER)
+
+def claim(job_id):
+    """Atomically takes the job for this worker. Returns it, or None if it's taken, finished or out of attempts."""
+    now = timezone.now()
+    taken = ImportJob.objects.filter(claimable(now), pk=job_id, attempts__lt=MAX_ATTEMPTS).update(
+        status='running', heartbeat_at=now, attempts=F('attempts') + 1)
+    if not taken:
+        return None
+    job = ImportJob.objects.get(pk=job_id)
+    if not job.started_at:
+        job.started_at = now
+        job.save(update_fields=['started_at'])
+    return job
+
+def run_job(job_id):
+    job = claim(job_id)
+    if not job:
+        return
+    tracker = JobTracker(job)
+    try:
+        RUNNERS[job.kind](job, tracker)
+    except Exception as e:
+        logger.exception("Import job #%s (%s) failed", job.pk, job.kind)
+        tracker.finish('failed', f"Import Error: {e}")
+        if job.params.get('path') and os.path.exists(job.params['path']):
+            os.remove(job.params['path'])
+
+# --- Runners ---
+def csv_counters(kind, report):
+    if kind == 'import_members':
+        return {'created': report.created, 'skipped': report.skipped, 'failed': report.invalid}
+    return {'created': report.created + report.updated, 'skipped': report.unmatched, 'failed': 0}
+
+def run_csv_import(job, tracker):
+    path = job.params['path']
+    if not os.path.exists(path):
+        raise FileNotFoundError("The uploaded file is no longer available. Please upload it again.")
+    size = os.path.getsize(path) or 1
+    checkpoint = job.checkpoint or {'row': 0, 'created': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+
+    def totals(report):
+        counts = csv_counters(job.kind, report)
+        return {name: checkpoint[name] + counts[name] for name in counts}
+
+    def errors(report):
+        new = [f"Row {n}: {reason}" for n, reason in getattr(report, 'errors', [])]
+        return (checkpoint['errors'] + new)[:MAX_ERRORS]
+
+    def on_batch(row_num, report):
+        counts = totals(report)
+        tracker.update(force=True, processed=row_num - 1, errors=errors(report),
+                       checkpoint={'row': row_num, 'errors': errors(report), **counts}, **counts)
+
+    def progress(done):
+        tracker.update(progress=min(99, int(done * 100 / size)))
+
+    with open(path, 'rb') as f:
+        report = IMPORTERS[job.kind](read_csv_rows(f, progress=progress), resume_after=checkpoint['row'],
+                                     on_batch=on_batch, **job.params.get('options', {}))
+    resumed = f"Resumed after row {checkpoint['row']}. " if checkpoint['row'] else ''
+    tracker.finish('done', resumed + str(report), progress=100, errors=errors(report), **totals(report))
+    os.remove(path)
+
+def run_dropbox_sync(job, tracker):
+    errors = []
+
+    def progress(done, total):
+        tracker.update(processed=done, total=total, progress=min(99, int(done * 100 / (total or 1))))
+
+    def log(msg):
+        if len(errors) < MAX_ERRORS:
+            errors.append(msg)
+
+    report = import_folder(get_client(), job.params['folder'], full=job.params.get('full', False),
+                           log=log, progress=progress)
+    tracker.finish('done', str(report), progress=100, processed=report.listed, total=report.listed,
+                   created=report.created, skipped=report.existing, failed=report.failed, errors=errors)
+
+def run_book_upload(job, tracker):
+    def on_chunk(session_id, offset):
+        tracker.update(force=True, checkpoint={'session_id': session_id, 'offset': offset})
+
+    def progress(done, size):
+        tracker.update(processed=done, total=size, progress=min(99, int(done * 100 / (size or 1))))
+
+    link = upload_book(get_client(), job.params['book_id'], job.params['file'], checkpoint=job.checkpoint,
+                       on_chunk=on_chunk, progress=progress)
+    tracker.finish('done', f"Uploaded and linked: {link}", progress=100, created=1)
+
+RUNNERS = {
+    'sync_dropbox': run_dropbox_sync,
+    'import_members': run_csv_import,
+    'update_metadata': run_csv_import,
+    'upload_book': run_book_upload,
+}
+
+# --- Starting and resuming ---
+def save_upload(uploaded_file):
+    """Spools an upload to a temp file chunk by chunk (never fully in memory). Returns the path."""
+    with tempfile.NamedTemporaryFile(prefix='elib_import_', suffix='.csv', delete=False) as tmp:
+        for chunk in uploaded_file.chunks():
+            tmp.write(chunk)
+    return tmp.name
+
+def run_in_background(func, *args, **kwargs):
+    def target():
+        try:
+            func(*args, **kwargs)
+        finally:
+            connections.close_all()  # This thread's connections only
+    threading.Thread(target=target, daemon=True).start()
+
+def start_job(kind, name='', user=None, **params):
+    """Records the job and runs it in a background thread. Returns the ImportJob."""
+    job = ImportJob.objects.create(kind=kind, name=name, params=params, created_by=user)
+    run_in_background(run_job, job.pk)
+    return job
+
+def start_csv_import(kind, uploaded_file, user=None, **options):
+    return start_job(kind, name=uploaded_file.name, user=user, path=save_upload(uploaded_file), options=options)
+
+def start_book_upload(book, path):
+    """Queues the Dropbox upload of a book's stored file_upload (see Book.save). If it fails, the
+    file is kept and the book stays Pending Upload; the error shows in the import history."""
+    return start_job('upload_book', name=book.title, book_id=book.pk, file=path)
+
+def resume_stale_jobs():
+    """
+    Restarts jobs left behind by a dead worker (or queued but never picked up) in background
+    threads, and fails those that have used up their attempts. Returns how many were restarted.
+    """
+    now = timezone.now()
+    jobs = ImportJob.objects.filter(stale(now))
+    jobs.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='failed', finished_at=now, message=f"Gave up after {MAX_ATTEMPTS} interrupted attempts.")
+    job_ids = list(jobs.filter(attempts__lt=MAX_ATTEMPTS).values_list('pk', flat=True))
+    for job_id in job_ids:
+        run_in_background(run_job, job_id)
+    return len(job_ids)
+
+def job_status(job_id):
+    """Poll payload for one job: a single primary key lookup."""
+    job = ImportJob.objects.filter(pk=job_id).defer('params', 'checkpoint').first()
+    if not job:
+        return None
+    return {
+        'id': job.pk, 'kind': job.get_kind_display(), 'name': job.name, 'state': job.status,
+        'progress': job.progress, 'processed': job.processed, 'total': job.total,
+        'created': job.created, 'skipped': job.skipped, 'failed': job.failed,
+        'throughput': round(job.throughput, 1), 'message': job.message, 'errors': job.errors,
+        'attempts': job.attempts,
+    }
@@ -0,0 +1,70 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from library.models import Book, BookRequest, Member
+from library.synthetic import create_backdated_requests
+
+STATUSES = ['Approved'] * 15 + ['Not Approved', 'Expired', 'Expired', 'Pending']
+CHUNK = 50000
+
+class Command(BaseCommand):
+    help = 'Times the request-side queries joining Book for its type vs reading BookRequest.book_type (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1_000_000, help='BookRequest rows to seed')
+        parser.add_argument('--books', type=int, default=5000)
+        parser.add_argument('--members', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query, averaged')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            member = self.seed(options['requests'], options['books'], options['members'])
+            self.stdout.write(f"Seeded {options['requests']} requests in {time.perf_counter() - start:.1f}s")
+
+            now = timezone.now()
+            queries = {
+                'SC weekly limit': lambda t: BookRequest.objects.filter(member=member, timestamp__gte=now - timedelta(days=7), **t('SC')).count(),
+                'HC unreturned check': lambda t: BookRequest.objects.filter(member=member, **t('HC')).exclude(return_status='Returned').exists(),
+                'HC round-robin count': lambda t: BookRequest.objects.filter(**t('HC')).count(),
+                'HC pending expiry': lambda t: list(BookRequest.objects.filter(approval_status='Pending', timestamp__lt=now - timedelta(hours=5), **t('HC')).values_list('pk', flat=True)),
+                'Pending returns': lambda t: list(BookRequest.objects.filter(approval_status='Approved', **t('HC')).exclude(return_status='Returned').order_by('expected_return_date').values_list('pk', flat=True)),
+            }
+            joined = lambda book_type: {'book__type': book_type}
+            copied = lambda book_type: {'book_type': book_type}
+
+            self.stdout.write(f"{'Query':<24}{'Join ms':>10}{'Column ms':>11}{'Speedup':>9}")
+            for name, query in queries.items():
+                before, after = self.time(query, joined, options['repeat']), self.time(query, copied, options['repeat'])
+                self.stdout.write(f"{name:<24}{before:>10.2f}{after:>11.2f}{before / after:>8.1f}x")
+            transaction.set_rollback(True)
+
+    def seed(self, count, book_count, member_count):
+        books = Book.objects.bulk_create(
+            (Book(title=f'Bench Book {i}', type='HC' if i % 3 else 'SC', author='Bench', owner='FAYM', location='x',
+                  keywords='') for i in range(book_count)), batch_size=5000)
+        members = Member.objects.bulk_create(
+            (Member(firstname='Bench', surname=str(i), email=f'bench{i}@example.com', mobile_number=f'0209{i:07d}')
+             for i in range(member_count)), batch_size=5000)
+        now = timezone.now()
+
+        for first in range(0, count, CHUNK):  # bulk_create lists its input, so feed it in chunks
+            create_backdated_requests([
+                BookRequest(full_name='Bench', email='bench@example.com', member=members[i % member_count],
+                            book=books[i % book_count], book_type=books[i % book_count].type,
+                            approval_status=STATUSES[i % len(STATUSES)], token=f'bench-{i}',
+                            return_status='Pending' if i % 50 == 0 else 'Returned',
+                            timestamp=now - timedelta(minutes=i), expected_return_date=now + timedelta(days=i % 14))
+                for i in range(first, min(first + CHUNK, count))])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return members[0]
+
+    def time(self, query, filters, repeat):
+        query(filters)  # Warm the page cache
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query(filters)
+        return (time.perf_counter() - start) * 1000 / repeat
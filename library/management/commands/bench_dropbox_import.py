@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from library.dropbox_import import import_folder
+from library.fake_dropbox import FakeDropbox
+
+class Command(BaseCommand):
+    help = 'Benchmarks import_dropbox offline against a fake Dropbox client (rolled back, DB untouched)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=2000, help='Files in the fake folder')
+        parser.add_argument('--existing', type=float, default=0.1, help='Fraction of files already linked')
+        parser.add_argument('--latency', type=float, default=0.05, help='Simulated seconds per API call')
+        parser.add_argument('--workers', default='1,4,8,16', help='Comma separated worker counts to compare')
+        parser.add_argument('--rate', type=float, default=1000, help='API calls per second limit')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'Workers':>8}{'Seconds':>10}{'Files/s':>10}{'API calls':>11}")
+        for workers in [int(w) for w in options['workers'].split(',')]:
+            dbx = FakeDropbox(latency=options['latency'])
+            for i in range(options['files']):
+                dbx.add_file(f"/Books/Bench_Book_{i:06d}.pdf")
+            for i in range(int(options['files'] * options['existing'])):
+                dbx.links[f"/books/bench_book_{i:06d}.pdf"] = f"https://example.com/{i}"
+
+            with transaction.atomic():
+                report = import_folder(dbx, '/Books', workers=workers, rate=options['rate'], log=lambda msg: None)
+                transaction.set_rollback(True)
+
+            self.stdout.write(f"{workers:>8}{report.elapsed:>10.2f}{report.listed / report.elapsed:>10.0f}"
+                              f"{sum(dbx.calls.values()):>11}")
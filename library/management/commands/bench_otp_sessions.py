@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from library.models import Book, Member, OTPRecord
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+    'django.contrib.sessions.backends.signed_cookies',
+]
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+class Command(BaseCommand):
+    help = 'Counts DB writes made by the OTP -> verify -> submit flow for each session engine (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help='Number of OTP flows per engine')
+
+    def handle(self, *args, **options):
+        runs = options['runs']
+        results = {}
+        for engine in ENGINES:
+            results[engine] = self.run_engine(engine, runs)
+
+        self.stdout.write(f"{'Engine':<52}{'Writes':>8}{'Session writes':>16}{'Per flow':>10}")
+        for engine, (writes, session_writes) in results.items():
+            self.stdout.write(f"{engine:<52}{writes:>8}{session_writes:>16}{writes / runs:>10.1f}")
+
+        session_writes = sum(s for _, s in results.values())
+        self.stdout.write(self.style.SUCCESS(f"{session_writes} django_session writes across all engines "
+                                             "(OTP state lives in its own signed cookie)."))
+
+    def run_engine(self, engine, runs):
+        # Everything happens inside one rolled-back transaction, so the real DB is untouched.
+        # SMS is disabled by blanking the Wigal credentials, email goes to the in-memory backend.
+        with override_settings(SESSION_ENGINE=engine, WIGAL_API_KEY='', WIGAL_USERNAME='',
+                               EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            with transaction.atomic():
+                book = Book.objects.create(title='Bench Book', type='SC', author='Bench', owner='FAYM',
+                                           location='https://example.com/bench.pdf', keywords='')
+                members = [
+                    Member.objects.create(firstname='Bench', surname=str(i),
+                                          email=f'bench{i}@example.com', mobile_number=f'0209{i:06d}')
+                    for i in range(runs)
+                ]
+                cache.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    for i, member in enumerate(members):
+                        client = Client(REMOTE_ADDR=f'10.0.{i // 250}.{i % 250}')
+                        client.post('/send-otp/', {'identity': member.email})
+                        otp = OTPRecord.objects.filter(phone_number=member.mobile_number).latest('id')
+                        client.post('/verify-otp/', {'otp_code': otp.otp_code})
+                        client.post('/request/', {'book_id': book.book_id})
+                transaction.set_rollback(True)
+
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith(WRITE_PREFIXES)]
+        session_writes = [sql for sql in writes if 'django_session' in sql]
+        return len(writes), len(session_writes)
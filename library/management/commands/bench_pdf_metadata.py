@@ -0,0 +1,62 @@
+import io
+import shutil
+import tempfile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from PIL import Image, ImageDraw
+from library.fake_dropbox import FakeDropbox
+from library.models import Book, DropboxFile
+from library.pdf_metadata import extract_metadata
+
+def sample_pdf(i, pages):
+    """A scanned-book-like PDF: `pages` full-page images with embedded metadata."""
+    images = []
+    for page in range(pages):
+        image = Image.new('RGB', (1240, 1754), (250, 248, 240))
+        ImageDraw.Draw(image).text((100, 100), f"Bench Book {i} - page {page + 1}", fill=(0, 0, 0))
+        images.append(image)
+    buffer = io.BytesIO()
+    images[0].save(buffer, 'PDF', save_all=True, append_images=images[1:], title=f"Bench Book {i}",
+                   author='Bench Author', subject='Benchmarks', keywords='bench, pdf')
+    return buffer.getvalue()
+
+class Command(BaseCommand):
+    help = 'Benchmarks extract_pdf_metadata offline on generated PDFs (fake Dropbox, rolled back, DB untouched)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=100, help='PDFs in the fake folder')
+        parser.add_argument('--pages', type=int, default=3, help='Pages per PDF')
+        parser.add_argument('--latency', type=float, default=0.02, help='Simulated seconds per Dropbox call')
+        parser.add_argument('--workers', default='1,2,4', help='Comma separated parser process counts to compare')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Generating {options['files']} PDFs...")
+        pdfs = [sample_pdf(i, options['pages']) for i in range(options['files'])]
+        thumbs = tempfile.mkdtemp()
+        self.stdout.write(f"{'Workers':>8}{'Seconds':>10}{'PDFs/s':>10}{'Rerun s':>10}")
+        try:
+            with override_settings(COVER_THUMBNAIL_ROOT=thumbs):
+                for workers in [int(w) for w in options['workers'].split(',')]:
+                    dbx = FakeDropbox(latency=options['latency'])
+                    with transaction.atomic():
+                        ids = []
+                        for i, data in enumerate(pdfs):
+                            dbx.add_file(f"/Books/Bench_Book_{i:05d}.pdf", data)
+                            metadata = dbx._metadata(f"/books/bench_book_{i:05d}.pdf")
+                            book = Book.objects.create(title=f"Bench Book {i:05d}", type='SC', author='Unknown Import',
+                                                       owner='FAYM', location='x', keywords='')
+                            DropboxFile.objects.create(file_id=metadata.id, path_lower=metadata.path_lower,
+                                                       content_hash=metadata.content_hash, book=book)
+                            ids.append(book.pk)
+                        # Only the generated books: the catalog's own have no files in the fake Dropbox
+                        books = Book.objects.filter(pk__in=ids)
+                        report = extract_metadata(dbx, books=books, workers=workers, rate=1000, log=lambda msg: None)
+                        # Same files again: everything comes from the content-hash cache
+                        books.update(author='Unknown Import', keywords='')
+                        rerun = extract_metadata(dbx, books=books, workers=workers, rate=1000, log=lambda msg: None)
+                        transaction.set_rollback(True)
+                    self.stdout.write(f"{workers:>8}{report.elapsed:>10.2f}{report.parsed / report.elapsed:>10.1f}"
+                                      f"{rerun.elapsed:>10.2f}")
+        finally:
+            shutil.rmtree(thumbs)
@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+
+def write_loop(seconds, counts):
+    """One thread: short read-then-write transactions, like a request saving a BookRequest."""
+    from django.db import OperationalError, connection, transaction
+    counts.update(writes=0, locked=0, other=0)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SELECT MAX(id) FROM bench_writes')
+                cursor.execute('INSERT INTO bench_writes (note) VALUES (%s)', ['x' * 200])
+            counts['writes'] += 1
+        except OperationalError as e:
+            counts['locked' if 'locked' in str(e) else 'other'] += 1
+    connection.close()
+
+def worker(tuned, threads, seconds, results):
+    """One process (a gunicorn worker) with `threads` writers (its notification threads)."""
+    import django
+    from django.conf import settings
+    django.setup()
+    if not tuned:
+        settings.DATABASES['default']['OPTIONS'] = {}  # Django's defaults: rollback journal, 5s timeout, DEFERRED
+    per_thread = [{} for _ in range(threads)]
+    pool = [threading.Thread(target=write_loop, args=(seconds, counts)) for counts in per_thread]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put({key: sum(c[key] for c in per_thread) for key in per_thread[0]})
+
+class Command(BaseCommand):
+    help = "Measures concurrent SQLite write throughput and 'database is locked' errors, default vs tuned settings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help='Simulated gunicorn workers')
+        parser.add_argument('--threads', type=int, default=4, help='Writer threads per process')
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'Profile':<10}{'Writes':>8}{'Writes/s':>10}{'Locked':>8}{'Other errors':>14}")
+        for profile in ('default', 'tuned'):
+            counts = self.run(profile == 'tuned', options['processes'], options['threads'], options['seconds'])
+            self.stdout.write(f"{profile:<10}{counts['writes']:>8}{counts['writes'] / options['seconds']:>10.0f}"
+                              f"{counts['locked']:>8}{counts['other']:>14}")
+
+    def run(self, tuned, processes, threads, seconds):
+        # A scratch database per profile: WAL is a property of the file, so the two runs must not share one
+        folder = tempfile.mkdtemp(prefix='elib_sqlite_bench_')
+        path = os.path.join(folder, 'bench.sqlite3')
+        with sqlite3.connect(path) as db:
+            db.execute('CREATE TABLE bench_writes (id INTEGER PRIMARY KEY, note TEXT)')
+        db.close()
+
+        ctx = multiprocessing.get_context('spawn')  # Fresh interpreters, like separate gunicorn workers
+        results = ctx.Queue()
+        old_url = os.environ.get('DATABASE_URL')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+        try:
+            procs = [ctx.Process(target=worker, args=(tuned, threads, seconds, results)) for _ in range(processes)]
+            for p in procs:
+                p.start()
+            totals = {'writes': 0, 'locked': 0, 'other': 0}
+            for _ in procs:
+                for key, value in results.get().items():
+                    totals[key] += value
+            for p in procs:
+                p.join()
+        finally:
+            if old_url is None:
+                os.environ.pop('DATABASE_URL')
+            else:
+                os.environ['DATABASE_URL'] = old_url
+            for name in os.listdir(folder):
+                os.remove(os.path.join(folder, name))
+            os.rmdir(folder)
+        return totals
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from library.thumbnails import build_thumbnails, prune_thumbnails, DEFAULT_WORKERS, DEFAULT_RATE
+from library.models import Book
+
+class Command(BaseCommand):
+    help = 'Downloads book covers once and builds small WebP/JPEG thumbnails for the catalog (run after fetch_covers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent downloads/resizes')
+        parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Max downloads per second')
+        parser.add_argument('--rebuild', action='store_true', help='Rebuild every cover, not just new/changed ones')
+        parser.add_argument('--prune', action='store_true', help='Delete thumbnail files no book uses any more')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(cover_url__isnull=True).exclude(cover_url='') if options['rebuild'] else None
+        report = build_thumbnails(books, workers=options['workers'], rate=options['rate'],
+                                  log=lambda msg: self.stdout.write(self.style.ERROR(msg)))
+        self.stdout.write(self.style.SUCCESS(f"Thumbnails done. {report}"))
+        if options['prune']:
+            self.stdout.write(f"Removed {prune_thumbnails()} unused thumbnail files.")
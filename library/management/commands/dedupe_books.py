@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from library.dedup import dedupe_books, THRESHOLD
+
+class Command(BaseCommand):
+    help = 'Finds near-duplicate books (similar titles, compatible authors) and optionally merges them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--merge', action='store_true', help='Merge each cluster into one book (default: only list them)')
+        parser.add_argument('--include-hard-copies', action='store_true',
+                            help='Also merge hard-copy clusters (only if they are one physical book entered twice)')
+        parser.add_argument('--threshold', type=float, default=THRESHOLD, help='Title similarity needed, 0-1')
+
+    def handle(self, *args, **options):
+        report = dedupe_books(merge=options['merge'], threshold=options['threshold'],
+                              include_hard_copies=options['include_hard_copies'],
+                              log=lambda msg: self.stdout.write(msg))
+        prefix = "" if options['merge'] else "[DRY RUN] "
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{report}"))
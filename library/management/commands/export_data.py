@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from library.exports import EXPORTS, stream_csv, write_xlsx, export_filename
+import time
+
+class Command(BaseCommand):
+    help = 'Exports full BookRequest or ReturnLog history to CSV/XLSX without loading it all into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS), help='What to export')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--output', help='Output path (default: faym_<kind>_<date>.<format>)')
+
+    def handle(self, *args, **options):
+        kind, fmt = options['kind'], options['format']
+        output = options['output'] or export_filename(kind, fmt)
+
+        start = time.perf_counter()
+        try:
+            if fmt == 'csv':
+                with open(output, 'w', encoding='utf-8', newline='') as f:
+                    for line in stream_csv(kind):
+                        f.write(line)
+            else:
+                write_xlsx(kind, output)
+        except OSError as e:
+            self.stdout.write(self.style.ERROR(f"Could not write {output}: {e}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {kind} to {output} in {time.perf_counter() - start:.1f}s."))
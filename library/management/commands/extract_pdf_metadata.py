@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from library.pdf_metadata import extract_metadata, DEFAULT_WORKERS, DEFAULT_DOWNLOADS, DEFAULT_RATE
+from library.dropbox_client import get_client
+
+class Command(BaseCommand):
+    help = 'Reads author/title/keywords/page count and a first-page cover from soft copy PDFs in Dropbox (run after import_dropbox)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Parser processes')
+        parser.add_argument('--downloads', type=int, default=DEFAULT_DOWNLOADS, help='Concurrent Dropbox downloads')
+        parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Max Dropbox downloads per second')
+        parser.add_argument('--reparse', action='store_true', help='Ignore cached results and parse every PDF again')
+
+    def handle(self, *args, **options):
+        try:
+            dbx = get_client()
+        except RuntimeError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        report = extract_metadata(dbx, workers=options['workers'], downloads=options['downloads'],
+                                  rate=options['rate'], reparse=options['reparse'],
+                                  log=lambda msg: self.stdout.write(self.style.ERROR(msg)))
+        self.stdout.write(self.style.SUCCESS(f"PDF metadata done. {report}"))
@@ -1,49 +1,21 @@
 from django.core.management.base import BaseCommand
-from library.models import Book
-import requests
-import time
+from library.covers import CoverFetcher, fetch_covers, OPENLIBRARY_URL, DEFAULT_WORKERS, DEFAULT_RATE, TIMEOUT
 
 class Command(BaseCommand):
     help = 'Fetches book covers from Open Library API'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent searches')
+        parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Max searches per second')
+        parser.add_argument('--timeout', type=float, default=TIMEOUT, help='Seconds per request')
+        parser.add_argument('--refresh', action='store_true', help='Ignore cached lookups (found and not found)')
+        parser.add_argument('--base-url', default=OPENLIBRARY_URL, help='OpenLibrary API root')
+
     def handle(self, *args, **options):
-        books = Book.objects.filter(cover_url__isnull=True)
-        self.stdout.write(f"checking {books.count()} books for covers...")
-        
-        updated = 0
-        for book in books:
-            try:
-                # Search by Title + Author (if available)
-                query = f"title={book.title}"
-                if book.author and book.author not in ['Unknown', 'Unknown Import']:
-                    query += f"&author={book.author}"
-                
-                # Using OpenLibrary Search API
-                search_url = f"https://openlibrary.org/search.json?{query}&limit=1"
-                response = requests.get(search_url)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('docs'):
-                        doc = data['docs'][0]
-                        cover_i = doc.get('cover_i')
-                        
-                        if cover_i:
-                            # Construct Cover URL
-                            image_url = f"https://covers.openlibrary.org/b/id/{cover_i}-L.jpg"
-                            book.cover_url = image_url
-                            book.save()
-                            updated += 1
-                            self.stdout.write(self.style.SUCCESS(f"Found cover for: {book.title}"))
-                        else:
-                             self.stdout.write(f"No cover found for: {book.title}")
-                    else:
-                        self.stdout.write(f"No match for: {book.title}")
-                
-                # Be nice to the API
-                time.sleep(0.5)
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Error checking {book.title}: {e}"))
-                
-        self.stdout.write(self.style.SUCCESS(f"Updated {updated} books with covers."))
+        fetcher = CoverFetcher(options['base_url'], rate=options['rate'], timeout=options['timeout'])
+        try:
+            report = fetch_covers(fetcher, workers=options['workers'], refresh=options['refresh'],
+                                  log=lambda msg: self.stdout.write(self.style.ERROR(msg)))
+        finally:
+            fetcher.close()
+        self.stdout.write(self.style.SUCCESS(f"Updated {report.found} books with covers. {report}"))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from library.synthetic import generate
+
+class Command(BaseCommand):
+    help = 'Fills the database with a synthetic catalog (books, members, request history) for scale and load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100_000)
+        parser.add_argument('--members', type=int, default=50_000)
+        parser.add_argument('--requests', type=int, default=2_000_000)
+        parser.add_argument('--days', type=int, default=730, help='How far back the request history goes')
+        parser.add_argument('--seed', type=int, default=1, help='Same seed, same data')
+        parser.add_argument('--force', action='store_true', help='Run even with DEBUG off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            self.stdout.write(self.style.ERROR("DEBUG is off - this may be a live database. Use --force to generate anyway."))
+            return
+        report = generate(books=options['books'], members=options['members'], requests=options['requests'],
+                          days=options['days'], seed=options['seed'], log=lambda msg: self.stdout.write(msg))
+        self.stdout.write(self.style.SUCCESS(str(report)))
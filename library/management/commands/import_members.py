@@ -1,13 +1,14 @@
 from django.core.management.base import BaseCommand
-from library.models import Member
-import csv
-import datetime
+from library.importers import import_members, read_csv_rows, BATCH_SIZE
+import time
 
 class Command(BaseCommand):
     help = 'Imports members from a CSV file'
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file', type=str, help='Path to the CSV file')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and count without writing')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
 
     def handle(self, *args, **options):
         csv_file_path = options['csv_file']
@@ -15,42 +16,15 @@ class Command(BaseCommand):
         self.stdout.write(f"Reading {csv_file_path}...")
         
         try:
-            with open(csv_file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                count = 0
-                for row in reader:
-                    # Map CSV columns to Model fields
-                    # Expected CSV headers: FIRSTNAME, SURNAME, OTHERNAMES, DATEOFBIRTH, EMAIL, MOBILENUMBER, RESIDENCE, LANDMARK
-                    
-                    email = row.get('EMAIL', '').strip()
-                    if not email:
-                        continue # Skip empty rows
-                        
-                    dob = None
-                    dob_str = row.get('DATEOFBIRTH', '').strip()
-                    if dob_str:
-                        try:
-                            dob = datetime.datetime.strptime(dob_str, '%Y-%m-%d').date()
-                        except ValueError:
-                            pass # Handle other formats or skip
-                    
-                    obj, created = Member.objects.get_or_create(
-                        email=email,
-                        defaults={
-                            'firstname': row.get('FIRSTNAME', ''),
-                            'surname': row.get('SURNAME', ''),
-                            'othernames': row.get('OTHERNAMES', ''),
-                            'date_of_birth': dob,
-                            'mobile_number': row.get('MOBILENUMBER', ''),
-                            'residence': row.get('RESIDENCE', ''),
-                            'landmark': row.get('LANDMARK', ''),
-                        }
-                    )
-                    
-                    if created:
-                        count += 1
-                        
-                self.stdout.write(self.style.SUCCESS(f'Successfully imported {count} new members.'))
+            start = time.perf_counter()
+            # Expected CSV headers: FIRSTNAME, SURNAME, OTHERNAMES, DATEOFBIRTH, EMAIL, MOBILENUMBER, RESIDENCE, LANDMARK
+            with open(csv_file_path, 'rb') as f:
+                report = import_members(read_csv_rows(f), dry_run=options['dry_run'], batch_size=options['batch_size'])
+
+            for row_num, reason in report.errors:
+                self.stdout.write(self.style.WARNING(f"Row {row_num}: {reason}"))
+            prefix = "[DRY RUN] " if options['dry_run'] else ""
+            self.stdout.write(self.style.SUCCESS(f'{prefix}{report} in {time.perf_counter() - start:.1f}s.'))
         except FileNotFoundError:
              self.stdout.write(self.style.ERROR('File not found.'))
         except Exception as e:
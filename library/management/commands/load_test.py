@@ -0,0 +1,212 @@
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+ENDPOINTS = ['index', 'search', 'suggest', 'send otp', 'verify otp', 'submit']
+SAMPLE = 2000  # Members and books the virtual users pick from
+
+def serve(port):
+    """The built-in target: this project's WSGI app in its own process, with SMS and email stubbed."""
+    import django
+    django.setup()
+    settings.WIGAL_API_KEY = ''  # send_sms_wigal returns before calling Wigal
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    sys.stdout = open(os.devnull, 'w')  # "SMS skipped" on every OTP
+    from django.core.servers.basehttp import get_internal_wsgi_application, run
+    app = get_internal_wsgi_application()  # wsgi.py runs django.setup() again, resetting logging
+    logging.getLogger('django.server').setLevel(logging.ERROR)  # No access log line per request
+    run('127.0.0.1', port, app, threading=True)
+
+def percentiles(samples):
+    """p50, p95, p99 in milliseconds."""
+    if len(samples) < 2:
+        return [s * 1000 for s in samples * 3] or [0.0] * 3
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+class VirtualUser:
+    """
+    One visitor after another on a single thread: lands on the index, searches, types into
+    the suggest box, verifies by OTP (read back from OTPRecord, since no SMS goes out) and
+    requests a book. Each visitor gets a fresh session and its own forwarded IP, so the
+    send_otp rate limit applies per visitor as it would in production.
+    """
+
+    def __init__(self, base_url, number, sample, deadline):
+        self.base_url = base_url
+        self.number = number
+        self.sample = sample
+        self.deadline = deadline
+        self.rng = random.Random(number)
+        self.timings = defaultdict(list)
+        self.errors = Counter()
+        self.rejected = Counter()
+        self.tokens = []  # What this user created, for clean-up
+        self.otp_ids = []
+
+    def call(self, session, name, method, path, **kwargs):
+        """The JSON body (or {} for HTML), or None if the request failed."""
+        start = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, timeout=30, **kwargs)
+        except requests.RequestException:
+            self.errors[name] += 1
+            return None
+        self.timings[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            return None
+        body = response.json() if response.headers.get('Content-Type') == 'application/json' else {}
+        if isinstance(body, dict) and body.get('status') == 'error':  # Rate or borrowing limit: a valid answer
+            self.rejected[name] += 1
+            return None
+        return body
+
+    def run(self):
+        from django.db import connection  # Imported late: serve() loads this module before django.setup()
+        visits = 0
+        while time.monotonic() < self.deadline:
+            visits += 1
+            self.visit(f'10.{self.number % 256}.{visits // 256 % 256}.{visits % 256}')
+        connection.close()
+
+    def visit(self, ip):
+        from library.models import OTPRecord
+        rng, sample = self.rng, self.sample
+        session = requests.Session()
+        session.headers['X-Forwarded-For'] = ip
+        if self.call(session, 'index', 'GET', '/') is None:
+            return
+        session.headers['X-CSRFToken'] = session.cookies.get('csrftoken', '')
+
+        if rng.random() < 0.5:
+            self.call(session, 'search', 'GET', '/search/', params={'q': rng.choice(sample['keywords'])})
+        else:
+            self.call(session, 'search', 'GET', '/search/', params={'category': rng.choice(sample['keywords'])})
+        word = rng.choice(rng.choice(sample['titles']).split())
+        self.call(session, 'suggest', 'GET', '/suggest-books/', params={'q': word[:rng.randint(2, 5)]})
+
+        phone = rng.choice(sample['phones'])
+        if self.call(session, 'send otp', 'POST', '/send-otp/', data={'identity': phone}) is None:
+            return
+        otp_id, code = (OTPRecord.objects.filter(phone_number=phone, is_verified=False).order_by('-pk')
+                        .values_list('pk', 'otp_code').first() or (None, None))
+        self.otp_ids.append(otp_id)
+        if self.call(session, 'verify otp', 'POST', '/verify-otp/', data={'otp_code': code}) is None:
+            return
+        body = self.call(session, 'submit', 'POST', '/request/', data={'book_id': rng.choice(sample['book_ids'])})
+        if body:
+            self.tokens.append(body['message'].rsplit('Token: ', 1)[-1])  # 'Request Successful! Token: <token>'
+
+class Command(BaseCommand):
+    help = ('Drives the search, suggest, OTP and request flows with concurrent virtual users and reports '
+            'p50/p95/p99 latency and throughput per endpoint. Starts a local server with SMS/email stubbed '
+            'unless --url is given. Writes requests and OTPs to the database, removed afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds')
+        parser.add_argument('--url', help='Test a server that is already running (must use this database), e.g. gunicorn')
+        parser.add_argument('--keep', action='store_true', help="Keep the requests and OTPs the run created")
+
+    def handle(self, *args, **options):
+        if options['url'] and settings.WIGAL_API_KEY:
+            self.stdout.write(self.style.ERROR("WIGAL_API_KEY is set: the target server would text real numbers. Unset it first."))
+            return
+        sample = self.sample()
+        if not sample['phones'] or not sample['book_ids']:
+            self.stdout.write(self.style.ERROR("No members or books to test with. Run generate_data first."))
+            return
+
+        server = None
+        base_url = options['url']
+        if not base_url:
+            with socket.socket() as s:
+                s.bind(('127.0.0.1', 0))
+                port = s.getsockname()[1]
+            server = multiprocessing.get_context('spawn').Process(target=serve, args=(port,), daemon=True)
+            server.start()
+            base_url = f'http://127.0.0.1:{port}'
+            if not self.wait_for(port, server):
+                server.terminate()
+                self.stdout.write(self.style.ERROR("The local server did not start."))
+                return
+        base_url = base_url.rstrip('/')
+
+        users = [VirtualUser(base_url, n, sample, time.monotonic() + options['duration']) for n in range(options['users'])]
+        try:
+            threads = [threading.Thread(target=user.run) for user in users]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            if server:
+                server.terminate()
+                server.join()
+            if not options['keep']:
+                self.clean_up(users, sample['hc_availability'])
+        self.report(users, elapsed)
+
+    def sample(self):
+        from library.models import Book, Member
+        phones = list(Member.objects.order_by('?').values_list('mobile_number', flat=True)[:SAMPLE])
+        books = list(Book.objects.order_by('?').values_list('book_id', 'title', 'keywords', 'type', 'availability')[:SAMPLE])
+        keywords = sorted({k.strip() for _, _, words, _, _ in books for k in words.split(',') if k.strip()})
+        return {'phones': phones, 'book_ids': [b[0] for b in books], 'titles': [b[1] for b in books],
+                'keywords': keywords or ['a'],
+                'hc_availability': {b[0]: b[4] for b in books if b[3] == 'HC'}}  # Restored after the run
+
+    def wait_for(self, port, server, seconds=30):
+        deadline = time.monotonic() + seconds
+        while server.is_alive() and time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return True
+            except OSError:
+                time.sleep(0.2)
+        return False
+
+    def clean_up(self, users, hc_availability):
+        """Deletes only the requests and OTPs this run created, and puts back the availability of
+        the hard copies they put on hold (deleting a request never releases its book)."""
+        from django.db import transaction
+        from django.utils import timezone
+        from library.analytics import rebuild_rollups
+        from library.models import Book, BookRequest, OTPRecord
+        tokens = [token for user in users for token in user.tokens]
+        otp_ids = [pk for user in users for pk in user.otp_ids if pk]
+        with transaction.atomic():
+            created = BookRequest.objects.filter(token__in=tokens)
+            touched = set(created.filter(book_type='HC').values_list('book_id', flat=True))
+            first_day = created.order_by('timestamp').values_list('timestamp', flat=True).first()
+            created.delete()
+            OTPRecord.objects.filter(pk__in=otp_ids).delete()
+            for book_id in touched & hc_availability.keys():
+                Book.objects.filter(book_id=book_id).update(availability=hc_availability[book_id])
+        if first_day:
+            rebuild_rollups(since=timezone.localdate(first_day))
+
+    def report(self, users, elapsed):
+        self.stdout.write(f"{len(users)} users for {elapsed:.1f}s")
+        self.stdout.write(f"{'Endpoint':<12}{'Requests':>9}{'Errors':>8}{'Rejected':>10}"
+                          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'Req/s':>8}")
+        for name in ENDPOINTS:
+            timings = [t for user in users for t in user.timings[name]]
+            errors = sum(user.errors[name] for user in users)
+            rejected = sum(user.rejected[name] for user in users)
+            p50, p95, p99 = percentiles(timings)
+            self.stdout.write(f"{name:<12}{len(timings):>9}{errors:>8}{rejected:>10}"
+                              f"{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{len(timings) / elapsed:>8.1f}")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+from datetime import timedelta
+from importlib import import_module
+from library.models import OTPRecord
+from library.profiling import prune_slow_requests
+
+class Command(BaseCommand):
+    help = 'Purges expired sessions, stale OTP records and old slow request records (run nightly by the run_import_jobs worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--otp-days', type=int, default=1, help='Keep OTP records newer than this many days')
+
+    def handle(self, *args, **options):
+        engine = settings.SESSION_ENGINE
+        if engine.endswith('.db') or engine.endswith('.cached_db'):
+            # Same as `clearsessions`: only expired rows go
+            import_module(engine).SessionStore.clear_expired()
+            self.stdout.write("Cleared expired sessions.")
+        else:
+            # Sessions no longer live in the DB, so every leftover row is dead weight
+            deleted, _ = Session.objects.all().delete()
+            self.stdout.write(f"Deleted {deleted} legacy DB sessions ({engine} in use).")
+
+        cutoff = timezone.now() - timedelta(days=options['otp_days'])
+        deleted, _ = OTPRecord.objects.filter(expires_at__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted} stale OTP records.")
+        self.stdout.write(self.style.SUCCESS(f"Deleted {prune_slow_requests()} old slow request records."))
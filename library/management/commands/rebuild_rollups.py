@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from library.analytics import rebuild_rollups
+from library.models import DailyStatusStat
+import time
+
+class Command(BaseCommand):
+    help = ('Rebuilds the daily analytics rollups from BookRequest history. The import worker already does '
+            'this nightly; run it by hand after bulk fixes made with queryset.update()')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Only rebuild the last N days (default: full history)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days']:
+            since = timezone.localdate() - timedelta(days=options['days'])
+            self.stdout.write(f"Rebuilding rollups since {since}...")
+        else:
+            self.stdout.write("Rebuilding rollups for full history...")
+
+        start = time.perf_counter()
+        rebuild_rollups(since)
+        elapsed = time.perf_counter() - start
+
+        days = DailyStatusStat.objects.values('date').distinct().count()
+        self.stdout.write(self.style.SUCCESS(f"Rollups rebuilt in {elapsed:.2f}s ({days} days summarized)."))
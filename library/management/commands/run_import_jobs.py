@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from library import jobs
+from library.analytics import rebuild_rollups
+from library.models import ImportJob
+
+class Command(BaseCommand):
+    help = ('Resumes import jobs interrupted by a web or worker restart, and queued jobs no web thread picked up '
+            'within jobs.STALE_AFTER (run as a worker process or from cron). '
+            'While polling, also runs the nightly upkeep after ROLLUP_REBUILD_HOUR: rebuilds the analytics '
+            'rollups and purges expired sessions and OTP records.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit instead of polling')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls')
+
+    def handle(self, *args, **options):
+        now = timezone.localtime()
+        # The next rebuild is the next time ROLLUP_REBUILD_HOUR comes round, not at startup
+        rebuilt_on = now.date() if now.hour >= settings.ROLLUP_REBUILD_HOUR else now.date() - timedelta(days=1)
+        while True:
+            # Fresh queued jobs are left to the web thread that queued them: their uploads are on its disk
+            job_ids = list(ImportJob.objects.filter(jobs.stale()).order_by('created_at').values_list('pk', flat=True))
+            for job_id in job_ids:
+                jobs.run_job(job_id)  # A no-op if another process claimed it first
+                job = ImportJob.objects.get(pk=job_id)
+                self.stdout.write(f"Job #{job.pk} {job.get_kind_display()}: {job.status}. {job.message}")
+            if options['once']:
+                break
+            now = timezone.localtime()
+            if now.date() != rebuilt_on and now.hour >= settings.ROLLUP_REBUILD_HOUR:
+                start = time.perf_counter()
+                rebuild_rollups()
+                rebuilt_on = now.date()
+                self.stdout.write(f"Rollups rebuilt in {time.perf_counter() - start:.1f}s.")
+                call_command('purge_sessions', stdout=self.stdout)
+            time.sleep(options['interval'])
@@ -0,0 +1,224 @@
+"""
+Prometheus-style metrics with no metrics server. Each process (gunicorn worker, import job
+worker) keeps its counters and histograms in memory, and a daemon thread writes them to
+METRICS_DIR/<pid>-<start>.json every FLUSH_INTERVAL seconds. The /metrics view sums the files of
+all processes, so totals aggregate across workers. A file no process has written for
+FILE_RETENTION belongs to an exited worker: its values are folded into METRICS_DIR/archive.json
+before it is removed, as prometheus_client's multiprocess mode does, so totals never go
+backwards (Prometheus would read that as a counter reset).
+"""
+import atexit
+import contextlib
+import functools
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: the dev server is a single process, there is nothing to serialise
+    fcntl = None
+
+FLUSH_INTERVAL = 1.0  # seconds
+REWRITE_INTERVAL = 3600  # An idle worker still refreshes its file, so pruning never takes a live one
+FILE_RETENTION = 24 * 3600  # Then a file's values move to the archive
+ARCHIVE = 'archive.json'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SEND_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+JOB_BUCKETS = (1, 5, 15, 60, 300, 900, 3600)
+METHODS = {'GET', 'POST', 'HEAD', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+_CACHE_LABEL = re.compile(r'cache="([^"]*)"')
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'elib_http_requests_total': ('counter', 'Requests by view, method and status code.', None),
+    'elib_http_request_duration_seconds': ('histogram', 'Request wall time by view.', LATENCY_BUCKETS),
+    'elib_db_queries_per_request': ('histogram', 'SQL statements per request by view.', QUERY_BUCKETS),
+    'elib_db_duration_seconds_total': ('counter', 'Time spent in SQL by view.', None),
+    'elib_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit/miss).', None),
+    'elib_sms_sent_total': ('counter', 'SMS sends by result (ok/failed/skipped).', None),
+    'elib_sms_send_duration_seconds': ('histogram', 'Wigal API call time.', SEND_BUCKETS),
+    'elib_email_sent_total': ('counter', 'Emails by result (ok/failed).', None),
+    'elib_email_send_duration_seconds': ('histogram', 'SMTP send time.', SEND_BUCKETS),
+    'elib_otp_requests_total': ('counter', 'send_otp outcomes (sent/rate_limited/unknown_member/already_verified/error).', None),
+    'elib_otp_verifications_total': ('counter', 'verify_otp outcomes (verified/invalid/no_session).', None),
+    'elib_import_processed_total': ('counter', 'Import progress by kind: CSV rows, Dropbox files or uploaded bytes.', None),
+    'elib_import_jobs_finished_total': ('counter', 'Finished import jobs by kind and status.', None),
+    'elib_import_job_duration_seconds': ('histogram', 'Import job run time by kind.', JOB_BUCKETS),
+}
+
+logger = logging.getLogger(__name__)
+_lock = threading.Lock()
+_values = defaultdict(float)  # (name, label string) -> value; histograms as their _bucket/_sum/_count samples
+_state = {'pid': None, 'path': None, 'dirty': False}
+
+def label_string(labels):
+    if not labels:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items())) + '}'
+
+@functools.lru_cache(maxsize=4096)
+def _keys(name, items):
+    """Sample keys for a metric and label set, formatted once: (name, labels) or, for a histogram,
+    its buckets (ending with +Inf), _sum and _count."""
+    labels = dict(items)
+    buckets = METRICS[name][2]
+    if buckets is None:
+        return (name, label_string(labels))
+    return ([(f'{name}_bucket', label_string({**labels, 'le': b})) for b in (*buckets, '+Inf')],
+            (f'{name}_sum', label_string(labels)), (f'{name}_count', label_string(labels)))
+
+def _ensure_process():
+    """Called under _lock. A new process (including a fork) starts from zero with its own file and flusher."""
+    pid = os.getpid()
+    if _state['pid'] != pid:
+        _values.clear()
+        _state.update(pid=pid, path=os.path.join(settings.METRICS_DIR, f'{pid}-{time.time_ns()}.json'), dirty=False)
+        threading.Thread(target=_flush_loop, args=(pid, _state['path']), daemon=True).start()
+
+def inc(name, labels=None, amount=1):
+    key = _keys(name, tuple(sorted(labels.items())) if labels else ())
+    with _lock:
+        _ensure_process()
+        _values[key] += amount
+        _state['dirty'] = True
+
+def observe(name, value, labels=None):
+    bucket_keys, sum_key, count_key = _keys(name, tuple(sorted(labels.items())) if labels else ())
+    with _lock:
+        _ensure_process()
+        for key, bound in zip(bucket_keys, METRICS[name][2]):  # Every bucket gets a sample, zero or not
+            _values[key] += value <= bound
+        _values[bucket_keys[-1]] += 1
+        _values[sum_key] += value
+        _values[count_key] += 1
+        _state['dirty'] = True
+
+def observe_request(profile, method, status):
+    """Records one request measured by profiling.ProfilingMiddleware."""
+    view = profile.view or 'unmatched'
+    inc('elib_http_requests_total', {'view': view, 'method': method if method in METHODS else 'other', 'status': status})
+    observe('elib_http_request_duration_seconds', profile.seconds, {'view': view})
+    observe('elib_db_queries_per_request', profile.query_count, {'view': view})
+    inc('elib_db_duration_seconds_total', {'view': view}, profile.db_seconds)
+
+def cache_lookup(cache_name, value):
+    """Counts a hit or miss for `cache_name` and returns value unchanged (None is a miss)."""
+    inc('elib_cache_requests_total', {'cache': cache_name, 'result': 'miss' if value is None else 'hit'})
+    return value
+
+def _write(path, values):
+    """Atomic: readers see the old file or the new one."""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(values, f)
+    os.replace(tmp, path)
+
+def flush():
+    """Writes this process's values to its file."""
+    with _lock:
+        if _state['pid'] != os.getpid():
+            return
+        snapshot = [[name, labels, value] for (name, labels), value in _values.items()]
+        path = _state['path']
+        _state['dirty'] = False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write(path, snapshot)
+
+def _flush_loop(pid, path):
+    last = 0.0
+    while os.getpid() == pid and _state['path'] == path:  # Ends after a fork or a reset
+        time.sleep(FLUSH_INTERVAL)
+        if _state['dirty'] or time.monotonic() - last > REWRITE_INTERVAL:
+            try:
+                flush()
+                last = time.monotonic()
+            except OSError as e:
+                logger.warning("Metrics flush failed: %s", e)
+
+@atexit.register
+def _flush_at_exit():
+    if _state['pid'] == os.getpid():
+        flush()
+
+@contextlib.contextmanager
+def _directory_lock():
+    """Serialises collect() across workers, so a dead worker's file is folded into the archive once."""
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    with open(os.path.join(settings.METRICS_DIR, 'collect.lock'), 'a') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file closes
+        yield
+
+def _archive(dead):
+    """Adds the values of dead workers' files to the archive, then removes the files. Called under the lock."""
+    path = os.path.join(settings.METRICS_DIR, ARCHIVE)
+    archived = defaultdict(float)
+    if os.path.exists(path):
+        with open(path) as f:
+            for name, labels, value in json.load(f):
+                archived[(name, labels)] += value
+    for _, values in dead:
+        for name, labels, value in values:
+            archived[(name, labels)] += value
+    _write(path, [[name, labels, value] for (name, labels), value in archived.items()])
+    for dead_path, _ in dead:
+        os.remove(dead_path)
+
+def collect():
+    """Sums every process's file and the archive. Returns {(name, labels): value}."""
+    if _state['pid'] == os.getpid():
+        flush()  # This worker's latest numbers, without waiting for its flusher
+    totals = defaultdict(float)
+    with _directory_lock():
+        dead = []
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+            try:
+                with open(path) as f:
+                    values = json.load(f)
+                if os.path.basename(path) != ARCHIVE and time.time() - os.path.getmtime(path) > FILE_RETENTION:
+                    dead.append((path, values))
+            except (OSError, ValueError):
+                continue  # Removed or replaced while we read it
+            for name, labels, value in values:
+                totals[(name, labels)] += value
+        if dead:
+            _archive(dead)
+    return totals
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+def render(gauges=()):
+    """The exposition text: summed process metrics, then `gauges` [(name, help, [(labels, value)])] read at scrape time."""
+    samples = defaultdict(list)
+    for (name, labels), value in collect().items():
+        family = next((m for m in METRICS if name == m or name.startswith(m + '_')), name)
+        samples[family].append((name, labels, value))
+    lines = []
+    for family, (kind, help_text, _) in METRICS.items():
+        if family not in samples:
+            continue
+        lines += [f'# HELP {family} {help_text}', f'# TYPE {family} {kind}']
+        lines += [f'{name}{labels} {_number(value)}' for name, labels, value in samples[family]]
+    ratios = defaultdict(lambda: [0.0, 0.0])  # cache -> [hits, lookups], all workers past and present
+    for _, labels, value in samples.get('elib_cache_requests_total', []):
+        ratio = ratios[_CACHE_LABEL.search(labels).group(1)]
+        ratio[0] += value if 'result="hit"' in labels else 0
+        ratio[1] += value
+    gauges = [('elib_cache_hit_ratio', 'Cache hits / lookups, all workers past and present.',
+               [({'cache': name}, hits / lookups) for name, (hits, lookups) in sorted(ratios.items())]), *gauges]
+    for name, help_text, values in gauges:
+        if not values:
+            continue
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+        lines += [f'{name}{label_string(labels)} {_number(value)}' for labels, value in values]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,83 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:12
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DurationField, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    BookRequest = apps.get_model('library', 'BookRequest')
+    DailyStatusStat = apps.get_model('library', 'DailyStatusStat')
+    DailyBookStat = apps.get_model('library', 'DailyBookStat')
+    DailyMemberStat = apps.get_model('library', 'DailyMemberStat')
+
+    approved = Q(approval_status='Approved', approval_date__isnull=False)
+    reqs = BookRequest.objects.annotate(day=TruncDate('timestamp')).order_by()
+    DailyStatusStat.objects.bulk_create([
+        DailyStatusStat(date=r['day'], approval_status=r['approval_status'], count=r['count'],
+                        lead_time_total=r['lead_time_total'] or datetime.timedelta(0), lead_time_count=r['lead_time_count'])
+        for r in reqs.values('day', 'approval_status').annotate(
+            count=Count('id'),
+            lead_time_total=Sum(F('approval_date') - F('timestamp'), filter=approved, output_field=DurationField()),
+            lead_time_count=Count('id', filter=approved),
+        )
+    ], batch_size=1000)
+    DailyBookStat.objects.bulk_create([
+        DailyBookStat(date=r['day'], book_id=r['book_id'], count=r['count'])
+        for r in reqs.filter(book__isnull=False).values('day', 'book_id').annotate(count=Count('id'))
+    ], batch_size=1000)
+    DailyMemberStat.objects.bulk_create([
+        DailyMemberStat(date=r['day'], full_name=r['full_name'], count=r['count'])
+        for r in reqs.values('day', 'full_name').annotate(count=Count('id'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_member_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMemberStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('full_name', models.CharField(max_length=200)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'full_name'), name='unique_daily_member')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStatusStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('approval_status', models.CharField(choices=[('Pending', 'Pending'), ('Approved', 'Approved'), ('Not Approved', 'Not Approved'), ('Expired', 'Expired')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('lead_time_total', models.DurationField(default=datetime.timedelta(0), help_text='Sum of approval_date - timestamp')),
+                ('lead_time_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'approval_status'), name='unique_daily_status')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyBookStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='library.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'book'), name='unique_daily_book')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
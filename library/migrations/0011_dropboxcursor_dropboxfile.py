@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_dailymemberstat_dailystatusstat_dailybookstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DropboxCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('folder_path', models.CharField(max_length=500, unique=True)),
+                ('cursor', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DropboxFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_id', models.CharField(max_length=100, unique=True)),
+                ('path_lower', models.CharField(max_length=500, unique=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dropbox_files', to='library.book')),
+            ],
+        ),
+    ]
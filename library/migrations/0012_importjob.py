@@ -0,0 +1,45 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_dropboxcursor_dropboxfile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sync_dropbox', 'Dropbox Sync'), ('import_members', 'Import Members'), ('update_metadata', 'Update Book Metadata')], max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('name', models.CharField(blank=True, help_text='Uploaded file name or Dropbox folder', max_length=255)),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Importer options and spooled upload path')),
+                ('progress', models.PositiveSmallIntegerField(default=0, help_text='Percent complete')),
+                ('processed', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0, help_text='0 if not known up front')),
+                ('created', models.IntegerField(default=0)),
+                ('skipped', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('message', models.TextField(blank=True)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('checkpoint', models.JSONField(blank=True, help_text='Last committed position, resumed from after a crash', null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'heartbeat_at'], name='importjob_status_heartbeat')],
+            },
+        ),
+    ]
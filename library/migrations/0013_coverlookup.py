@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoverLookup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=400, unique=True)),
+                ('cover_url', models.URLField(blank=True)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+    ]
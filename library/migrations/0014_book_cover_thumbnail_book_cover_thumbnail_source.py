@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_coverlookup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_thumbnail',
+            field=models.CharField(blank=True, db_index=True, help_text='Content hash of the local cover thumbnail', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_thumbnail_source',
+            field=models.URLField(blank=True, help_text='cover_url the thumbnail was built from'),
+        ),
+    ]
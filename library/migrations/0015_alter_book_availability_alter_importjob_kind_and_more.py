@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_book_cover_thumbnail_book_cover_thumbnail_source'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='availability',
+            field=models.CharField(choices=[('Available', 'Available'), ('On Hold', 'On Hold'), ('Taken', 'Taken'), ('Not Available', 'Not Available'), ('Pending Upload', 'Pending Upload')], default='Available', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='kind',
+            field=models.CharField(choices=[('sync_dropbox', 'Dropbox Sync'), ('import_members', 'Import Members'), ('update_metadata', 'Update Book Metadata'), ('upload_book', 'Book Upload')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='name',
+            field=models.CharField(blank=True, help_text='Uploaded file name, Dropbox folder or book title', max_length=255),
+        ),
+    ]
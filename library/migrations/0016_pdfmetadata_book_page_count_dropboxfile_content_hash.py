@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_alter_book_availability_alter_importjob_kind_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('title', models.CharField(blank=True, max_length=200)),
+                ('author', models.CharField(blank=True, max_length=200)),
+                ('subject', models.CharField(blank=True, max_length=500)),
+                ('keywords', models.CharField(blank=True, max_length=500)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('cover_thumbnail', models.CharField(blank=True, help_text='Thumbnail of the first page', max_length=16)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('extracted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dropboxfile',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='Dropbox content_hash, keys PdfMetadata', max_length=64),
+        ),
+    ]
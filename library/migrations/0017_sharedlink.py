@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0016_pdfmetadata_book_page_count_dropboxfile_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SharedLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path_lower', models.CharField(max_length=500, unique=True)),
+                ('url', models.CharField(max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
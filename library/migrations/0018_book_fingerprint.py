@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:10
+
+import hashlib
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of library.importers.book_fingerprint as of this migration, so later changes
+# there don't change what this backfill computes.
+PLACEHOLDER_AUTHORS = ('', 'Unknown', 'Unknown Import')
+NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_title(title):
+    title = re.sub(r'\.(pdf|epub)$', '', (title or '').strip(), flags=re.IGNORECASE)
+    return NON_WORD.sub(' ', title).strip().lower()
+
+
+def author_key(author):
+    if (author or '').strip() in PLACEHOLDER_AUTHORS:
+        return ''
+    return ' '.join(sorted(normalize_title(author).split()))
+
+
+def book_fingerprint(title, author):
+    return hashlib.sha1(f"{normalize_title(title)}|{author_key(author)}".encode()).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    books = list(Book.objects.only('book_id', 'title', 'author'))
+    for book in books:
+        book.fingerprint = book_fingerprint(book.title, book.author)
+    Book.objects.bulk_update(books, ['fingerprint'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0017_sharedlink'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Normalized title+author hash, for duplicate checks (see dedup.py)', max_length=40),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
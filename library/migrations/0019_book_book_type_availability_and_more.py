@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0018_book_fingerprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['type', 'availability'], name='book_type_availability'),
+        ),
+        migrations.AddIndex(
+            model_name='bookrequest',
+            index=models.Index(fields=['member', 'timestamp'], name='bookrequest_member_time'),
+        ),
+        migrations.AddIndex(
+            model_name='bookrequest',
+            index=models.Index(fields=['approval_status', 'timestamp'], name='bookrequest_status_time'),
+        ),
+        migrations.AddIndex(
+            model_name='bookrequest',
+            index=models.Index(condition=models.Q(('approval_status', 'Approved'), models.Q(('return_status', 'Returned'), _negated=True)), fields=['expected_return_date'], name='bookrequest_open_loans'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_book_type(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    BookRequest = apps.get_model('library', 'BookRequest')
+    # One UPDATE ... SET book_type = (SELECT type FROM library_book ...), however long the history
+    BookRequest.objects.update(book_type=Coalesce(
+        Subquery(Book.objects.filter(pk=OuterRef('book_id')).values('type')[:1]), Value('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0019_book_book_type_availability_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookrequest',
+            name='bookrequest_member_time',
+        ),
+        migrations.RemoveIndex(
+            model_name='bookrequest',
+            name='bookrequest_open_loans',
+        ),
+        migrations.AddField(
+            model_name='bookrequest',
+            name='book_type',
+            field=models.CharField(blank=True, choices=[('SC', 'Soft Copy'), ('HC', 'Hard Copy')], editable=False, help_text="Copy of book.type, so request queries don't join Book", max_length=2),
+        ),
+        migrations.RunPython(backfill_book_type, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='bookrequest',
+            index=models.Index(fields=['member', 'book_type', 'timestamp'], name='bookrequest_member_type_time'),
+        ),
+        migrations.AddIndex(
+            model_name='bookrequest',
+            index=models.Index(fields=['book_type', 'return_status'], name='bookrequest_type_return'),
+        ),
+        migrations.AddIndex(
+            model_name='bookrequest',
+            index=models.Index(condition=models.Q(('approval_status', 'Approved'), ('book_type', 'HC'), models.Q(('return_status', 'Returned'), _negated=True)), fields=['expected_return_date'], name='bookrequest_open_loans'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0020_bookrequest_book_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('view', models.CharField(blank=True, help_text='URL name, blank if none matched', max_length=200)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField()),
+                ('db_ms', models.FloatField()),
+                ('queries', models.JSONField(blank=True, default=list, help_text='Slowest statements: [{ms, sql}]')),
+                ('profile', models.TextField(blank=True, help_text='cProfile output, for sampled requests')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+            },
+        ),
+    ]
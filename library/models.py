@@ -1,9 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 import uuid
 from django.utils import timezone
 from datetime import timedelta
-import dropbox
-import os
 from django.core.exceptions import ValidationError
 
 class Member(models.Model):
@@ -32,6 +32,7 @@ class Book(models.Model):
         ('On Hold', 'On Hold'),
         ('Taken', 'Taken'),
         ('Not Available', 'Not Available'), # Keep for legacy/manual
+        ('Pending Upload', 'Pending Upload'), # File still on its way to Dropbox
     ]
 
     book_id = models.AutoField(primary_key=True)
@@ -47,53 +48,107 @@ class Book(models.Model):
     # Virtual field for uploading
     file_upload = models.FileField(upload_to='temp_books/', blank=True, null=True, help_text="Upload SC file here. It will be moved to Dropbox.")
     cover_url = models.URLField(blank=True, null=True, help_text="URL to book cover image")
+    cover_thumbnail = models.CharField(max_length=16, blank=True, db_index=True, help_text="Content hash of the local cover thumbnail")
+    cover_thumbnail_source = models.URLField(blank=True, help_text="cover_url the thumbnail was built from")
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=40, blank=True, db_index=True, editable=False,
+                                   help_text="Normalized title+author hash, for duplicate checks (see dedup.py)")
+
+    class Meta:
+        indexes = [models.Index(fields=['type', 'availability'], name='book_type_availability')]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_type = instance.__dict__.get('type')  # BookRequest.book_type follows changes
+        return instance
+
+    def clean(self):
+        from .dedup import find_duplicate
+        if self._state.adding:  # Soft copies only; see find_duplicate
+            duplicate = find_duplicate(self)
+            if duplicate:
+                raise ValidationError({'title': f'Already in the catalog as "{duplicate}" (#{duplicate.pk}).'})
+
     def save(self, *args, **kwargs):
-        # Dropbox Integration Logic
-        if self.file_upload:
-            try:
-                dbx_token = os.environ.get('DROPBOX_ACCESS_TOKEN')
-                if not dbx_token:
-                    # Fallback or Error if strict. for now print
-                    print("Dropbox Token missing, skipping upload.")
-                else:
-                    dbx = dropbox.Dropbox(dbx_token)
-                    
-                    # Read file
-                    file_data = self.file_upload.read()
-                    file_name = self.file_upload.name
-                    
-                    # Upload
-                    upload_path = f"/{file_name}" # Root or specify folder
-                    res = dbx.files_upload(file_data, upload_path, mode=dropbox.files.WriteMode.overwrite)
-                    
-                    # Create Shared Link
-                    try:
-                        link_meta = dbx.sharing_create_shared_link_with_settings(upload_path)
-                        self.location = link_meta.url
-                    except dropbox.exceptions.ApiError:
-                        # Link might exist
-                        links = dbx.sharing_list_shared_links(path=upload_path).links
-                        if links:
-                            self.location = links[0].url
-                            
-                    # Force Type SC
-                    self.type = 'SC'
-                    # Clear file to save space (optional, or keep as backup?)
-                    # self.file_upload = None 
-            except Exception as e:
-                print(f"Dropbox Error: {e}")
-                # Don't block save, but maybe log it
-                
+        # Dropbox Integration: a newly attached file is stored locally (streamed to disk by the
+        # storage backend) and uploaded to Dropbox by a background job once this save commits.
+        # The book stays 'Pending Upload' until the job has a shared link for it.
+        new_upload = bool(self.file_upload) and not self.file_upload._committed
+        if new_upload:
+            self.type = 'SC'
+            self.availability = 'Pending Upload'
+        from .importers import book_fingerprint
+        self.fingerprint = book_fingerprint(self.title, self.author)
         super().save(*args, **kwargs)
+        if getattr(self, '_loaded_type', self.type) != self.type:
+            BookRequest.objects.filter(book=self).update(book_type=self.type)
+        self._loaded_type = self.type
+        if new_upload:
+            from .jobs import start_book_upload
+            name = self.file_upload.name
+            transaction.on_commit(lambda: start_book_upload(self, name))
 
     @property
     def is_available(self):
         return self.availability == 'Available'
 
+class DropboxFile(models.Model):
+    """A Dropbox file backing a soft copy book, kept in step by import_dropbox's delta sync."""
+    file_id = models.CharField(max_length=100, unique=True)
+    path_lower = models.CharField(max_length=500, unique=True)
+    content_hash = models.CharField(max_length=64, blank=True, help_text="Dropbox content_hash, keys PdfMetadata")
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='dropbox_files')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.path_lower
+
+class DropboxCursor(models.Model):
+    """Last list_folder cursor per synced folder, so the next run only fetches changes."""
+    folder_path = models.CharField(max_length=500, unique=True)
+    cursor = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.folder_path
+
+class SharedLink(models.Model):
+    """Dropbox shared link per path, so repeat imports and uploads don't ask Dropbox again."""
+    path_lower = models.CharField(max_length=500, unique=True)
+    url = models.CharField(max_length=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path_lower
+
+class PdfMetadata(models.Model):
+    """What extract_pdf_metadata read from one PDF, by Dropbox content hash - unchanged files are never re-parsed."""
+    content_hash = models.CharField(max_length=64, unique=True)
+    title = models.CharField(max_length=200, blank=True)
+    author = models.CharField(max_length=200, blank=True)
+    subject = models.CharField(max_length=500, blank=True)
+    keywords = models.CharField(max_length=500, blank=True)
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    cover_thumbnail = models.CharField(max_length=16, blank=True, help_text="Thumbnail of the first page")
+    error = models.CharField(max_length=200, blank=True)
+    extracted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.content_hash
+
+class CoverLookup(models.Model):
+    """Cached OpenLibrary cover search per normalized title/author. An empty cover_url is a cached miss."""
+    key = models.CharField(max_length=400, unique=True)
+    cover_url = models.URLField(blank=True)
+    fetched_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.key
+
 class BookRequest(models.Model):
     REQUEST_STATUS_CHOICES = [
         ('Valid', 'Valid'),
@@ -124,6 +179,8 @@ class BookRequest(models.Model):
     email = models.EmailField()
     
     book = models.ForeignKey(Book, on_delete=models.CASCADE, null=True)
+    book_type = models.CharField(max_length=2, choices=Book.TYPE_CHOICES, blank=True, editable=False,
+                                 help_text="Copy of book.type, so request queries don't join Book")
     request_status = models.CharField(max_length=20, choices=REQUEST_STATUS_CHOICES, default='Valid')
     approval_status = models.CharField(max_length=20, choices=APPROVAL_STATUS_CHOICES, default='Pending')
     approval_date = models.DateTimeField(null=True, blank=True)
@@ -138,10 +195,51 @@ class BookRequest(models.Model):
     return_status = models.CharField(max_length=20, choices=RETURN_STATUS_CHOICES, default='Pending')
     
     # Computed fields logic will be in methods/signals
-    
+
+    ROLLUP_FIELDS = ('timestamp', 'approval_status', 'approval_date', 'book_id', 'full_name')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row contributed to the daily rollups, so save() can apply a delta
+        if all(f in instance.__dict__ for f in cls.ROLLUP_FIELDS):
+            instance._rollup_state = instance.rollup_state()
+        return instance
+
+    def rollup_state(self):
+        """What this request contributes to the daily analytics rollups."""
+        lead_time = None
+        if self.approval_status == 'Approved' and self.approval_date:
+            lead_time = self.approval_date - self.timestamp
+        return {
+            'date': timezone.localdate(self.timestamp),
+            'approval_status': self.approval_status,
+            'lead_time': lead_time,
+            'book_id': self.book_id,
+            'full_name': self.full_name,
+        }
+
+    def _stored_rollup_state(self):
+        if self._state.adding:
+            return None
+        if hasattr(self, '_rollup_state'):
+            return self._rollup_state
+        stored = BookRequest.objects.filter(pk=self.pk).first()
+        return stored._rollup_state if stored else None
+
     def save(self, *args, **kwargs):
+        from .analytics import record_rollup_change
+
+        with transaction.atomic():
+            old_state = self._stored_rollup_state()
+            self._save_request(*args, **kwargs)
+            self._rollup_state = self.rollup_state()
+            record_rollup_change(old_state, self._rollup_state)
+
+    def _save_request(self, *args, **kwargs):
         if not self.token:
             self.token = str(uuid.uuid4())
+        self.book_type = self.book.type if self.book else ''
         
         # SC logic: No return status
         if self.book and self.book.type == 'SC':
@@ -193,6 +291,26 @@ class BookRequest(models.Model):
     def __str__(self):
         return f"{self.token} - {self.book.title if self.book else 'Unknown'}"
 
+    class Meta:
+        indexes = [
+            # Per-member request limits (check_request_limits)
+            models.Index(fields=['member', 'book_type', 'timestamp'], name='bookrequest_member_type_time'),
+            # HC round-robin count and unreturned-copy checks
+            models.Index(fields=['book_type', 'return_status'], name='bookrequest_type_return'),
+            # Auto-expiry of pending requests and status/date reporting
+            models.Index(fields=['approval_status', 'timestamp'], name='bookrequest_status_time'),
+            # Loans still out (validate_returns): a small slice of the table, kept in due-date order
+            models.Index(fields=['expected_return_date'], name='bookrequest_open_loans',
+                         condition=models.Q(book_type='HC', approval_status='Approved') & ~models.Q(return_status='Returned')),
+        ]
+
+@receiver(post_delete, sender=BookRequest)
+def remove_from_rollups(sender, instance, **kwargs):
+    """Every delete path - delete(), admin bulk delete, a Book's cascade - takes the request out of the
+    daily rollups, inside the delete's transaction. (queryset.update() is left to the nightly rebuild.)"""
+    from .analytics import record_rollup_change
+    record_rollup_change(getattr(instance, '_rollup_state', None), None)  # Set by from_db() and save()
+
 class ReturnLog(models.Model):
     ACTION_CHOICES = [
         ('Approval', 'Approval'),
@@ -238,6 +356,33 @@ class ReturnLog(models.Model):
         verbose_name = "Return History Log"
         verbose_name_plural = "Return History Logs"
 
+# --- ANALYTICS ROLLUPS (Pre-summed per day, see analytics.py) ---
+class DailyStatusStat(models.Model):
+    date = models.DateField()
+    approval_status = models.CharField(max_length=20, choices=BookRequest.APPROVAL_STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    lead_time_total = models.DurationField(default=timedelta(0), help_text="Sum of approval_date - timestamp")
+    lead_time_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['date', 'approval_status'], name='unique_daily_status')]
+
+class DailyBookStat(models.Model):
+    date = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='daily_stats')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['date', 'book'], name='unique_daily_book')]
+
+class DailyMemberStat(models.Model):
+    date = models.DateField()
+    full_name = models.CharField(max_length=200)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['date', 'full_name'], name='unique_daily_member')]
+
 class OTPRecord(models.Model):
     phone_number = models.CharField(max_length=20)
     otp_code = models.CharField(max_length=6)
@@ -250,3 +395,75 @@ class OTPRecord(models.Model):
         
     def __str__(self):
         return f"{self.phone_number} - {self.otp_code}"
+
+class SlowRequest(models.Model):
+    """A request slower than PROFILING_SLOW_MS, recorded by profiling.ProfilingMiddleware."""
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view = models.CharField(max_length=200, blank=True, help_text="URL name, blank if none matched")
+    status = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    db_ms = models.FloatField()
+    queries = models.JSONField(default=list, blank=True, help_text="Slowest statements: [{ms, sql}]")
+    profile = models.TextField(blank=True, help_text="cProfile output, for sampled requests")
+
+    class Meta:
+        ordering = ['-timestamp']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+class ImportJob(models.Model):
+    """A bulk import run (Dropbox sync or CSV upload), tracked so staff can follow it and a crashed run can resume."""
+    KIND_CHOICES = [
+        ('sync_dropbox', 'Dropbox Sync'),
+        ('import_members', 'Import Members'),
+        ('update_metadata', 'Update Book Metadata'),
+        ('upload_book', 'Book Upload'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    name = models.CharField(max_length=255, blank=True, help_text="Uploaded file name, Dropbox folder or book title")
+    params = models.JSONField(default=dict, blank=True, help_text="Importer options and spooled upload path")
+    created_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True)
+
+    # Progress counters
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete")
+    processed = models.IntegerField(default=0)
+    total = models.IntegerField(default=0, help_text="0 if not known up front")
+    created = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    message = models.TextField(blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    checkpoint = models.JSONField(null=True, blank=True, help_text="Last committed position, resumed from after a crash")
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'heartbeat_at'], name='importjob_status_heartbeat')]
+
+    @property
+    def throughput(self):
+        """Rows/files processed per second since the job first started."""
+        end = self.finished_at or self.heartbeat_at
+        if not (self.started_at and end) or end <= self.started_at:
+            return 0.0
+        return self.processed / (end - self.started_at).total_seconds()
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
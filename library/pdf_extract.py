@@ -0,0 +1,53 @@
+"""
+Pure PDF parsing used by pdf_metadata's process pool. Nothing here touches Django, so pool
+workers start without loading settings or opening database connections.
+"""
+import hashlib
+import io
+import pypdfium2 as pdfium
+
+COVER_WIDTH = 320  # px, rendered then shrunk by thumbnails.store
+DROPBOX_HASH_BLOCK = 4 * 1024 * 1024
+
+def content_hash(fileobj):
+    """Dropbox's content_hash: sha256 over the sha256 of each 4 MB block. Matches FileMetadata.content_hash."""
+    overall = hashlib.sha256()
+    while True:
+        block = fileobj.read(DROPBOX_HASH_BLOCK)
+        if not block:
+            break
+        overall.update(hashlib.sha256(block).digest())
+    return overall.hexdigest()
+
+def clean(value):
+    return ' '.join((value or '').replace('\x00', '').split())
+
+def extract_pdf(path):
+    """
+    Returns {'title', 'author', 'subject', 'keywords', 'page_count', 'cover'} for the PDF at
+    path, where cover is a PNG of the first page (or b'') - or {'error': ...} if it can't be read.
+    """
+    try:
+        pdf = pdfium.PdfDocument(path)
+    except pdfium.PdfiumError as e:
+        return {'error': f"Unreadable PDF: {e}"}
+    try:
+        meta = pdf.get_metadata_dict()
+        result = {
+            'title': clean(meta.get('Title'))[:200],
+            'author': clean(meta.get('Author'))[:200],
+            'subject': clean(meta.get('Subject'))[:500],
+            'keywords': clean(meta.get('Keywords'))[:500],
+            'page_count': len(pdf),
+            'cover': b'',
+        }
+        if len(pdf):
+            page = pdf[0]
+            width = page.get_width() or COVER_WIDTH
+            image = page.render(scale=min(2.0, COVER_WIDTH / width)).to_pil()
+            buffer = io.BytesIO()
+            image.convert('RGB').save(buffer, 'PNG')
+            result['cover'] = buffer.getvalue()
+        return result
+    finally:
+        pdf.close()
@@ -0,0 +1,189 @@
+"""
+Fills in soft copies that arrived from Dropbox with only a filename: embedded PDF author,
+title, subject keywords and page count, plus a first-page thumbnail as a fallback cover.
+Downloads run in a thread pool, parsing in a process pool (pdf_extract), and every result is
+kept in PdfMetadata by Dropbox content hash so an unchanged file is never downloaded twice.
+"""
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from django.db.models import Q
+from .dropbox_import import call_api, title_from_filename
+from .importers import PLACEHOLDER_AUTHORS, book_fingerprint
+from .models import Book, DropboxFile, PdfMetadata
+from .pdf_extract import extract_pdf, content_hash
+from .thumbnails import lost_thumbnails, on_disk, store
+from .throttling import TokenBucket
+
+DEFAULT_WORKERS = os.cpu_count() or 2
+DEFAULT_DOWNLOADS = 4
+DEFAULT_RATE = 10  # Dropbox downloads per second
+BATCH_SIZE = 500
+JUNK_TITLES = ('untitled', 'microsoft word', 'document', 'title')
+
+class PdfReport:
+    def __init__(self):
+        self.files = 0
+        self.cached = 0
+        self.parsed = 0
+        self.failed = 0
+        self.updated = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        rate = self.parsed / self.elapsed if self.elapsed else 0
+        return (f"Files: {self.files} ({self.cached} cached, {self.parsed} parsed, {self.failed} failed), "
+                f"Books updated: {self.updated} in {self.elapsed:.1f}s ({rate:.1f} PDFs/s)")
+
+def usable_title(title):
+    """Embedded titles are often junk left by the authoring tool ('Microsoft Word - draft3.doc')."""
+    lowered = title.lower()
+    return len(title) >= 3 and not lowered.startswith(JUNK_TITLES) and not lowered.endswith(('.pdf', '.doc', '.docx'))
+
+NO_COVER_URL = Q(cover_url__isnull=True) | Q(cover_url='')
+
+def needs_metadata():
+    """SC books still missing something a PDF could provide."""
+    return Q(author__in=PLACEHOLDER_AUTHORS) | Q(keywords='') | Q(page_count__isnull=True) | (NO_COVER_URL & Q(cover_thumbnail=''))
+
+def apply_pdf_metadata(book, path_lower, meta):
+    """Fills gaps on book from a PdfMetadata row; curated values are never overwritten. Returns True if changed."""
+    changed = False
+    if meta.author and book.author in PLACEHOLDER_AUTHORS:
+        book.author, changed = meta.author, True
+    keywords = meta.keywords or meta.subject
+    if keywords and not book.keywords:
+        book.keywords, changed = keywords, True
+    if meta.page_count and book.page_count != meta.page_count:
+        book.page_count, changed = meta.page_count, True
+    # Only replace a title import_dropbox derived from the filename (path_lower has lost its case)
+    if usable_title(meta.title) and book.title.lower() == title_from_filename(path_lower.rsplit('/', 1)[-1]) \
+            and book.title.lower() != meta.title.lower():
+        book.title, changed = meta.title, True
+    if meta.cover_thumbnail and not book.cover_url and not book.cover_thumbnail:
+        book.cover_thumbnail, changed = meta.cover_thumbnail, True
+    book.fingerprint = book_fingerprint(book.title, book.author)
+    return changed
+
+def download(dbx, limiter, row, folder):
+    """Fetches one PDF to a temp file. Returns (path, content hash)."""
+    target = os.path.join(folder, f"{uuid.uuid4().hex}.pdf")
+    call_api(limiter, dbx.files_download_to_file, target, row.path_lower)
+    if row.content_hash:
+        return target, row.content_hash
+    with open(target, 'rb') as f:
+        return target, content_hash(f)
+
+def parse_window(dbx, rows, fetchers, parsers, limiter, folder, cached, report, log):
+    """Downloads and parses one window of files, so at most one window of PDFs sits on disk.
+    Yields (row, content hash, PdfMetadata), skipping the parse if the hash turns out to be cached."""
+    fetching = {fetchers.submit(download, dbx, limiter, row, folder): row for row in rows}
+    parsing = {}
+    for future in as_completed(fetching):
+        row = fetching[future]
+        try:
+            path, digest = future.result()
+        except Exception as e:
+            report.failed += 1
+            log(f"Error downloading {row.path_lower}: {e}")
+            continue
+        if digest in cached:  # Only known once hashed (rows imported before hashes were recorded)
+            os.remove(path)
+            report.cached += 1
+            yield row, digest, cached[digest]
+            continue
+        parsing[parsers.submit(extract_pdf, path)] = (row, path, digest)
+
+    for future in as_completed(parsing):
+        row, path, digest = parsing[future]
+        try:
+            result = future.result()
+        except Exception as e:  # A worker died (e.g. pdfium on a hostile file)
+            result = {'error': f"Parser crashed: {e}"}
+        os.remove(path)
+        if 'error' in result:
+            report.failed += 1
+            log(f"Error reading {row.path_lower}: {result['error']}")
+            yield row, digest, PdfMetadata(content_hash=digest, error=result['error'][:200])
+            continue
+        report.parsed += 1
+        cover = result.pop('cover')
+        yield row, digest, PdfMetadata(content_hash=digest, cover_thumbnail=store(cover)[0] if cover else '', **result)
+
+def extract_metadata(dbx, books=None, workers=DEFAULT_WORKERS, downloads=DEFAULT_DOWNLOADS, rate=DEFAULT_RATE,
+                     reparse=False, log=print):
+    """
+    Enriches SC books (default: those needing metadata, or whose first-page cover file is gone)
+    from their Dropbox PDFs. Each distinct content hash is parsed once, and again only to rebuild a
+    lost cover; books are written with bulk_update.
+    """
+    start = time.perf_counter()
+    report = PdfReport()
+    if books is None:
+        soft_copies = Book.objects.filter(type='SC')
+        lost = lost_thumbnails(soft_copies.filter(NO_COVER_URL))
+        books = soft_copies.filter(needs_metadata() | (NO_COVER_URL & Q(cover_thumbnail__in=lost)))
+    rows = (DropboxFile.objects.filter(book__in=books, path_lower__endswith='.pdf')
+            .select_related('book').only('path_lower', 'content_hash', 'book__book_id', 'book__title', 'book__author',
+                                         'book__keywords', 'book__page_count', 'book__cover_url', 'book__cover_thumbnail'))
+    by_hash, unhashed = {}, []
+    for row in rows:
+        if row.content_hash:
+            by_hash.setdefault(row.content_hash, []).append(row)
+        else:
+            unhashed.append(row)
+    report.files = len(by_hash) + len(unhashed)
+
+    cached = {} if reparse else {m.content_hash: m for m in PdfMetadata.objects.filter(content_hash__in=list(by_hash))}
+    # A cached cover whose file is gone is rebuilt by parsing the PDF again (the row is overwritten, not lost)
+    covers = {m.cover_thumbnail for m in cached.values()} | {row.book.cover_thumbnail for group in by_hash.values()
+                                                             for row in group if not row.book.cover_url}
+    lost = {name for name in covers if name and not on_disk(name)}
+    cached = {digest: meta for digest, meta in cached.items() if meta.cover_thumbnail not in lost}
+    report.cached = len(cached)
+    todo = [group[0] for h, group in by_hash.items() if h not in cached] + unhashed
+
+    folder = tempfile.mkdtemp(prefix='elib_pdf_')
+    limiter = TokenBucket(rate)
+    window = max(workers, downloads) * 4
+    new_meta = {}
+    try:
+        with ThreadPoolExecutor(max_workers=downloads) as fetchers, ProcessPoolExecutor(max_workers=workers) as parsers:
+            for i in range(0, len(todo), window):
+                batch = todo[i:i + window]
+                for row, digest, meta in parse_window(dbx, batch, fetchers, parsers, limiter, folder, cached, report, log):
+                    if digest not in cached:
+                        new_meta[digest] = meta
+                    cached[digest] = meta
+                    if not row.content_hash:
+                        row.content_hash = digest
+                        by_hash.setdefault(digest, []).append(row)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    # Errors are cached too, so a broken PDF isn't downloaded again until it changes
+    PdfMetadata.objects.bulk_create(list(new_meta.values()), batch_size=BATCH_SIZE, update_conflicts=True,
+                                    unique_fields=['content_hash'], update_fields=['title', 'author', 'subject', 'keywords',
+                                                                                   'page_count', 'cover_thumbnail', 'error'])
+    DropboxFile.objects.bulk_update(unhashed, ['content_hash'], batch_size=BATCH_SIZE)
+
+    updated = {}
+    for digest, group in by_hash.items():
+        meta = cached.get(digest)
+        if not meta or meta.error:
+            continue
+        for row in group:
+            book = updated.get(row.book.pk, row.book)
+            relink = book.cover_thumbnail in lost and not book.cover_url
+            if relink:
+                book.cover_thumbnail = ''  # Takes the rebuilt cover, or none if the PDF no longer yields one
+            if apply_pdf_metadata(book, row.path_lower, meta) or relink:
+                updated[book.pk] = book
+    Book.objects.bulk_update(list(updated.values()), ['title', 'author', 'keywords', 'page_count', 'cover_thumbnail',
+                                                      'fingerprint'], batch_size=BATCH_SIZE)
+    report.updated = len(updated)
+    report.elapsed = time.perf_counter() - start
+    return report
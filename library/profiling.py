@@ -0,0 +1,178 @@
+"""
+Per-request profiling. ProfilingMiddleware times every view and counts its queries and DB time
+(request.profile, also fed to the request metrics in metrics.py). Requests slower than
+PROFILING_SLOW_MS are logged as one JSON line to the 'library.slow_requests' logger and saved
+as SlowRequest rows by one writer thread per process, off the request path, for the staff Slow
+Requests page.
+PROFILING_SAMPLE_RATE of requests also run under cProfile; the profile is kept only if the
+request turned out slow.
+"""
+import cProfile
+import heapq
+import io
+import json
+import logging
+import os
+import pstats
+import queue
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Avg, Count, Max, Sum
+from django.utils import timezone
+from . import metrics
+from .models import SlowRequest
+
+logger = logging.getLogger('library.slow_requests')
+
+TOP_QUERIES = 5  # Slowest statements kept per request
+SQL_LENGTH = 1000
+PROFILE_LINES = 30
+PROFILE_LENGTH = 20000
+RETENTION = timedelta(days=7)  # Pruned nightly by purge_sessions
+QUEUE_SIZE = 500  # Slow requests waiting to be saved; past this they are only logged
+RECENT_ROWS = 500  # Slow requests scanned for the statement ranking
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_LISTS = re.compile(r'\((?:\s*(?:%s|\?),?)+\)')
+
+class QueryRecorder:
+    """connection.execute_wrapper hook: counts statements and their time, keeps the slowest few."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []  # Min-heap of (seconds, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            item = (elapsed, sql[:SQL_LENGTH])
+            if len(self.slowest) < TOP_QUERIES:
+                heapq.heappush(self.slowest, item)
+            elif item > self.slowest[0]:
+                heapq.heapreplace(self.slowest, item)
+
+class RequestProfile:
+    def __init__(self, view, seconds, recorder):
+        self.view = view
+        self.seconds = seconds
+        self.query_count = recorder.count
+        self.db_seconds = recorder.seconds
+        self.slowest_queries = [{'ms': round(s * 1000, 2), 'sql': sql} for s, sql in sorted(recorder.slowest, reverse=True)]
+
+def start_profiler():
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # Another profiler is active (Python 3.12+ allows one per process)
+        return None
+    return profiler
+
+def profile_text(profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    return out.getvalue()[:PROFILE_LENGTH]
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        profiler = start_profiler() if random.random() < settings.PROFILING_SAMPLE_RATE else None
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            if profiler:
+                profiler.disable()
+        match = request.resolver_match
+        request.profile = RequestProfile(match.view_name if match else '', time.perf_counter() - start, recorder)
+        metrics.observe_request(request.profile, request.method, response.status_code)
+        if request.profile.seconds * 1000 >= settings.PROFILING_SLOW_MS:
+            record_slow_request(request, response.status_code, profile_text(profiler) if profiler else '')
+        return response
+
+def record_slow_request(request, status, profile=''):
+    p = request.profile
+    entry = {'method': request.method, 'path': request.path[:500], 'view': p.view, 'status': status,
+             'duration_ms': round(p.seconds * 1000, 1), 'query_count': p.query_count,
+             'db_ms': round(p.db_seconds * 1000, 1), 'queries': p.slowest_queries}
+    logger.warning(json.dumps(entry))
+    writer.submit(entry, profile)  # A DB write must not slow the request further
+
+def save_slow_request(entry, profile):
+    try:
+        SlowRequest.objects.create(profile=profile, **entry)
+    except Exception:
+        logger.exception("Slow request not saved")
+
+class SlowRequestWriter:
+    """
+    Saves slow requests in order on a single thread per process. The queue is bounded, so the load
+    spike that makes requests slow can't pile up threads or DB connections: past `size` waiting,
+    a slow request is only logged.
+    """
+
+    def __init__(self, size=QUEUE_SIZE):
+        self.size = size
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def submit(self, entry, profile):
+        """Queues one slow request. Returns False if it was dropped."""
+        with self.lock:
+            if self.pid != os.getpid():  # First use, or a forked worker: this process needs its own thread
+                self.pid, self.pending = os.getpid(), queue.Queue(self.size)
+                threading.Thread(target=self.run, args=(self.pending,), daemon=True).start()
+        try:
+            self.pending.put_nowait((entry, profile))
+        except queue.Full:
+            return False
+        return True
+
+    def run(self, pending):
+        while True:
+            save_slow_request(*pending.get())
+            if pending.empty():
+                connections.close_all()  # This thread's connection, until the next burst
+
+writer = SlowRequestWriter()
+
+def prune_slow_requests():
+    """Deletes slow requests older than RETENTION. Returns how many."""
+    return SlowRequest.objects.filter(timestamp__lt=timezone.now() - RETENTION).delete()[0]
+
+def normalize_sql(sql):
+    """Statements that differ only in literal values are the same offender."""
+    return _LISTS.sub('(...)', _LITERALS.sub('?', sql))
+
+def top_offenders(minutes, limit=20):
+    """Slow requests in the last `minutes`: per view, ranked by total time; per statement shape, likewise."""
+    recent = SlowRequest.objects.filter(timestamp__gte=timezone.now() - timedelta(minutes=minutes))
+    views = list(recent.values('view').annotate(
+        hits=Count('id'), total_ms=Sum('duration_ms'), avg_ms=Avg('duration_ms'), max_ms=Max('duration_ms'),
+        avg_queries=Avg('query_count'), avg_db_ms=Avg('db_ms')).order_by('-total_ms')[:limit])
+
+    statements = defaultdict(lambda: {'hits': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': set()})
+    for row in recent.only('view', 'queries')[:RECENT_ROWS]:
+        for query in row.queries:
+            stat = statements[normalize_sql(query['sql'])]
+            stat['hits'] += 1
+            stat['total_ms'] += query['ms']
+            stat['max_ms'] = max(stat['max_ms'], query['ms'])
+            stat['views'].add(row.view)
+    ranked = sorted(({'sql': sql, **stat, 'views': sorted(stat['views'])} for sql, stat in statements.items()),
+                    key=lambda s: s['total_ms'], reverse=True)[:limit]
+    return {'views': views, 'statements': ranked, 'latest': recent[:25]}
@@ -0,0 +1,187 @@
+"""
+Synthetic catalog for scale testing: books, members and request history in the shapes the
+real library has - a few popular topics and bestsellers account for most keywords and loans,
+a few heavy readers for most requests - written with chunked bulk inserts. Deterministic
+for a given seed. See the generate_data and load_test commands.
+"""
+import itertools
+import random
+import time
+from datetime import timedelta
+from django.db import connection
+from django.utils import timezone
+from .analytics import rebuild_rollups
+from .importers import book_fingerprint
+from .models import Book, BookRequest, Member
+
+CHUNK = 50000  # Rows built in memory per bulk_create call
+BATCH_SIZE = 5000
+HC_SHARE = 0.4
+HC_OWNERS = ['Library', 'FAYM', 'Pastor Mensah', 'Bro. Kofi', 'Sis. Ama']
+PENDING_HOURS = 5  # admin_dashboard_view expires HC requests left pending longer than this
+
+TOPICS = [
+    'Faith', 'Prayer', 'Leadership', 'Purpose', 'Marriage', 'Finance', 'Worship', 'Grace', 'Healing',
+    'Family', 'Discipleship', 'Youth', 'Evangelism', 'Holy Spirit', 'Wisdom', 'Love', 'Hope', 'Forgiveness',
+    'Character', 'Growth', 'Self-help', 'Habits', 'Money', 'Business', 'History', 'Theology', 'Parenting',
+    'Relationships', 'Mission', 'Devotional', 'Biography', 'Fiction', 'Apologetics', 'Prophecy', 'Fasting',
+    'Kingdom', 'Identity', 'Calling', 'Ministry', 'Counselling', 'Health', 'Productivity', 'Psalms', 'Gospels',
+    'Revival', 'Stewardship', 'Women', 'Men', 'Children', 'Church', 'Culture', 'Ethics', 'Suffering',
+    'Joy', 'Peace', 'Courage', 'Excellence', 'Vision', 'Destiny', 'Salvation',
+]
+ADJECTIVES = [
+    'Hidden', 'Everyday', 'Radical', 'Quiet', 'Unshakable', 'Practical', 'Ancient', 'Fearless', 'Simple',
+    'Complete', 'Daily', 'Powerful', 'Gentle', 'True', 'Lasting', 'Living', 'New', 'Secret', 'Open', 'Deeper',
+]
+NOUNS = [
+    'Power', 'Path', 'Journey', 'Keys', 'Secrets', 'Principles', 'Art', 'Promise', 'Call', 'Heart', 'Way',
+    'Life', 'Walk', 'Gift', 'Foundations', 'Habits', 'Laws', 'Seasons', 'Steps', 'Roots', 'Fire', 'Voice',
+]
+PATTERNS = ['The {adj} {noun} of {topic}', '{adj} {topic}', '{noun} of {topic}: {adj} {noun2}',
+            '{number} Days of {topic}', 'When {topic} Meets {topic2}']
+FIRST_NAMES = [
+    'Kwame', 'Ama', 'Kofi', 'Akosua', 'Yaw', 'Abena', 'Kwesi', 'Efua', 'Kojo', 'Adwoa', 'Nana', 'Esi',
+    'John', 'Mary', 'David', 'Grace', 'Samuel', 'Ruth', 'Daniel', 'Esther', 'Joseph', 'Deborah', 'Emmanuel',
+    'Mercy', 'Isaac', 'Joyce', 'Michael', 'Priscilla', 'Richard', 'Comfort',
+]
+SURNAMES = [
+    'Mensah', 'Owusu', 'Boateng', 'Asante', 'Osei', 'Agyeman', 'Addo', 'Appiah', 'Darko', 'Ofori', 'Amoah',
+    'Badu', 'Quaye', 'Tetteh', 'Lartey', 'Nkrumah', 'Sarpong', 'Frimpong', 'Danso', 'Acheampong',
+    'Smith', 'Warren', 'Maxwell', 'Lewis', 'Clear', 'Munroe', 'Meyer', 'Lucado', 'Keller', 'Piper',
+]
+
+class SyntheticReport:
+    def __init__(self):
+        self.books = 0
+        self.members = 0
+        self.requests = 0
+        self.on_loan = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (f"Books: {self.books}, Members: {self.members}, Requests: {self.requests} "
+                f"({self.on_loan} HC books on loan) in {self.elapsed:.1f}s")
+
+def zipf_weights(count, exponent):
+    """Cumulative weights for random.choices: rank r is drawn proportionally to 1 / r**exponent."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+def make_titles(rng, count):
+    """count distinct titles; the pattern space covers ~100k before a numbered edition is needed."""
+    seen = set()
+    titles = []
+    while len(titles) < count:
+        pattern = rng.choice(PATTERNS)
+        title = pattern.format(adj=rng.choice(ADJECTIVES), noun=rng.choice(NOUNS), noun2=rng.choice(NOUNS),
+                               topic=rng.choice(TOPICS), topic2=rng.choice(TOPICS), number=rng.choice([7, 21, 30, 40, 100]))
+        if title in seen:
+            title = f'{title}, Book {len(titles)}'  # Numbered editions keep the catalog free of duplicates
+        seen.add(title)
+        titles.append(title)
+    return titles
+
+def generate(books=1000, members=500, requests=20000, days=730, seed=1, log=print):
+    """
+    Appends a synthetic catalog to the database and rebuilds the dashboard rollups. Member
+    emails and phone numbers are numbered past the current highest member id, so repeated
+    runs add to the data instead of colliding with it.
+    """
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    report = SyntheticReport()
+    topic_weights = zipf_weights(len(TOPICS), 1.1)
+
+    authors = [f'{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}' for _ in range(max(20, books // 8))]
+    author_weights = zipf_weights(len(authors), 0.9)  # A few prolific authors, a long tail of one-book ones
+    new_books = []
+    for title in make_titles(rng, books):
+        book_type = 'HC' if rng.random() < HC_SHARE else 'SC'
+        keywords = dict.fromkeys(rng.choices(TOPICS, cum_weights=topic_weights, k=rng.randint(1, 4)))
+        author = rng.choices(authors, cum_weights=author_weights)[0]
+        new_books.append(Book(
+            title=title, type=book_type, author=author, keywords=', '.join(keywords),
+            owner=rng.choice(HC_OWNERS) if book_type == 'HC' else 'FAYM',
+            location=f'Shelf {rng.choice("ABCDEFGH")}{rng.randint(1, 20)}' if book_type == 'HC'
+            else f'https://www.dropbox.com/s/synthetic{len(new_books)}/book.pdf',
+            duration_days=rng.choice([7, 7, 7, 14]), fingerprint=book_fingerprint(title, author)))
+    new_books = Book.objects.bulk_create(new_books, batch_size=BATCH_SIZE)
+    report.books = len(new_books)
+    log(f"Books: {report.books}")
+
+    first = (Member.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+    new_members = []
+    for number in range(first, first + members):
+        firstname, surname = rng.choice(FIRST_NAMES), rng.choice(SURNAMES)
+        new_members.append(Member(firstname=firstname, surname=surname, email=f'synthetic{number}@example.com',
+                                  mobile_number=f'029{number:07d}', residence=rng.choice(['Accra', 'Kumasi', 'Tema', 'Takoradi'])))
+    new_members = Member.objects.bulk_create(new_members, batch_size=BATCH_SIZE)
+    report.members = len(new_members)
+    log(f"Members: {report.members}")
+
+    if new_books and new_members:
+        # Popularity is shuffled so it does not follow the primary key
+        popular_books = rng.sample(new_books, len(new_books))
+        active_members = rng.sample(new_members, len(new_members))
+        book_weights = zipf_weights(len(popular_books), 1.0)
+        member_weights = zipf_weights(len(active_members), 0.8)
+        on_loan = set()
+        for done in range(0, requests, CHUNK):
+            size = min(CHUNK, requests - done)
+            picks = zip(rng.choices(popular_books, cum_weights=book_weights, k=size),
+                        rng.choices(active_members, cum_weights=member_weights, k=size))
+            create_backdated_requests([make_request(rng, book, member, days, on_loan) for book, member in picks])
+            report.requests += size
+            log(f"Requests: {report.requests}/{requests}")
+        loaned = sorted(on_loan)
+        for i in range(0, len(loaned), BATCH_SIZE):
+            Book.objects.filter(pk__in=loaned[i:i + BATCH_SIZE]).update(availability='Taken')
+        report.on_loan = len(loaned)
+
+    rebuild_rollups()
+    report.elapsed = time.perf_counter() - start
+    return report
+
+def create_backdated_requests(requests, batch_size=BATCH_SIZE):
+    """
+    bulk_create for requests carrying their own timestamps. The field is auto_now_add, so the
+    insert stamps every row "now"; the intended times are written back by primary key in one
+    executemany (bulk_update's CASE statements are ten times slower at this size). Signals are
+    skipped as with any bulk write: rebuild the rollups afterwards.
+    """
+    timestamps = [req.timestamp for req in requests]
+    created = BookRequest.objects.bulk_create(requests, batch_size=batch_size)
+    opts, qn = BookRequest._meta, connection.ops.quote_name
+    field = opts.get_field('timestamp')
+    sql = f'UPDATE {qn(opts.db_table)} SET {qn(field.column)} = %s WHERE {qn(opts.pk.column)} = %s'
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(field.get_db_prep_save(timestamp, connection), req.pk)
+                                 for req, timestamp in zip(created, timestamps)])
+    for req, timestamp in zip(created, timestamps):
+        req.timestamp = timestamp
+    return created
+
+def make_request(rng, book, member, days, on_loan):
+    """One historical request, with the statuses submit_request and the librarians would have left on it."""
+    now = timezone.now()
+    timestamp = now - timedelta(days=days * rng.random() ** 1.5)  # Busier lately, as the library has grown
+    req = BookRequest(member=member, full_name=f'{member.firstname} {member.surname}', email=member.email,
+                      book=book, book_type=book.type, timestamp=timestamp)
+    if book.type == 'SC':  # Approved on submit
+        req.approval_status = 'Approved' if rng.random() < 0.97 else 'Not Approved'
+        req.approval_date = timestamp
+        req.return_status = 'N/A'
+    elif now - timestamp < timedelta(hours=PENDING_HOURS):
+        req.approval_status = 'Pending'
+    else:
+        roll = rng.random()
+        req.approval_status = 'Approved' if roll < 0.8 else 'Expired' if roll < 0.92 else 'Not Approved'
+        if req.approval_status == 'Approved':
+            req.approval_date = timestamp + timedelta(minutes=rng.expovariate(1 / 180) % (PENDING_HOURS * 60))
+            req.delivery_date = req.approval_date
+            req.expected_return_date = req.approval_date + timedelta(days=book.duration_days)
+            if req.expected_return_date < now and rng.random() < 0.95:
+                req.return_status = 'Returned'
+            else:
+                req.return_status = 'Pending' if req.expected_return_date > now else 'Overdue'
+                on_loan.add(book.pk)
+    return req
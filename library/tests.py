@@ -1,3 +1,1253 @@
-from django.test import TestCase
+from django.test import Client, LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, F, QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.utils import timezone
+import contextlib
+import csv
+import json
+import threading
+import time
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from unittest import mock
+from .importers import import_members, sync_book_metadata, iter_text_lines, read_csv_rows
+from .dropbox_import import import_folder
+from .covers import CoverFetcher, fetch_covers, lookup_key
+from .thumbnails import build_thumbnails, thumbnail_path
+from .dropbox_upload import dropbox_path
+from .pdf_metadata import extract_metadata
+from .dedup import dedupe_books, find_clusters
+from .synthetic import generate
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from .fake_dropbox import FakeDropbox
+from .analytics import rollup_kpis, format_lead_time, rebuild_rollups, top_books, top_members, request_trend
+from .models import Book, Member, BookRequest, OTPRecord, ReturnLog, DailyStatusStat, DailyBookStat, DailyMemberStat, DropboxCursor, DropboxFile, ImportJob, CoverLookup, PdfMetadata, SharedLink, SlowRequest
+from . import analytics, dropbox_client, exports, jobs, metrics, profiling, views
 
-# Create your tests here.
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+_isolation = contextlib.ExitStack()
+
+def setUpModule():
+    """Every test runs against its own cache and metrics directory, never the project's in BASE_DIR
+    (any request write bumps the dashboard generation key, and every request is counted)."""
+    folder = tempfile.mkdtemp()
+    _isolation.callback(shutil.rmtree, folder, ignore_errors=True)
+    _isolation.enter_context(override_settings(CACHES=LOCMEM_CACHE, METRICS_DIR=folder))
+    _isolation.enter_context(mock.patch.dict(metrics._state, pid=None))  # This process writes to folder, until restored
+
+def tearDownModule():
+    _isolation.close()
+
+
+@override_settings(WIGAL_API_KEY='', EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OTPSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()  # send_otp is rate limited per IP
+        self.member = Member.objects.create(firstname='Ama', surname='Mensah', email='ama@example.com', mobile_number='0240000001')
+        self.book = Book.objects.create(title='Atomic Habits', type='SC', author='James Clear', owner='FAYM',
+                                        location='https://example.com/atomic.pdf', keywords='Habits')
+
+    def verify(self):
+        self.client.post('/send-otp/', {'identity': self.member.email})
+        otp = OTPRecord.objects.get(phone_number=self.member.mobile_number)
+        return self.client.post('/verify-otp/', {'otp_code': otp.otp_code}).json()
+
+    def test_otp_flow_never_touches_session_table(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.verify()['status'], 'success')
+            res = self.client.post('/request/', {'book_id': self.book.book_id}).json()
+        self.assertEqual(res['status'], 'success')
+        self.assertFalse([q for q in ctx.captured_queries if 'django_session' in q['sql']])
+        self.assertEqual(BookRequest.objects.filter(member=self.member).count(), 1)
+
+    def test_otp_cookie_payload_is_compact(self):
+        self.verify()
+        request = RequestFactory().get('/')
+        request.COOKIES[views.OTP_COOKIE] = self.client.cookies[views.OTP_COOKIE].value
+        self.assertEqual(set(views.otp_state(request)), {views.OTP_VERIFIED})
+        self.assertFalse(self.client.session.keys())  # Nothing in the server-side session
+
+    def test_forged_otp_cookie_is_ignored(self):
+        forged = {views.OTP_VERIFIED: [self.member.mobile_number, int(time.time()) + 600]}
+        self.client.cookies[views.OTP_COOKIE] = signing.dumps(forged, key='not-the-secret-key', salt=views.OTP_COOKIE)
+        res = self.client.post('/request/', {'book_id': self.book.book_id}).json()
+        self.assertEqual(res['status'], 'error')
+        self.assertFalse(BookRequest.objects.exists())
+
+    def test_expired_verification_is_rejected(self):
+        self.verify()
+        with mock.patch.object(views, 'time', mock.Mock(time=lambda: 10**10)):
+            res = self.client.post('/request/', {'book_id': self.book.book_id}).json()
+        self.assertEqual(res['status'], 'error')
+        self.assertFalse(BookRequest.objects.exists())
+
+
+class DashboardKPITests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Mere Christianity', type='SC', author='C.S. Lewis', owner='FAYM',
+                                        location='https://example.com/mere.pdf', keywords='Faith')
+        now = timezone.now()
+        for hours, status in [(2, 'Approved'), (4, 'Approved'), (0, 'Pending'), (0, 'Expired'), (0, 'Not Approved')]:
+            req = BookRequest.objects.create(full_name='Kofi Boateng', email='kofi@example.com', book=self.book)
+            BookRequest.objects.filter(pk=req.pk).update(
+                approval_status=status, timestamp=now - timedelta(hours=hours),
+                approval_date=now if status == 'Approved' else None,
+            )
+        rebuild_rollups()  # queryset.update() bypasses the incremental rollup path
+
+    def test_kpis_in_single_query(self):
+        with self.assertNumQueries(1):
+            kpis = rollup_kpis()
+        self.assertEqual(kpis['total_requests'], 5)
+        self.assertEqual(kpis['approved_count'], 2)
+        self.assertEqual(kpis['pending_count'], 1)
+        self.assertEqual(kpis['expired_count'], 1)
+        self.assertEqual(kpis['not_approved_count'], 1)
+        self.assertEqual(format_lead_time(kpis['avg_lead_time']), '3.0 Hours')
+
+    def test_dashboard_context(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        res = self.client.get('/dashboard/')
+        self.assertEqual(res.context['total_requests'], 5)
+        self.assertEqual(res.context['missed_count'], 1)
+        self.assertEqual(res.context['lead_time'], '3.0 Hours')
+        self.assertEqual(sorted(res.context['pie_labels']), ['Approved', 'Expired', 'Not Approved', 'Pending'])
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.sc = Book.objects.create(title='Atomic Habits', type='SC', author='James Clear', owner='FAYM',
+                                      location='https://example.com/atomic.pdf', keywords='Habits')
+        self.hc = Book.objects.create(title='Leadership 101', type='HC', author='John Maxwell', owner='Library',
+                                      location='Shelf A', keywords='Leadership')
+
+    def rollup_rows(self):
+        return (
+            sorted(DailyStatusStat.objects.filter(count__gt=0).values_list('date', 'approval_status', 'count', 'lead_time_total', 'lead_time_count')),
+            sorted(DailyBookStat.objects.filter(count__gt=0).values_list('date', 'book_id', 'count')),
+            sorted(DailyMemberStat.objects.filter(count__gt=0).values_list('date', 'full_name', 'count')),
+        )
+
+    def test_incremental_updates_match_rebuild(self):
+        BookRequest.objects.create(full_name='Ama Mensah', email='ama@example.com', book=self.sc, approval_status='Approved')
+        hc_req = BookRequest.objects.create(full_name='Kofi Boateng', email='kofi@example.com', book=self.hc)
+        hc_req.approval_status = 'Approved'
+        hc_req.save()
+        hc_req.return_status = 'Returned'
+        hc_req.save()
+        BookRequest.objects.create(full_name='Ama Mensah', email='ama@example.com', book=self.hc, approval_status='Expired').delete()
+
+        incremental = self.rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollup_rows())
+
+        kpis = rollup_kpis()
+        self.assertEqual((kpis['total_requests'], kpis['approved_count'], kpis['expired_count']), (2, 2, 0))
+        self.assertEqual(sorted((m['full_name'], m['count']) for m in top_members()), [('Ama Mensah', 1), ('Kofi Boateng', 1)])
+        self.assertEqual(sorted(b['book__title'] for b in top_books()), ['Atomic Habits', 'Leadership 101'])
+
+    def test_status_change_only_moves_status_counts(self):
+        req = BookRequest.objects.create(full_name='Ama Mensah', email='ama@example.com', book=self.hc)
+        req.approval_status = 'Expired'
+        with CaptureQueriesContext(connection) as ctx:
+            req.save()
+        touched = [q['sql'] for q in ctx.captured_queries if 'daily' in q['sql']]
+        self.assertTrue(touched)
+        self.assertTrue(all('dailystatusstat' in sql for sql in touched))
+        self.assertEqual(rollup_kpis()['expired_count'], 1)
+        self.assertEqual(rollup_kpis()['pending_count'], 0)
+
+    def test_bulk_and_cascade_deletes_leave_rollups_exact(self):
+        for name in ('Ama Mensah', 'Kofi Boateng', 'Esi Owusu'):
+            BookRequest.objects.create(full_name=name, email='x@example.com', book=self.sc, approval_status='Approved')
+            BookRequest.objects.create(full_name=name, email='x@example.com', book=self.hc)
+        BookRequest.objects.filter(full_name='Esi Owusu').delete()  # Admin "delete selected"
+        self.hc.delete()  # Cascades to its requests
+        incremental = self.rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollup_rows())
+        self.assertEqual(rollup_kpis()['total_requests'], 2)
+
+    def test_bump_survives_losing_the_insert_race(self):
+        day = timezone.localdate()
+        DailyMemberStat.objects.create(date=day, full_name='Ama Mensah', count=1)
+        real_update = QuerySet.update
+        calls = []
+        def update(qs, **kwargs):  # The first update misses: the row "appears" right after it
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else real_update(qs, **kwargs)
+        with transaction.atomic(), mock.patch.object(QuerySet, 'update', update):
+            analytics._bump(DailyMemberStat, {'date': day, 'full_name': 'Ama Mensah'}, count=1)
+            self.assertEqual(DailyMemberStat.objects.get().count, 2)  # And the transaction is still usable
+
+
+class RequestTrendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        for days_ago, count in [(0, 3), (2, 1), (9, 4)]:
+            DailyStatusStat.objects.create(date=self.today - timedelta(days=days_ago), approval_status='Approved', count=count)
+
+    def test_daily_buckets_are_gap_filled(self):
+        labels, data = request_trend(30, 'day')
+        self.assertEqual(len(labels), 30)
+        self.assertEqual(data[-3:], [1, 0, 3])
+        self.assertEqual(sum(data), 8)
+
+    def test_weekly_and_monthly_totals(self):
+        for granularity in ('week', 'month'):
+            labels, data = request_trend(90, granularity)
+            self.assertEqual(len(labels), len(data))
+            self.assertEqual(sum(data), 8)
+
+    def test_trend_is_cached_per_range_and_granularity(self):
+        request_trend(30, 'day')
+        with self.assertNumQueries(0):
+            request_trend(30, 'day')
+        with self.assertNumQueries(1):
+            request_trend(30, 'week')
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(title='Atomic Habits', type='SC', author='James Clear', owner='FAYM',
+                                        location='https://example.com/atomic.pdf', keywords='Habits')
+        self.last_year = timezone.localdate().year - 1
+
+    def make_request(self):
+        return BookRequest.objects.create(full_name='Ama Mensah', email='ama@example.com', book=self.book)
+
+    def test_repeat_view_is_served_from_cache(self):
+        self.make_request()
+        analytics.dashboard_stats()
+        with self.assertNumQueries(0):
+            stats = analytics.dashboard_stats()
+        self.assertEqual(stats['kpis']['total_requests'], 1)
+
+    def test_request_write_invalidates_current_stats(self):
+        analytics.dashboard_stats()
+        self.make_request()
+        self.assertEqual(analytics.dashboard_stats()['kpis']['total_requests'], 1)
+
+    def test_closed_period_survives_current_writes(self):
+        analytics.dashboard_stats(self.last_year, 6)
+        self.make_request()
+        with self.assertNumQueries(0):
+            analytics.dashboard_stats(self.last_year, 6)
+
+    def test_backdated_write_invalidates_closed_period(self):
+        req = self.make_request()
+        BookRequest.objects.filter(pk=req.pk).update(timestamp=timezone.now().replace(year=self.last_year, month=6, day=15))
+        rebuild_rollups()
+        self.assertEqual(analytics.dashboard_stats(self.last_year, 6)['kpis']['total_requests'], 1)
+        BookRequest.objects.get(pk=req.pk).delete()
+        self.assertEqual(analytics.dashboard_stats(self.last_year, 6)['kpis']['total_requests'], 0)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        book = Book.objects.create(title='Leadership 101', type='HC', author='John Maxwell', owner='Library',
+                                   location='Shelf A', keywords='Leadership')
+        member = Member.objects.create(firstname='Kofi', surname='Boateng', email='kofi@example.com', mobile_number='0240000002')
+        for _ in range(3):
+            BookRequest.objects.create(member=member, full_name='Kofi Boateng', email=member.email, book=book)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def test_csv_streams_with_one_query(self):
+        with self.assertNumQueries(1):
+            lines = list(exports.stream_csv('requests'))
+        self.assertEqual(len(lines), 4)
+        self.assertIn('Kofi Boateng', lines[1])
+        self.assertIn('0240000002', lines[1])
+
+    def test_csv_endpoint(self):
+        res = self.client.get('/export/requests/csv/')
+        self.assertTrue(res.streaming)
+        body = b''.join(res.streaming_content).decode()
+        self.assertEqual(len(body.strip().splitlines()), 4)
+
+    def test_xlsx_endpoint(self):
+        res = self.client.get('/export/returns/xlsx/')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(b''.join(res.streaming_content).startswith(b'PK'))
+
+    def test_xlsx_writes_user_input_as_text(self):
+        book = Book.objects.first()
+        BookRequest.objects.create(full_name='=HYPERLINK("https://evil.example/","Click")', email='x@example.com',
+                                   book=book)
+        Book.objects.filter(pk=book.pk).update(title='https://evil.example/book')
+        out = io.BytesIO()
+        exports.write_xlsx('requests', out)
+        with zipfile.ZipFile(out) as xlsx:
+            sheet = xlsx.read('xl/worksheets/sheet1.xml').decode()
+            self.assertNotIn('xl/worksheets/_rels/sheet1.xml.rels', xlsx.namelist())  # No hyperlinks
+        self.assertNotIn('<f>', sheet)
+        self.assertIn('<t>=HYPERLINK("https://evil.example/","Click")</t>', sheet)
+        self.assertIn('https://evil.example/book', sheet)
+
+    def test_unknown_export(self):
+        self.assertEqual(self.client.get('/export/members/csv/').status_code, 404)
+
+
+class MemberImportTests(TestCase):
+    HEADER = 'FIRSTNAME,SURNAME,OTHERNAMES,DATEOFBIRTH,EMAIL,MOBILENUMBER,RESIDENCE,LANDMARK\n'
+
+    def setUp(self):
+        Member.objects.create(firstname='Ama', surname='Mensah', email='ama@example.com', mobile_number='0240000001')
+
+    def rows(self, body):
+        return csv.DictReader(io.StringIO(self.HEADER + body))
+
+    def test_counts_created_skipped_invalid(self):
+        body = (
+            'Kofi,Boateng,,1990-05-01,kofi@example.com,0240000002,Accra,\n'
+            'Ama,Mensah,,,AMA@example.com,0249999999,,\n'       # existing email
+            'Yaw,Asante,,,yaw@example.com,0240000001,,\n'       # existing phone
+            'Esi,Owusu,,,not-an-email,0240000003,,\n'
+            'Kojo,Ansah,,,kojo@example.com,,,\n'
+            'Kofi,Boateng,,,kofi@example.com,0240000002,,\n'    # duplicate within the file
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            report = import_members(self.rows(body))
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['SELECT', 'INSERT'])  # one preload, one bulk insert
+        self.assertEqual((report.created, report.skipped, report.invalid), (1, 3, 2))
+        kofi = Member.objects.get(email='kofi@example.com')
+        self.assertEqual(kofi.date_of_birth, datetime.date(1990, 5, 1))
+
+    def test_dry_run_writes_nothing(self):
+        report = import_members(self.rows('Kofi,Boateng,,,kofi@example.com,0240000002,,\n'), dry_run=True)
+        self.assertEqual(report.created, 1)
+        self.assertEqual(Member.objects.count(), 1)
+
+    def test_batches(self):
+        body = ''.join(f'M,{i},,,m{i}@example.com,020{i:07d},,\n' for i in range(25))
+        report = import_members(self.rows(body), batch_size=10)
+        self.assertEqual(report.created, 25)
+        self.assertEqual(Member.objects.count(), 26)
+
+
+class MetadataSyncTests(TestCase):
+    HEADER = 'Title,Author,Keywords,Shareable Link,Cover URL\n'
+
+    def setUp(self):
+        self.favor = Book.objects.create(title='100 Days Of Favor ', type='SC', author='Unknown Import', owner='FAYM',
+                                         location='https://example.com/favor.pdf', keywords='')
+        self.habits = Book.objects.create(title='Atomic Habits', type='SC', author='James Clear', owner='FAYM',
+                                          location='https://example.com/atomic.pdf', keywords='Habits')
+
+    def rows(self, body):
+        return csv.DictReader(io.StringIO(self.HEADER + body))
+
+    def test_matches_in_memory_and_batches_writes(self):
+        body = (
+            'atomic habits,Someone Else,Growth,,\n'                                  # exact (case-insensitive)
+            '100_Days_of_Favor,Dag Heward-Mills,Favor,,https://covers.example/1.jpg\n'  # normalized
+            'New Book,New Author,New,https://example.com/new.pdf,\n'                 # created
+            'New Book,,More,,\n'                                                     # matches the row above
+            'Missing Book,,,,\n'                                                     # skipped
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            report = sync_book_metadata(self.rows(body))
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['SELECT', 'INSERT', 'UPDATE'])
+        self.assertEqual((report.created, report.updated, report.unmatched), (1, 1, 1))
+        self.assertEqual(report.matched, {'exact': 2, 'normalized': 1, 'fuzzy': 0})
+
+        self.favor.refresh_from_db()
+        self.assertEqual((self.favor.author, self.favor.keywords), ('Dag Heward-Mills', 'Favor'))
+        self.habits.refresh_from_db()
+        self.assertEqual(self.habits.author, 'James Clear')  # Only placeholder authors are filled
+        self.assertEqual(Book.objects.get(title='New Book').author, 'New Author')
+
+    def test_overwrite_and_fuzzy(self):
+        report = sync_book_metadata(self.rows('Atomic Habitz,Someone Else,Growth,,\n'), overwrite=True, fuzzy=True)
+        self.assertEqual(report.matched['fuzzy'], 1)
+        self.habits.refresh_from_db()
+        self.assertEqual((self.habits.author, self.habits.keywords), ('Someone Else', 'Growth'))
+
+
+class StreamingCSVTests(TestCase):
+    def lines(self, data, chunk_size):
+        return list(iter_text_lines(data[i:i + chunk_size] for i in range(0, len(data), chunk_size)))
+
+    def test_utf8_bom_and_split_multibyte_chars(self):
+        data = '\ufeffTitle,Author\nCafé Ménage,Kwame Nkrumah\n'.encode('utf-8')
+        for chunk_size in (1, 3, 7, 1024):
+            self.assertEqual(self.lines(data, chunk_size), ['Title,Author\n', 'Café Ménage,Kwame Nkrumah\n'])
+
+    def test_windows_1252_fallback(self):
+        data = 'Title\nCafé\n'.encode('cp1252')
+        self.assertEqual(self.lines(data, 1024), ['Title\n', 'Café\n'])
+
+    def test_quoted_newlines_and_crlf(self):
+        data = b'Title,Keywords\r\n"Atomic Habits","Habits,\r\nGrowth"\r\n'
+        rows = list(read_csv_rows(io.BytesIO(data)))
+        self.assertEqual(rows, [{'Title': 'Atomic Habits', 'Keywords': 'Habits,\r\nGrowth'}])
+
+
+class DropboxImportTests(TestCase):
+    def setUp(self):
+        Book.objects.create(title='100 Days Of Favor ', type='SC', author='Unknown Import', owner='FAYM',
+                            location='https://example.com/favor.pdf', keywords='')
+        self.dbx = FakeDropbox()
+        for name in ['100_Days_of_Favor.pdf', 'Atomic_Habits.pdf', 'Sub/Mere Christianity.epub', 'atomic habits.pdf']:
+            self.dbx.add_file(f'/Books/{name}')
+        self.dbx.links['/books/sub/mere christianity.epub'] = 'https://www.dropbox.com/s/existing/mere.epub'
+
+    def test_imports_new_titles_with_links(self):
+        with CaptureQueriesContext(connection) as ctx:
+            report = import_folder(self.dbx, '/Books', workers=4, rate=1000, log=lambda msg: None)
+        self.assertEqual((report.listed, report.existing, report.created, report.failed), (4, 2, 2, 0))
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        # cursor, titles, tracked files, stored links, books, new links, file rows, cursor upsert - independent of folder size
+        self.assertEqual(statements, ['SELECT', 'SELECT', 'SELECT', 'SELECT', 'INSERT', 'INSERT', 'INSERT', 'SELECT', 'INSERT'])
+        self.assertEqual(Book.objects.get(title='Mere Christianity').location, 'https://www.dropbox.com/s/existing/mere.epub')
+        self.assertTrue(Book.objects.get(title__iexact='Atomic Habits').location.startswith('https://www.dropbox.com/s/'))
+
+    def test_rerun_makes_no_link_calls(self):
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.dbx.calls.clear()
+        report = import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertEqual((report.mode, report.listed, report.created), ('delta', 0, 0))
+        self.assertEqual(set(self.dbx.calls), {'files_list_folder_continue'})
+
+    def test_delta_only_processes_changes(self):
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.dbx.add_file('/Books/Deep_Work.pdf')
+        self.dbx.calls.clear()
+        report = import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertEqual((report.mode, report.listed, report.created), ('delta', 1, 1))
+        self.assertEqual(self.dbx.calls['sharing_create_shared_link_with_settings'], 1)
+        self.assertTrue(Book.objects.get(title='Deep Work').dropbox_files.exists())
+
+    def test_deleted_file_marks_book_unavailable(self):
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.dbx.delete_file('/Books/Sub/Mere Christianity.epub')
+        report = import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertEqual(report.removed, 1)
+        self.assertEqual(Book.objects.get(title='Mere Christianity').availability, 'Not Available')
+
+        self.dbx.add_file('/Books/Mere Christianity.epub')
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertEqual(Book.objects.get(title='Mere Christianity').availability, 'Available')
+
+    def test_same_title_twice_tracks_both_files(self):
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        book = Book.objects.get(title__iexact='Atomic Habits')
+        self.assertEqual(sorted(book.dropbox_files.values_list('path_lower', flat=True)),
+                         ['/books/atomic habits.pdf', '/books/atomic_habits.pdf'])
+        self.dbx.delete_file('/Books/Atomic_Habits.pdf')
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertEqual(Book.objects.get(pk=book.pk).availability, 'Available')  # The other copy is still there
+        self.dbx.delete_file('/Books/atomic habits.pdf')
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertEqual(Book.objects.get(pk=book.pk).availability, 'Not Available')
+
+    def test_rename_keeps_book(self):
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        book = Book.objects.get(title='Mere Christianity')
+        self.dbx.move_file('/Books/Sub/Mere Christianity.epub', '/Books/Mere_Christianity_2nd.epub')
+        report = import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertEqual((report.moved, report.created, report.removed), (1, 0, 0))
+        self.assertEqual(book.dropbox_files.get().path_lower, '/books/mere_christianity_2nd.epub')
+        self.assertEqual(Book.objects.get(pk=book.pk).availability, 'Available')
+
+    def test_reimport_uses_stored_links(self):
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertEqual(SharedLink.objects.count(), 2)
+        Book.objects.filter(location__startswith='https://www.dropbox.com/').delete()
+        self.dbx.calls.clear()
+        report = import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None, full=True)
+        self.assertEqual(report.created, 2)
+        self.assertFalse([name for name in self.dbx.calls if name.startswith('sharing_')])
+
+    def test_deleted_file_forgets_its_link(self):
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.dbx.delete_file('/Books/Sub/Mere Christianity.epub')
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertFalse(SharedLink.objects.filter(path_lower='/books/sub/mere christianity.epub').exists())
+
+    def test_expired_cursor_falls_back_to_full_listing(self):
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        DropboxCursor.objects.update(cursor='expired')
+        report = import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+        self.assertEqual((report.mode, report.listed, report.created), ('full', 4, 0))
+        self.assertNotEqual(DropboxCursor.objects.get().cursor, 'expired')
+
+
+def members_csv(count):
+    body = 'FIRSTNAME,SURNAME,EMAIL,MOBILENUMBER\n' + ''.join(f'M,{i},m{i}@example.com,020{i:07d}\n' for i in range(count))
+    return SimpleUploadedFile('members.csv', body.encode())
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.inline = mock.patch.object(jobs, 'run_in_background', lambda func, *a, **kw: func(*a, **kw))
+
+    def test_csv_job_records_progress_and_cleans_up(self):
+        with self.inline:
+            job = jobs.start_csv_import('import_members', members_csv(50), user=self.admin)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.processed, job.created, job.attempts), ('done', 100, 50, 50, 1))
+        self.assertIn('Created: 50', job.message)
+        self.assertFalse(os.path.exists(job.params['path']))
+
+    def test_resumes_after_checkpoint(self):
+        path = jobs.save_upload(members_csv(30))
+        # Crashed after committing the first 20 data rows (rows 2-21)
+        for i in range(20):
+            Member.objects.create(firstname='M', surname=str(i), email=f'm{i}@example.com', mobile_number=f'020{i:07d}')
+        job = ImportJob.objects.create(kind='import_members', status='running', params={'path': path, 'options': {}},
+                                       heartbeat_at=timezone.now() - timedelta(minutes=10), attempts=1,
+                                       checkpoint={'row': 21, 'created': 20, 'skipped': 0, 'failed': 0, 'errors': []})
+        with self.inline:
+            self.assertEqual(jobs.resume_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.created, job.skipped, job.attempts), ('done', 30, 0, 2))
+        self.assertTrue(job.message.startswith('Resumed after row 21.'))
+        self.assertEqual(Member.objects.count(), 30)
+
+    def test_live_and_exhausted_jobs_are_not_resumed(self):
+        live = ImportJob.objects.create(kind='import_members', status='running', heartbeat_at=timezone.now(), attempts=1)
+        dead = ImportJob.objects.create(kind='import_members', status='running', attempts=jobs.MAX_ATTEMPTS,
+                                        heartbeat_at=timezone.now() - timedelta(minutes=10))
+        with self.inline:
+            self.assertEqual(jobs.resume_stale_jobs(), 0)
+        self.assertIsNone(jobs.claim(live.pk))
+        dead.refresh_from_db()
+        self.assertEqual(dead.status, 'failed')
+
+    def test_dropbox_sync_action_runs_as_tracked_job(self):
+        dbx = FakeDropbox()
+        dbx.add_file('/Books/Atomic_Habits.pdf')
+        self.client.force_login(self.admin)
+        with self.inline, mock.patch.object(jobs, 'get_client', return_value=dbx):
+            res = self.client.post('/bulk-import/', {'action': 'sync_dropbox', 'dropbox_folder': '/Books'})
+        job_id = res.url.split('job=')[1]
+        with CaptureQueriesContext(connection) as ctx:
+            status = self.client.get(f'/bulk-import/status/{job_id}/').json()
+        self.assertEqual(len([q for q in ctx.captured_queries if 'library_importjob' in q['sql']]), 1)
+        self.assertEqual((status['state'], status['processed'], status['created']), ('done', 1, 1))
+        self.assertTrue(Book.objects.filter(title='Atomic Habits').exists())
+        self.assertContains(self.client.get('/bulk-import/jobs/'), 'Dropbox Sync')
+
+    def test_missing_token_fails_job(self):
+        with self.inline, mock.patch.dict(os.environ, {'DROPBOX_ACCESS_TOKEN': ''}), self.assertLogs('library.jobs', 'ERROR') as logs:
+            job = jobs.start_job('sync_dropbox', name='/Books', folder='/Books')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('DROPBOX_ACCESS_TOKEN', job.message)
+        self.assertIn(f'Import job #{job.pk}', logs.output[0])
+
+    def test_worker_leaves_fresh_queued_jobs_to_the_web_thread(self):
+        fresh = ImportJob.objects.create(kind='sync_dropbox', params={'folder': '/Books'})
+        orphaned = ImportJob.objects.create(kind='sync_dropbox', params={'folder': '/Books'})
+        ImportJob.objects.filter(pk=orphaned.pk).update(created_at=timezone.now() - timedelta(minutes=10))
+        with mock.patch.dict(os.environ, {'DROPBOX_ACCESS_TOKEN': ''}), self.assertLogs('library.jobs', 'ERROR'):
+            call_command('run_import_jobs', once=True, stdout=io.StringIO())
+        fresh.refresh_from_db()
+        orphaned.refresh_from_db()
+        self.assertEqual((fresh.status, orphaned.status), ('queued', 'failed'))
+
+
+class StubOpenLibrary:
+    """
+    Local OpenLibrary: /search.json answers from covers (lowercase title -> cover_i; titles in
+    `flaky` fail once with a 503), and any other path is served from images (path -> bytes).
+    """
+    def __init__(self, covers=None, flaky=(), images=None):
+        self.covers, self.flaky, self.images, self.requests = covers or {}, set(flaky), images or {}, []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != '/search.json':
+                    stub.requests.append(url.path)
+                    image = stub.images.get(url.path)
+                    self.send_response(200 if image else 404)
+                    self.end_headers()
+                    self.wfile.write(image or b'')
+                    return
+                title = parse_qs(urlparse(self.path).query).get('title', [''])[0].lower()
+                stub.requests.append(title)
+                if title in stub.flaky:
+                    stub.flaky.discard(title)
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                docs = [{'cover_i': stub.covers[title]}] if title in stub.covers else []
+                body = json.dumps({'docs': docs}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class CoverFetchTests(TestCase):
+    def setUp(self):
+        self.stub = StubOpenLibrary({'atomic habits': 123, 'deep work': 456}, flaky={'deep work'})
+        self.fetcher = CoverFetcher(self.stub.url, rate=1000, timeout=2)
+        self.addCleanup(self.stub.close)
+        self.addCleanup(self.fetcher.close)
+        for title in ['Atomic Habits', 'Deep Work', 'Unknown Pamphlet']:
+            Book.objects.create(title=title, type='HC', author='Unknown', owner='FAYM', location='Shelf', keywords='')
+        Book.objects.create(title='atomic_habits.pdf', type='SC', author='Unknown Import', owner='FAYM', location='x', keywords='')
+
+    def run_fetch(self):
+        with mock.patch('library.covers.backoff', return_value=0):
+            return fetch_covers(self.fetcher, workers=4, log=lambda msg: None)
+
+    def test_fetches_concurrently_with_retry(self):
+        report = self.run_fetch()
+        self.assertEqual((report.checked, report.found, report.missing, report.failed), (4, 3, 1, 0))
+        self.assertEqual(sorted(self.stub.requests), ['atomic habits', 'deep work', 'deep work', 'unknown pamphlet'])
+        self.assertEqual(Book.objects.get(title='Deep Work').cover_url, 'https://covers.openlibrary.org/b/id/456-L.jpg')
+        self.assertEqual(Book.objects.get(title='atomic_habits.pdf').cover_url, 'https://covers.openlibrary.org/b/id/123-L.jpg')
+
+    def test_misses_are_cached_until_expiry(self):
+        self.run_fetch()
+        self.stub.requests.clear()
+        report = self.run_fetch()
+        self.assertEqual((report.checked, report.cached, report.fetched), (1, 1, 0))
+        self.assertEqual(self.stub.requests, [])
+
+        CoverLookup.objects.filter(key=lookup_key('Unknown Pamphlet', 'Unknown')).update(
+            fetched_at=timezone.now() - timedelta(days=30))
+        self.run_fetch()
+        self.assertEqual(self.stub.requests, ['unknown pamphlet'])
+
+    def test_failures_are_not_cached(self):
+        self.stub.close()
+        fetcher = CoverFetcher(self.stub.url, rate=1000, timeout=0.5, retries=1)
+        self.addCleanup(fetcher.close)
+        with mock.patch('library.covers.backoff', return_value=0):
+            report = fetch_covers(fetcher, log=lambda msg: None)
+        self.assertEqual(report.failed, 4)
+        self.assertFalse(CoverLookup.objects.exists())
+
+
+def cover_image(size=(600, 900), color=(200, 40, 40)):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(COVER_THUMBNAIL_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.stub = StubOpenLibrary(images={'/b/id/1-L.jpg': cover_image(), '/b/id/2-L.jpg': cover_image(color=(0, 0, 200))})
+        self.addCleanup(self.stub.close)
+        for title, cover in [('Atomic Habits', 1), ('Atomic Habits (2nd copy)', 1), ('Deep Work', 2), ('Missing', 3)]:
+            Book.objects.create(title=title, type='HC', author='James Clear', owner='FAYM', location='Shelf', keywords='',
+                                cover_url=f"{self.stub.url}/b/id/{cover}-L.jpg")
+
+    def test_builds_small_thumbnails_once_per_cover(self):
+        from PIL import Image
+        report = build_thumbnails(workers=4, rate=1000, log=lambda msg: None)
+        self.assertEqual((report.checked, report.built, report.failed), (4, 2, 1))
+        self.assertEqual(sorted(self.stub.requests), ['/b/id/1-L.jpg', '/b/id/2-L.jpg', '/b/id/3-L.jpg'])
+        book = Book.objects.get(title='Atomic Habits')
+        self.assertEqual(Book.objects.get(title='Atomic Habits (2nd copy)').cover_thumbnail, book.cover_thumbnail)
+        for ext, fmt in [('webp', 'WEBP'), ('jpg', 'JPEG')]:
+            with Image.open(thumbnail_path(book.cover_thumbnail, ext)) as image:
+                self.assertEqual((image.format, image.size), (fmt, (160, 240)))
+
+        self.stub.requests.clear()
+        report = build_thumbnails(rate=1000, log=lambda msg: None)
+        self.assertEqual((report.checked, self.stub.requests), (1, ['/b/id/3-L.jpg']))  # Only the failed one again
+
+    def test_served_with_long_cache_and_listed_in_partial(self):
+        build_thumbnails(rate=1000, log=lambda msg: None)
+        book = Book.objects.get(title='Deep Work')
+        res = self.client.get(f'/covers/{book.cover_thumbnail}.webp')
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertIn('immutable', res['Cache-Control'])
+        res.close()
+
+        page = self.client.get('/', HTTP_HX_REQUEST='true').content.decode()
+        self.assertIn(f'/covers/{book.cover_thumbnail}.webp', page)
+        self.assertIn(f'{self.stub.url}/b/id/3-L.jpg', page)  # No thumbnail yet: original cover
+
+    def test_missing_file_falls_back_to_original_until_rebuilt(self):
+        build_thumbnails(rate=1000, log=lambda msg: None)
+        book = Book.objects.get(title='Deep Work')
+        os.remove(thumbnail_path(book.cover_thumbnail, 'jpg'))
+        res = self.client.get(f'/covers/{book.cover_thumbnail}.jpg')
+        self.assertEqual((res.status_code, res['Location']), (302, book.cover_url))
+        self.assertEqual(self.client.get('/covers/0123456789abcdef.jpg').status_code, 404)
+
+        self.stub.requests.clear()
+        build_thumbnails(rate=1000, log=lambda msg: None)
+        self.assertIn('/b/id/2-L.jpg', self.stub.requests)
+        self.assertEqual(Book.objects.get(pk=book.pk).cover_thumbnail, book.cover_thumbnail)
+        self.assertTrue(os.path.exists(thumbnail_path(book.cover_thumbnail, 'jpg')))
+
+
+class BookUploadTests(TestCase):
+    content = bytes(range(35))
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.dbx = FakeDropbox()
+        self.enterContext(override_settings(MEDIA_ROOT=root))
+        self.enterContext(mock.patch('library.dropbox_upload.CHUNK_SIZE', 10))
+        self.enterContext(mock.patch.dict(os.environ, {'DROPBOX_ACCESS_TOKEN': 'token'}))
+        self.enterContext(mock.patch.dict(dropbox_client._clients, clear=True))
+        self.enterContext(mock.patch.object(dropbox_client.dropbox, 'Dropbox', return_value=self.dbx))
+        self.enterContext(mock.patch.object(jobs, 'run_in_background', lambda func, *a, **kw: func(*a, **kw)))
+
+    def test_admin_upload_is_chunked_in_background(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='Big Book', type='HC', author='A', owner='FAYM', location='', keywords='',
+                                       file_upload=SimpleUploadedFile('big.pdf', self.content))
+            self.assertEqual((book.availability, book.type), ('Pending Upload', 'SC'))
+            self.assertEqual(self.dbx.calls['files_upload_session_start'], 0)  # Nothing sent during the request
+            name = book.file_upload.name
+
+        self.assertEqual(dropbox_path(name), '/big.pdf')
+        self.assertEqual(self.dbx.files[dropbox_path(name).lower()], self.content)
+        self.assertEqual((self.dbx.calls['files_upload_session_start'], self.dbx.calls['files_upload_session_append_v2'],
+                          self.dbx.calls['files_upload_session_finish']), (1, 2, 1))
+        book.refresh_from_db()
+        self.assertEqual(book.availability, 'Available')
+        self.assertTrue(book.location.startswith('https://www.dropbox.com/s/'))
+        self.assertFalse(book.file_upload)
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(DropboxFile.objects.filter(book=book).exists())
+        self.assertEqual(ImportJob.objects.get(kind='upload_book').status, 'done')
+
+    def test_resumes_upload_session_from_checkpoint(self):
+        book = Book.objects.create(title='Big Book', type='SC', author='A', owner='FAYM', location='', keywords='',
+                                   availability='Pending Upload')
+        name = default_storage.save('temp_books/big.pdf', ContentFile(self.content))
+        session_id = self.dbx.files_upload_session_start(self.content[:20]).session_id
+        job = ImportJob.objects.create(kind='upload_book', params={'book_id': book.pk, 'file': name},
+                                       checkpoint={'session_id': session_id, 'offset': 20})
+        self.dbx.calls.clear()
+        jobs.run_job(job.pk)
+        self.assertEqual(self.dbx.files[dropbox_path(name).lower()], self.content)
+        self.assertEqual(dict(self.dbx.calls), {'files_upload_session_append_v2': 1, 'files_upload_session_finish': 1,
+                                                'sharing_create_shared_link_with_settings': 1})
+
+    def test_reupload_reuses_stored_link(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='Big Book', type='HC', author='A', owner='FAYM', location='', keywords='',
+                                       file_upload=SimpleUploadedFile('big.pdf', self.content))
+            name = book.file_upload.name
+        book.refresh_from_db()
+        self.dbx.calls.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            book.file_upload = SimpleUploadedFile(name.rsplit('/', 1)[-1], self.content)
+            book.save()
+        self.assertEqual(Book.objects.get(pk=book.pk).location, book.location)
+        self.assertFalse([name for name in self.dbx.calls if name.startswith('sharing_')])
+        self.assertIs(dropbox_client.get_client(), dropbox_client.get_client())
+
+    def test_lost_session_restarts_upload(self):
+        book = Book.objects.create(title='Big Book', type='SC', author='A', owner='FAYM', location='', keywords='',
+                                   availability='Pending Upload')
+        name = default_storage.save('temp_books/big.pdf', ContentFile(self.content))
+        job = ImportJob.objects.create(kind='upload_book', params={'book_id': book.pk, 'file': name},
+                                       checkpoint={'session_id': 'expired', 'offset': 20})
+        jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(self.dbx.files[dropbox_path(name).lower()], self.content)
+
+
+def sample_pdf(pages=2, **metadata):
+    from PIL import Image
+    images = [Image.new('RGB', (300, 400), (20, 20, 120)) for _ in range(pages)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, 'PDF', save_all=True, append_images=images[1:], **metadata)
+    return buffer.getvalue()
+
+
+class PdfMetadataTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.enterContext(override_settings(COVER_THUMBNAIL_ROOT=root))
+        self.dbx = FakeDropbox()
+        self.dbx.add_file('/Books/AH_scan.pdf', sample_pdf(title='Atomic Habits', author='James Clear',
+                                                           subject='Self-help', keywords='Habits, Growth'))
+        self.dbx.add_file('/Books/Broken.pdf', b'%PDF-1.4 not really')
+        import_folder(self.dbx, '/Books', rate=1000, log=lambda msg: None)
+
+    def test_fills_gaps_from_embedded_metadata(self):
+        report = extract_metadata(self.dbx, workers=1, rate=1000, log=lambda msg: None)
+        self.assertEqual((report.files, report.parsed, report.failed, report.updated), (2, 1, 1, 1))
+        book = Book.objects.get(dropbox_files__path_lower='/books/ah_scan.pdf')
+        self.assertEqual((book.title, book.author, book.keywords, book.page_count),
+                         ('Atomic Habits', 'James Clear', 'Habits, Growth', 2))
+        self.assertTrue(os.path.exists(thumbnail_path(book.cover_thumbnail, 'webp')))
+        self.assertTrue(PdfMetadata.objects.exclude(error='').exists())
+
+    def test_unchanged_files_are_never_parsed_twice(self):
+        extract_metadata(self.dbx, workers=1, rate=1000, log=lambda msg: None)
+        Book.objects.update(author='Unknown Import', keywords='')
+        self.dbx.calls.clear()
+        report = extract_metadata(self.dbx, workers=1, rate=1000, log=lambda msg: None)
+        self.assertEqual((report.cached, report.parsed), (2, 0))
+        self.assertEqual(self.dbx.calls['files_download_to_file'], 0)
+        self.assertEqual(Book.objects.get(title='Atomic Habits').author, 'James Clear')
+
+    def test_lost_cover_is_rebuilt_from_the_pdf(self):
+        extract_metadata(self.dbx, workers=1, rate=1000, log=lambda msg: None)
+        book = Book.objects.get(dropbox_files__path_lower='/books/ah_scan.pdf')
+        shutil.rmtree(os.path.dirname(thumbnail_path(book.cover_thumbnail, 'webp')))  # A redeploy wiped the disk
+        self.assertEqual(self.client.get(f'/covers/{book.cover_thumbnail}.webp').status_code, 404)
+        self.assertEqual(PdfMetadata.objects.count(), 2)  # Serving the page changed nothing
+
+        self.dbx.calls.clear()
+        report = extract_metadata(self.dbx, workers=1, rate=1000, log=lambda msg: None)
+        self.assertEqual((report.cached, report.parsed, self.dbx.calls['files_download_to_file']), (1, 1, 1))
+        self.assertEqual(Book.objects.get(pk=book.pk).cover_thumbnail, book.cover_thumbnail)
+        self.assertTrue(os.path.exists(thumbnail_path(book.cover_thumbnail, 'webp')))
+
+    def test_curated_values_are_kept(self):
+        Book.objects.filter(title='AH scan').update(title='Atomic Habits (Signed)', author='J. Clear', keywords='Favourites')
+        extract_metadata(self.dbx, workers=1, rate=1000, log=lambda msg: None)
+        book = Book.objects.get(dropbox_files__path_lower='/books/ah_scan.pdf')
+        self.assertEqual((book.title, book.author, book.keywords, book.page_count),
+                         ('Atomic Habits (Signed)', 'J. Clear', 'Favourites', 2))
+
+
+class SqliteTuningTests(TestCase):
+    def test_connections_are_tuned(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                       for name in ('synchronous', 'cache_size', 'busy_timeout', 'temp_store')}
+        self.assertEqual(pragmas, {'synchronous': 1, 'cache_size': -32000, 'busy_timeout': 20000, 'temp_store': 2})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class BookTypeCopyTests(TestCase):
+    def test_request_copies_and_follows_book_type(self):
+        book = Book.objects.create(title='Deep Work', type='SC', author='Cal Newport', owner='FAYM', location='x', keywords='')
+        req = BookRequest.objects.create(full_name='Ama Mensah', email='ama@example.com', book=book)
+        self.assertEqual(req.book_type, 'SC')
+        book = Book.objects.get(pk=book.pk)
+        book.type = 'HC'
+        book.save()
+        self.assertEqual(BookRequest.objects.get(pk=req.pk).book_type, 'HC')
+        with self.assertNumQueries(1):  # No type change, no request UPDATE
+            book.save()
+
+
+class DedupTests(TestCase):
+    def setUp(self):
+        self.bare = Book.objects.create(title='100 Days Of Favor ', type='SC', author='Unknown Import', owner='FAYM',
+                                        location='https://www.dropbox.com/s/a/favor.pdf', keywords='')
+        self.full = Book.objects.create(title='100 days of favor', type='SC', author='Joseph Prince', owner='FAYM',
+                                        location='https://www.dropbox.com/s/b/favor.pdf', keywords='Favor, Grace')
+        Book.objects.create(title='Atomic Habits', type='SC', author='James Clear', owner='FAYM', location='x', keywords='')
+        Book.objects.create(title='Atomic Habits', type='SC', author='Someone Else', owner='FAYM', location='x', keywords='')
+        self.copies = [Book.objects.create(title='100 Days of Favour', type='HC', author='Joseph Prince', owner='Ama',
+                                           location=f'Shelf {n}', keywords='') for n in (1, 2)]  # Two physical copies
+        BookRequest.objects.create(full_name='Ama Mensah', email='ama@example.com', book=self.bare, approval_status='Approved')
+
+    def test_clusters_need_similar_titles_and_compatible_authors(self):
+        clusters = find_clusters(Book.objects.all())
+        self.assertEqual(sorted([b.pk for b in c] for c in clusters),
+                         [[self.bare.pk, self.full.pk], [b.pk for b in self.copies]])
+
+    def test_merge_folds_cluster_into_one_book(self):
+        report = dedupe_books(merge=True, log=lambda msg: None)
+        self.assertEqual((report.clusters, report.merged, report.skipped), (2, 1, 1))
+        kept = Book.objects.get(type='SC', title__iexact='100 days of favor ')  # Has the request, so it survives
+        self.assertEqual((kept.pk, kept.author, kept.keywords), (self.bare.pk, 'Joseph Prince', 'Favor, Grace'))
+        self.assertFalse(Book.objects.filter(pk=self.full.pk).exists())
+        self.assertEqual(DailyBookStat.objects.get().book_id, kept.pk)
+
+    def test_dry_run_changes_nothing(self):
+        report = dedupe_books(log=lambda msg: None)
+        self.assertEqual((report.duplicates, report.merged), (2, 0))
+        self.assertEqual(Book.objects.count(), 6)
+
+    def test_hard_copies_merge_only_when_confirmed(self):
+        dedupe_books(merge=True, log=lambda msg: None)
+        self.assertEqual(Book.objects.filter(type='HC').count(), 2)
+        Book(title='100 Days of Favour', type='HC', author='Joseph Prince', owner='Ama', location='Shelf 3', keywords='').clean()
+        report = dedupe_books(merge=True, include_hard_copies=True, log=lambda msg: None)
+        self.assertEqual(report.merged, 1)
+        self.assertEqual(Book.objects.filter(type='HC').count(), 1)
+
+    def test_new_duplicate_is_blocked_with_one_lookup(self):
+        book = Book(title='100_Days_of_Favor.pdf', type='SC', author='Joseph  Prince', owner='FAYM', location='y', keywords='k')
+        with CaptureQueriesContext(connection) as ctx, self.assertRaisesMessage(ValidationError, 'Already in the catalog'):
+            book.clean()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        Book(title='Deep Work', type='SC', author='Cal Newport', owner='FAYM', location='y', keywords='k').clean()
+
+
+class QueryPlanTests(TestCase):
+    """The hot request-path queries must stay index lookups as history grows."""
+    @classmethod
+    def setUpTestData(cls):
+        books = Book.objects.bulk_create(
+            Book(title=f'Book {i}', type='HC' if i % 3 else 'SC', author='A', owner='FAYM', location='x', keywords='',
+                 availability='Available' if i % 5 else 'Taken') for i in range(2000))
+        members = Member.objects.bulk_create(
+            Member(firstname='M', surname=str(i), email=f'm{i}@example.com', mobile_number=f'020{i:07d}') for i in range(1000))
+        now = timezone.now()
+        statuses = ['Approved'] * 15 + ['Not Approved', 'Expired', 'Expired', 'Pending']
+        BookRequest.objects.bulk_create(
+            BookRequest(full_name='M', email='m@example.com', member=members[i % 1000], book=books[i % 2000],
+                        book_type=books[i % 2000].type, approval_status=statuses[i % len(statuses)], return_status='Pending' if i % 50 == 0 else 'Returned',
+                        timestamp=now - timedelta(hours=i), expected_return_date=now + timedelta(days=i % 14))
+            for i in range(20000))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_request_queries_skip_the_book_join(self):
+        member = Member.objects.first()
+        for qs in (BookRequest.objects.filter(member=member, book_type='SC'), BookRequest.objects.filter(book_type='HC')):
+            self.assertNotIn('library_book"', str(qs.query))
+
+    def assertUsesIndexes(self, qs):
+        plan = qs.explain()
+        for table in ('library_bookrequest', 'library_book'):
+            full_scan = f'Seq Scan on {table} ' if connection.vendor == 'postgresql' else f'SCAN {table}\n'
+            self.assertNotIn(full_scan, plan + '\n', f"Full scan of {table}:\n{plan}")
+
+    def test_hot_queries_use_indexes(self):
+        member = Member.objects.first()
+        now = timezone.now()
+        queries = {
+            'sc limit': BookRequest.objects.filter(member=member, book_type='SC', timestamp__gte=now - timedelta(days=30)),
+            'hc limit': BookRequest.objects.filter(member=member, book_type='HC').exclude(return_status='Returned'),
+            'round robin': BookRequest.objects.filter(book_type='HC'),
+            'expiry': BookRequest.objects.filter(approval_status='Pending', book_type='HC', timestamp__lt=now - timedelta(hours=5)),
+            'pending returns': BookRequest.objects.filter(book_type='HC', approval_status='Approved')
+                               .exclude(return_status='Returned').select_related('book').order_by('expected_return_date'),
+            'dashboard': BookRequest.objects.filter(approval_status='Approved', timestamp__gte=now - timedelta(days=30)),
+            'catalog': Book.objects.filter(type='HC', availability='Available'),
+        }
+        for name, qs in queries.items():
+            with self.subTest(name):
+                self.assertUsesIndexes(qs)
+
+
+def seed_library(count, start=0):
+    """count books (alternating SC/HC), members, requests, return logs and import jobs, numbered from start."""
+    books = Book.objects.bulk_create(
+        Book(title=f'Seed Book {i}', type='SC' if i % 2 else 'HC', author=f'Author {i % 7}', owner='FAYM',
+             location=f'https://example.com/{i}.pdf', keywords=f'Faith, Topic {i % 5}', cover_url=f'https://example.com/{i}.jpg')
+        for i in range(start, start + count))
+    members = Member.objects.bulk_create(
+        Member(firstname='Seed', surname=str(i), email=f'seed{i}@example.com', mobile_number=f'021{i:07d}')
+        for i in range(start, start + count))
+    now = timezone.now()
+    requests = BookRequest.objects.bulk_create(
+        BookRequest(full_name=f'Seed {i}', email=f'seed{i}@example.com', member=member, book=book, book_type=book.type,
+                    approval_status='Approved', approval_date=now, return_status='Pending' if book.type == 'HC' else 'N/A',
+                    expected_return_date=now + timedelta(days=7))
+        for i, (member, book) in enumerate(zip(members, books), start=start))
+    ReturnLog.objects.bulk_create(
+        ReturnLog(bib_lit_member=r.full_name, action='Approval', request_token=r.token, book_title_snapshot=r.book.title)
+        for r in requests)
+    ImportJob.objects.bulk_create(ImportJob(kind='import_members', name=f'seed{i}.csv', status='done')
+                                  for i in range(start, start + count))
+    SlowRequest.objects.bulk_create(
+        SlowRequest(method='GET', path=f'/search/?q={i}', view='search_books', status=200, duration_ms=900, query_count=3,
+                    db_ms=700, queries=[{'ms': 650, 'sql': f'SELECT * FROM "library_book" WHERE "title" LIKE {i}'}])
+        for i in range(start, start + count))
+    rebuild_rollups()
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every page's query count must stay within budget and must not grow with the data (no
+    per-row queries), and each response must render within TIME_BUDGET. A failure here
+    usually means a missing select_related or a query inside a template loop.
+    """
+    TIME_BUDGET = 1.0  # seconds, generous for slow CI machines
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.admin)
+
+    def pages(self):
+        """name -> (url, max queries)"""
+        member = Member.objects.order_by('pk').first()
+        book = Book.objects.order_by('pk').first()
+        job = ImportJob.objects.order_by('pk').first()
+        req = BookRequest.objects.order_by('pk').first()
+        return {
+            'index': ('/', 3),
+            'index page 2 (htmx)': ('/?page=2', 3),
+            'search': ('/search/?q=Seed', 2),
+            'search category': ('/search/?category=Faith', 2),
+            'suggest': ('/suggest-books/?q=Seed', 1),
+            'check member': (f'/check-member/?identity={member.email}&book_id={book.pk}', 3),
+            'dashboard': ('/dashboard/', 8),
+            'validate returns': ('/validate-returns/', 2),
+            'bulk import': ('/bulk-import/', 3),
+            'import jobs': ('/bulk-import/jobs/', 4),
+            'import status': (f'/bulk-import/status/{job.pk}/', 2),
+            'export requests': ('/export/requests/csv/', 2),
+            'export returns': ('/export/returns/csv/', 2),
+            'cover thumbnail': ('/covers/0123456789abcdef.jpg', 1),
+            'admin books': ('/admin/library/book/', 4),
+            'admin requests': ('/admin/library/bookrequest/', 4),
+            'admin members': ('/admin/library/member/', 4),
+            'admin return logs': ('/admin/library/returnlog/', 4),
+            'admin book edit': (f'/admin/library/book/{book.pk}/change/', 2),
+            'admin request edit': (f'/admin/library/bookrequest/{req.pk}/change/', 6),
+            'slow requests': ('/slow-requests/', 4),
+            'metrics': ('/metrics/', 3),
+        }
+
+    def measure(self, url):
+        cache.clear()  # Dashboard numbers are cached
+        self.client.session.items()  # ...but the staff session normally is too (cached_db)
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, headers={'HX-Request': 'true'} if 'htmx' in url else {})
+            if res.streaming:
+                b''.join(res.streaming_content)
+        return len(ctx.captured_queries), time.perf_counter() - start
+
+    def test_pages_stay_within_budget(self):
+        seed_library(3)
+        for url, _ in self.pages().values():
+            self.measure(url)  # Warm per-process caches (content types, compiled templates)
+        small = {name: self.measure(url)[0] for name, (url, _) in self.pages().items()}
+        seed_library(60, start=3)  # More rows than a page holds
+        for name, (url, budget) in self.pages().items():
+            with self.subTest(name):
+                queries, elapsed = self.measure(url)
+                self.assertEqual(queries, small[name], f"{url}: query count grows with rows ({small[name]} -> {queries})")
+                self.assertLessEqual(queries, budget, f"{url}: {queries} queries, budget {budget}")
+                self.assertLess(elapsed, self.TIME_BUDGET, f"{url}: rendered in {elapsed:.2f}s")
+
+    @override_settings(WIGAL_API_KEY='', EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_member_request_flow_budget(self):
+        seed_library(20)
+        cache.clear()
+        member, book = Member.objects.order_by('pk').first(), Book.objects.filter(type='SC').first()
+        BookRequest.objects.filter(member=member).delete()
+        client = Client()
+        with CaptureQueriesContext(connection) as ctx:
+            client.post('/send-otp/', {'identity': member.email})
+            otp = OTPRecord.objects.get(phone_number=member.mobile_number)
+            client.post('/verify-otp/', {'otp_code': otp.otp_code})
+            res = client.post('/request/', {'book_id': book.pk}).json()
+        self.assertEqual(res['status'], 'success')
+        # Member lookups, OTP row, limit checks, the request and its rollup upserts (a new row's insert
+        # runs in a savepoint), plus this test's OTP read
+        self.assertLessEqual(len(ctx.captured_queries), 24)
+
+
+class SyntheticDataTests(TestCase):
+    def test_generates_realistic_catalog(self):
+        report = generate(books=200, members=100, requests=3000, seed=7, log=lambda msg: None)
+        self.assertEqual((report.books, report.members, report.requests), (200, 100, 3000))
+        self.assertEqual(Book.objects.values('fingerprint').distinct().count(), 200)
+        self.assertFalse(BookRequest.objects.exclude(book_type=F('book__type')).exists())
+        # Skewed like a real library: the busiest tenth of the books gets far more than a tenth of the loans
+        counts = sorted(BookRequest.objects.values('book').annotate(n=Count('id')).values_list('n', flat=True), reverse=True)
+        self.assertGreater(sum(counts[:20]), 3000 * 0.3)
+        on_loan = BookRequest.objects.filter(book_type='HC', approval_status='Approved').exclude(return_status='Returned')
+        self.assertEqual(Book.objects.filter(availability='Taken').count(), on_loan.values('book').distinct().count())
+        self.assertEqual(rollup_kpis()['total_requests'], 3000)
+        # History spread back in time, without switching off auto_now_add for the rest of the process
+        self.assertLess(BookRequest.objects.order_by('timestamp').first().timestamp, timezone.now() - timedelta(days=180))
+        self.assertTrue(BookRequest._meta.get_field('timestamp').auto_now_add)
+
+    def test_repeat_runs_add_members(self):
+        generate(books=5, members=10, requests=0, log=lambda msg: None)
+        generate(books=5, members=10, requests=0, log=lambda msg: None)
+        self.assertEqual(Member.objects.count(), 20)
+
+
+@override_settings(WIGAL_API_KEY='')
+class LoadTestHarnessTests(LiveServerTestCase):
+    def test_drives_every_flow(self):
+        generate(books=30, members=20, requests=100, log=lambda msg: None)
+        cache.clear()
+        # A real member's request made during the run (same members, same time) must survive clean-up
+        real = BookRequest.objects.create(member=Member.objects.first(), full_name='Real Member', email='real@example.com',
+                                          book=Book.objects.filter(type='SC').first())
+        BookRequest.objects.filter(pk=real.pk).update(timestamp=timezone.now() + timedelta(minutes=5))
+        availability = dict(Book.objects.values_list('pk', 'availability'))
+        out = io.StringIO()
+        call_command('load_test', url=self.live_server_url, users=1, duration=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        for name in ['index', 'search', 'suggest', 'send otp', 'verify otp', 'submit']:
+            requests, errors = next(line for line in lines if line.startswith(name)).split()[-7:-5]
+            self.assertGreater(int(requests), 0, name)
+            self.assertEqual(errors, '0', name)
+        self.assertEqual(BookRequest.objects.count(), 101)  # The run's requests were removed, and only those
+        self.assertTrue(BookRequest.objects.filter(pk=real.pk).exists())
+        self.assertFalse(OTPRecord.objects.exists())
+        self.assertEqual(dict(Book.objects.values_list('pk', 'availability')), availability)  # Hard copies released
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(profiling.writer, 'submit', profiling.save_slow_request))  # Saved inline
+        Book.objects.create(title='Atomic Habits', type='SC', author='James Clear', owner='FAYM', location='x', keywords='Habits')
+
+    @override_settings(PROFILING_SLOW_MS=0)
+    def test_slow_request_is_logged_and_saved(self):
+        with self.assertLogs('library.slow_requests', 'WARNING') as logs:
+            self.client.get('/search/?q=Atomic')
+        entry = json.loads(logs.records[0].getMessage())
+        slow = SlowRequest.objects.get()
+        self.assertEqual((slow.view, slow.path, slow.status), ('search_books', '/search/', 200))
+        self.assertEqual(entry['query_count'], slow.query_count)
+        self.assertGreaterEqual(slow.query_count, 1)
+        self.assertIn('library_book', slow.queries[0]['sql'])
+        self.assertEqual(slow.profile, '')
+
+    @override_settings(PROFILING_SLOW_MS=0, PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_request_keeps_its_profile(self):
+        with self.assertLogs('library.slow_requests'):
+            self.client.get('/search/?q=Atomic')
+        self.assertIn('search_books', SlowRequest.objects.get().profile)
+
+    @override_settings(PROFILING_SLOW_MS=60000)
+    def test_fast_request_only_measured(self):
+        res = self.client.get('/suggest-books/?q=At')
+        self.assertEqual(res.wsgi_request.profile.view, 'suggest_books')
+        self.assertEqual(res.wsgi_request.profile.query_count, 1)
+        self.assertFalse(SlowRequest.objects.exists())
+
+    def test_writer_queue_is_bounded(self):
+        writer = profiling.SlowRequestWriter(size=2)
+        with mock.patch.object(profiling.threading, 'Thread') as thread:  # A writer that never catches up
+            self.assertEqual([writer.submit({'n': i}, '') for i in range(3)], [True, True, False])
+        self.assertEqual(thread.call_count, 1)  # One thread per process, not per slow request
+
+    def test_old_records_are_purged_nightly(self):
+        for days in (1, 8):
+            SlowRequest.objects.create(method='GET', path='/', view='index', status=200, duration_ms=900, query_count=2, db_ms=100)
+            SlowRequest.objects.filter(view='index', path='/').update(path=f'/{days}', timestamp=timezone.now() - timedelta(days=days))
+        call_command('purge_sessions', stdout=io.StringIO())
+        self.assertEqual(list(SlowRequest.objects.values_list('path', flat=True)), ['/1'])
+
+    def test_staff_page_ranks_offenders(self):
+        for ms, view in [(900, 'search_books'), (800, 'search_books'), (1200, 'index')]:
+            SlowRequest.objects.create(method='GET', path='/', view=view, status=200, duration_ms=ms, query_count=2, db_ms=100,
+                                       queries=[{'ms': 90, 'sql': f'SELECT * FROM "library_book" WHERE "book_id" IN (%s, %s) LIMIT {ms}'}])
+        SlowRequest.objects.filter(view='index').update(timestamp=timezone.now() - timedelta(hours=2))
+        self.assertEqual(self.client.get('/slow-requests/').status_code, 302)  # Staff only
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        res = self.client.get('/slow-requests/?minutes=60')
+        self.assertEqual([(v['view'], v['hits']) for v in res.context['views']], [('search_books', 2)])
+        [stmt] = res.context['statements']
+        self.assertEqual(stmt['sql'], 'SELECT * FROM "library_book" WHERE "book_id" IN (...) LIMIT ?')
+        self.assertEqual(stmt['hits'], 2)
+        res = self.client.get('/slow-requests/?minutes=240')
+        self.assertEqual([v['view'] for v in res.context['views']], ['search_books', 'index'])
+
+
+@override_settings(WIGAL_API_KEY='', EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', METRICS_TOKEN='s3cret')
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        self.enterContext(override_settings(METRICS_DIR=self.folder))
+        self.enterContext(mock.patch.dict(metrics._state, pid=None))  # Start this "process" afresh, writing to folder
+        self.auth = {'Authorization': 'Bearer s3cret'}
+
+    def scrape(self):
+        res = self.client.get('/metrics/', headers=self.auth)
+        self.assertEqual(res.status_code, 200)
+        return res.content.decode()
+
+    def test_sums_every_worker(self):
+        with open(os.path.join(self.folder, '99999-1.json'), 'w') as f:  # Another worker's file
+            json.dump([['elib_otp_requests_total', '{result="sent"}', 5],
+                       ['elib_cache_requests_total', '{cache="dashboard_stats",result="hit"}', 3]], f)
+        member = Member.objects.create(firstname='Ama', surname='Mensah', email='ama@example.com', mobile_number='0240000001')
+        self.client.post('/send-otp/', {'identity': member.email})
+        self.client.post('/send-otp/', {'identity': 'nobody@example.com'})
+        text = self.scrape()
+        self.assertIn('elib_otp_requests_total{result="sent"} 6\n', text)
+        self.assertIn('elib_otp_requests_total{result="unknown_member"} 1\n', text)
+        self.assertIn('elib_sms_sent_total{result="skipped"} 1\n', text)
+        self.assertIn('# TYPE elib_http_request_duration_seconds histogram', text)
+        self.assertIn('elib_http_request_duration_seconds_bucket{le="+Inf",view="send_otp"} 2\n', text)
+        self.assertIn('elib_http_requests_total{method="POST",status="200",view="send_otp"} 2\n', text)
+        self.assertIn('elib_cache_hit_ratio{cache="dashboard_stats"} 1\n', text)
+
+    def test_cache_hit_ratio_and_queue_gauges(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.client.get('/dashboard/')
+        self.client.get('/dashboard/')
+        ImportJob.objects.create(kind='import_members', status='queued')
+        text = self.scrape()
+        self.assertIn('elib_cache_requests_total{cache="dashboard_stats",result="miss"} 1\n', text)
+        self.assertIn('elib_cache_requests_total{cache="dashboard_stats",result="hit"} 1\n', text)
+        self.assertIn('elib_cache_hit_ratio{cache="dashboard_stats"} 0.5\n', text)
+        self.assertIn('elib_import_jobs{status="queued"} 1\n', text)
+        self.assertIn('elib_requests_pending_approval{book_type="HC"} 0\n', text)
+
+    def test_import_job_throughput(self):
+        with mock.patch.object(jobs, 'run_in_background', lambda func, *a, **kw: func(*a, **kw)):
+            jobs.start_csv_import('import_members', members_csv(40))
+        text = self.scrape()
+        self.assertIn('elib_import_processed_total{kind="import_members"} 40\n', text)
+        self.assertIn('elib_import_jobs_finished_total{kind="import_members",status="done"} 1\n', text)
+        self.assertIn('elib_import_job_duration_seconds_count{kind="import_members"} 1\n', text)
+
+    def test_requires_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True))
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    def test_archives_long_gone_workers(self):
+        for pid, sent in ((12345, 1), (12346, 2)):
+            old = os.path.join(self.folder, f'{pid}-1.json')
+            with open(old, 'w') as f:
+                json.dump([['elib_email_sent_total', '{result="ok"}', sent]], f)
+            os.utime(old, (0, 0))
+        self.assertIn('elib_email_sent_total{result="ok"} 3\n', self.scrape())
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(os.path.join(self.folder, metrics.ARCHIVE)))
+        self.assertIn('elib_email_sent_total{result="ok"} 3\n', self.scrape())  # Counted once, never reset
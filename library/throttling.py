@@ -0,0 +1,27 @@
+"""Client-side rate limiting for outbound API calls (Dropbox, OpenLibrary)."""
+import threading
+import time
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by worker threads: refills at `rate` tokens per second
+    and allows bursts of up to `capacity`. acquire() blocks until a token is free.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
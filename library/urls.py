@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 urlpatterns = [
@@ -7,10 +7,16 @@ urlpatterns = [
     path('check-member/', views.check_member, name='check_member'),
     path('request/', views.submit_request, name='submit_request'),
     path('bulk-import/', views.bulk_import, name='bulk_import'),
+    path('bulk-import/jobs/', views.import_jobs, name='import_jobs'),
+    path('bulk-import/status/<int:job_id>/', views.import_status, name='import_status'),
     path('suggest-books/', views.suggest_books, name='suggest_books'),
     path('send-otp/', views.send_otp, name='send_otp'),
     path('verify-otp/', views.verify_otp_action, name='verify_otp'),
     path('dashboard/', views.admin_dashboard_view, name='admin_dashboard'),
     path('validate-returns/', views.validate_returns, name='validate_returns'),
+    path('slow-requests/', views.slow_requests, name='slow_requests'),
+    path('metrics/', views.metrics_endpoint, name='metrics'),
     path('setup_permissions/', views.setup_permissions, name='setup_permissions'),
+    path('export/<str:kind>/<str:fmt>/', views.export_data, name='export_data'),
+    re_path(r'^covers/(?P<name>[0-9a-f]{16})\.(?P<ext>webp|jpg)$', views.cover_thumbnail, name='cover_thumbnail'),
 ]